@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Start-up and per-question cost of the quiz engine on synthetic banks.
+
+For each bank size (default 10^3 .. 10^6 terms) writes a quiz.json and
+measures:
+
+- load: json.load + term list (what run_quiz did on every launch),
+  Quiz.from_json, the first Quiz.load (parse + compile) and a warm
+  Quiz.load (memory-mapped compiled bank);
+- per question: the old sampler, which copied every other definition
+  (O(n)), against Quiz.question (O(1)). The old sampler is timed on fewer
+  questions at large sizes, since each one walks the whole bank.
+
+Usage:
+    python terminal-quiz/benchmarks/bench_quiz.py --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from terminal_quiz.quiz import Quiz  # noqa: E402
+
+WORDS = (
+    "instance bucket region zone lambda queue topic stream table index cluster "
+    "subnet gateway policy role token cache replica snapshot volume endpoint"
+).split()
+
+
+def make_bank(n: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    bank = {"__title__": f"Synthetic {n}"}
+    for i in range(n):
+        definition = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+        bank[f"term-{i:07d}"] = definition.capitalize() + "."
+    return bank
+
+
+def old_question(bank: dict, words: list, word: str, rng: random.Random) -> list:
+    correct_def = bank[word]
+    all_defs = [bank[w] for w in words if w != word]
+    choices = rng.sample(all_defs, k=min(3, len(all_defs))) + [correct_def]
+    rng.shuffle(choices)
+    return choices
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def per_question_us(ask, count: int) -> float:
+    samples = []
+    for _ in range(count):
+        samples.append(timed(ask) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000]
+    )
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(
+        f"{'terms':>9}{'json ms':>10}{'from_json':>11}{'compile':>10}"
+        f"{'warm load':>11}{'old q us':>11}{'new q us':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TERMINAL_QUIZ_CACHE"] = str(Path(tmp) / "cache")
+        for n in args.sizes:
+            path = Path(tmp) / f"quiz-{n}.json"
+            path.write_text(json.dumps(make_bank(n, args.seed)), encoding="utf-8")
+
+            def old_load():
+                with open(path, "r", encoding="utf-8") as f:
+                    bank = json.load(f)
+                return bank, [k for k in bank if k != "__title__"]
+
+            json_s = timed(old_load)
+            from_json_s = timed(lambda: Quiz.from_json(path))
+            compile_s = timed(lambda: Quiz.load(path))
+            warm_s = min(timed(lambda: Quiz.load(path)) for _ in range(3))
+
+            rng = random.Random(args.seed)
+            bank, words = old_load()
+            old_count = max(5, min(args.questions, 10**7 // n))
+            old_us = per_question_us(
+                lambda: old_question(bank, words, rng.choice(words), rng), old_count
+            )
+            quiz = Quiz.load(path)
+            new_us = per_question_us(
+                lambda: quiz.question(rng.randrange(len(quiz)), rng=rng),
+                args.questions,
+            )
+            print(
+                f"{n:>9}{json_s * 1000:>10.1f}{from_json_s * 1000:>11.1f}"
+                f"{compile_s * 1000:>10.1f}{warm_s * 1000:>11.2f}"
+                f"{old_us:>11.0f}{new_us:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Review-session latency on large banks with stored progress.
+
+For each bank size builds a compiled synthetic bank and a progress store
+in which --seen of the terms have cards with due dates spread over the
+last 30 and next 60 days, then measures:
+
+- start: Scheduler() plus the first next() (reads the first page of due
+  cards from the (bank, due) index);
+- scan: the alternative of reading every card and heapifying the due ones;
+- per answer: next() + answer() (SM-2 update, one committed row) for
+  --answers answers, about a quarter of them wrong.
+
+Usage:
+    python terminal-quiz/benchmarks/bench_review.py --sizes 100000 500000
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from terminal_quiz.quiz import Quiz  # noqa: E402
+from terminal_quiz.review import (  # noqa: E402
+    DAY,
+    GRADE_CORRECT,
+    GRADE_WRONG,
+    ProgressStore,
+    Scheduler,
+)
+
+
+def seed_store(path: Path, key: str, quiz: Quiz, seen: float, now: float, rng):
+    """Bulk-insert cards for a fraction of the bank (faster than save())."""
+    store = ProgressStore(path)
+    bank = store.bank_id(key)
+    store.close()
+    conn = sqlite3.connect(str(path))
+    count = int(len(quiz) * seen)
+    with conn:
+        conn.executemany(
+            "INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    bank,
+                    quiz.terms[i],
+                    i,
+                    2.5,
+                    6.0,
+                    2,
+                    0,
+                    now + rng.uniform(-30, 60) * DAY,
+                )
+                for i in range(count)
+            ),
+        )
+        conn.execute("UPDATE banks SET new_cursor = ? WHERE id = ?", (count, bank))
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--seen", type=float, default=0.8)
+    parser.add_argument("--answers", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(
+        f"{'terms':>9}{'cards':>9}{'due':>9}{'start ms':>10}{'scan ms':>10}"
+        f"{'answer p50 ms':>15}{'p95 ms':>9}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TERMINAL_QUIZ_CACHE"] = str(Path(tmp) / "cache")
+        for n in args.sizes:
+            rng = random.Random(args.seed)
+            source = Path(tmp) / f"quiz-{n}.json"
+            bank = {"__title__": f"Synthetic {n}"}
+            bank.update({f"term-{i:07d}": f"definition {i}" for i in range(n)})
+            source.write_text(json.dumps(bank), encoding="utf-8")
+            quiz = Quiz.load(source)
+            key = str(source.resolve())
+            db = Path(tmp) / f"progress-{n}.sqlite3"
+            now = time.time()
+            cards = seed_store(db, key, quiz, args.seen, now, rng)
+
+            store = ProgressStore(db)
+            start = time.perf_counter()
+            scheduler = Scheduler(quiz, store, key)
+            scheduler.next()
+            start_ms = (time.perf_counter() - start) * 1000
+            due = scheduler.stats()["due"]
+
+            start = time.perf_counter()
+            conn = sqlite3.connect(str(db))
+            rows = conn.execute("SELECT due, term FROM cards").fetchall()
+            queue = [row for row in rows if row[0] <= now]
+            heapq.heapify(queue)
+            conn.close()
+            scan_ms = (time.perf_counter() - start) * 1000
+
+            samples = []
+            for _ in range(args.answers):
+                t0 = time.perf_counter()
+                card = scheduler.next()
+                if card is None:
+                    break
+                grade = GRADE_WRONG if rng.random() < 0.25 else GRADE_CORRECT
+                scheduler.answer(card, grade)
+                samples.append((time.perf_counter() - t0) * 1000)
+            samples.sort()
+            store.close()
+            print(
+                f"{n:>9}{cards:>9}{due:>9}{start_ms:>10.2f}{scan_ms:>10.1f}"
+                f"{statistics.median(samples):>15.3f}"
+                f"{samples[int(len(samples) * 0.95)]:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,150 @@
-import json
-import random
+import argparse
 import sys
 from pathlib import Path
+from typing import List, Optional
 
+try:
+    from terminal_quiz.library import QuizLibrary
+    from terminal_quiz.quiz import Question, Quiz
+    from terminal_quiz.review import (
+        GRADE_CORRECT,
+        GRADE_WRONG,
+        ProgressStore,
+        Scheduler,
+    )
+except ImportError:  # run as a script from a checkout, package not installed
+    from library import QuizLibrary  # type: ignore[no-redef]
+    from quiz import Question, Quiz  # type: ignore[no-redef]
+    from review import (  # type: ignore[no-redef]
+        GRADE_CORRECT,
+        GRADE_WRONG,
+        ProgressStore,
+        Scheduler,
+    )
+
+
+def ask(number: int, question: Question, topic: str = "") -> bool:
+    """Print one question, read the answer, and report whether it was right."""
+    correct_def = question.choices[question.answer]
+    prefix = f"[{topic}] " if topic else ""
+    print(f"{number}. {prefix}{question.term}")
+    for idx, choice in enumerate(question.choices, 1):
+        print(f"  {idx}. {choice}")
+
+    try:
+        answer = int(input(f"Your choice (1-{len(question.choices)}): "))
+        if not 1 <= answer <= len(question.choices):
+            raise IndexError(answer)
+        if answer - 1 == question.answer:
+            print("✅ Correct!\n")
+            return True
+        print(f"❌ Wrong. Correct answer: {correct_def}\n")
+    except (ValueError, IndexError):
+        print(f"⚠️ Invalid input. The correct answer was: {correct_def}\n")
+    return False
 
-def run_quiz() -> None:
-    if len(sys.argv) != 2:
-        print("\n❗ Usage: python run.py path/to/quiz.json\n")
-        return sys.exit(1)
 
-    json_path = sys.argv[1]
-    quiz_file = Path(json_path)
-    if not quiz_file.exists():
-        print(f"❌ Error: {json_path} not found.")
+def run_library(paths: List[Path], questions: Optional[int]) -> None:
+    """One session over every bank found under the given files/directories."""
+    library = QuizLibrary(paths)
+    banks = [b for b in library.banks() if b.size]
+    if not banks:
+        print("⚠️ No quiz banks with questions found.")
         return sys.exit(1)
 
-    with open(quiz_file, "r", encoding="utf-8") as f:
-        quiz = json.load(f)
+    print(f"\n\U0001f4da {len(banks)} quiz banks:")
+    for bank in banks:
+        print(f"  • {bank.title} ({bank.size} terms)  {bank.path}")
+    print()
 
-    title = f"\n\U0001f9e0 Welcome to the {quiz.get('__title__', 'Vocabulary')} Quiz!"
-    words = [k for k in quiz.keys() if k != "__title__"]
-    score = 0
-    questions = len(words)
+    score = asked = 0
+    for asked, (bank, question) in enumerate(library.sample(banks, questions), 1):
+        score += ask(asked, question, bank.title)
+
+    print(f"🏋️ Quiz complete! You scored {score} out of {asked}.\n")
+
+
+def run_review(
+    quiz: Quiz, questions: Optional[int], new: int, progress: Optional[Path]
+) -> None:
+    """Spaced-repetition session: due cards first, then new terms."""
+    store = ProgressStore(progress)
+    scheduler = Scheduler(quiz, store, new_per_session=new)
+    stats = scheduler.stats()
+    print(f"\n\U0001f9e0 Reviewing the {quiz.title} Quiz!")
+    print(f"🔁 {stats['due']} due, {stats['seen']} of {len(quiz)} terms seen.\n")
+
+    score = asked = 0
+    try:
+        while questions is None or asked < questions:
+            card = scheduler.next()
+            if card is None:
+                break
+            correct = ask(asked + 1, quiz.question(card.position))
+            scheduler.answer(card, GRADE_CORRECT if correct else GRADE_WRONG)
+            asked += 1
+            score += correct
+    except (EOFError, KeyboardInterrupt):  # every answer is already saved
+        print("\n\n👋 Stopped. Your progress is saved.")
+    finally:
+        store.close()
+
+    if not asked:
+        print("🎉 Nothing due and no new terms left. Come back later!\n")
+    else:
+        print(f"🏋️ Review complete! You scored {score} out of {asked}.\n")
+
+
+def run_quiz() -> None:
+    parser = argparse.ArgumentParser(
+        description="Terminal vocabulary quiz over one bank, or every bank "
+        "found under the given directories."
+    )
+    parser.add_argument("paths", nargs="+", metavar="PATH", type=Path)
+    parser.add_argument(
+        "-n", "--questions", type=int, help="questions to ask (default: all terms)"
+    )
+    parser.add_argument(
+        "--review",
+        action="store_true",
+        help="spaced repetition: ask due terms and a few new ones, remember progress",
+    )
+    parser.add_argument(
+        "--new", type=int, default=20, help="new terms per review session"
+    )
+    parser.add_argument(
+        "--progress",
+        type=Path,
+        help="progress database (default: ~/.cache/terminal-quiz/progress.sqlite3)",
+    )
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not path.exists():
+            print(f"❌ Error: {path} not found.")
+            return sys.exit(1)
+    if len(args.paths) > 1 or args.paths[0].is_dir():
+        if args.review:
+            print("❗ --review takes a single quiz.json.")
+            return sys.exit(1)
+        return run_library(args.paths, args.questions)
+
+    quiz_file = args.paths[0]
+    quiz = Quiz.load(quiz_file)
+    questions = len(quiz) if args.questions is None else min(args.questions, len(quiz))
 
     if questions < 1:
         print("⚠️ Not enough questions in this quiz.")
         return sys.exit(1)
 
-    print(title)
-
-    for i, word in enumerate(random.sample(words, questions), 1):
-        correct_def = quiz[word]
-        all_defs = [quiz[w] for w in words if w != word]
-        choices = random.sample(all_defs, k=min(3, len(all_defs))) + [correct_def]
-        random.shuffle(choices)
-
-        print(f"{i}. {word}")
-        for idx, choice in enumerate(choices, 1):
-            print(f"  {idx}. {choice}")
-
-        try:
-            answer = int(input("Your choice (1-4): "))
-            if choices[answer - 1] == correct_def:
-                print("✅ Correct!\n")
-                score += 1
-            else:
-                print(f"❌ Wrong. Correct answer: {correct_def}\n")
-        except (ValueError, IndexError):
-            print(f"⚠️ Invalid input. The correct answer was: {correct_def}\n")
+    if args.review:
+        return run_review(quiz, args.questions, args.new, args.progress)
+
+    print(f"\n\U0001f9e0 Welcome to the {quiz.title} Quiz!")
+
+    score = 0
+    for i, index in enumerate(quiz.order()[:questions], 1):
+        score += ask(i, quiz.question(index))
 
     print(f"🏋️ Quiz complete! You scored {score} out of {questions}.\n")
 
@@ -0,0 +1,164 @@
+"""
+A library of quiz banks found under one or more directories.
+
+QuizLibrary finds every bank (quiz.json by default) below its roots and lists
+their titles and sizes without loading them: the title and term count come
+from each bank's compiled header (see quiz.compiled_info), so only banks
+that are new or changed since the last run are parsed.
+
+Banks are loaded on first use and kept in an LRU of max_loaded parsed
+banks, so a session that hops between topics does not reparse them.
+sample() draws questions uniformly across the chosen banks, as one
+session.
+"""
+
+import bisect
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    from terminal_quiz.quiz import Question, Quiz, compiled_info
+except ImportError:  # run as a script from a checkout, package not installed
+    from quiz import Question, Quiz, compiled_info  # type: ignore[no-redef]
+
+
+@dataclass(frozen=True)
+class BankInfo:
+    path: Path
+    title: str
+    size: int  # number of terms
+
+
+class QuizLibrary:
+    """Discovered banks, loaded on demand through an LRU."""
+
+    def __init__(
+        self,
+        roots: Union[str, Path, Iterable[Union[str, Path]]],
+        pattern: str = "quiz.json",
+        max_loaded: int = 4,
+    ):
+        """
+        roots: directories searched recursively, or bank files (one or many).
+        pattern: file name (glob) of a bank.
+        max_loaded: parsed banks kept in memory.
+        """
+        if isinstance(roots, (str, Path)):
+            roots = [roots]
+        self.roots = [Path(root) for root in roots]
+        self.pattern = pattern
+        self.max_loaded = max_loaded
+        self._banks: Optional[List[BankInfo]] = None
+        self._loaded: "OrderedDict[Path, Quiz]" = OrderedDict()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    # -- index -------------------------------------------------------------
+
+    def banks(self) -> List[BankInfo]:
+        """Every bank under the roots, by path (indexed once, then cached)."""
+        if self._banks is None:
+            paths: List[Path] = []
+            for root in self.roots:
+                if root.is_file():
+                    found = [root]
+                else:
+                    found = sorted(
+                        p
+                        for p in root.rglob(self.pattern)
+                        # Hidden dirs below the root only: the root itself
+                        # may be "..", or live under a dot-directory
+                        if not any(
+                            part.startswith(".")
+                            for part in p.relative_to(root).parts
+                        )
+                    )
+                paths.extend(p for p in found if p not in paths)
+            self._banks = [self._info(p) for p in paths]
+        return self._banks
+
+    def refresh(self) -> List[BankInfo]:
+        """Re-scan the roots (new, removed or edited banks)."""
+        self._banks = None
+        with self._lock:
+            self._loaded.clear()  # an edited bank must be reloaded
+        return self.banks()
+
+    def _info(self, path: Path) -> BankInfo:
+        meta = compiled_info(path)
+        if meta is None:  # new or changed: parse once, which compiles it
+            quiz = self.get(path)
+            return BankInfo(path, quiz.title, len(quiz))
+        return BankInfo(path, meta["title"], meta["count"])
+
+    def find(self, query: str) -> List[BankInfo]:
+        """Banks whose title or path contains query (case-insensitive)."""
+        query = query.lower()
+        return [
+            bank
+            for bank in self.banks()
+            if query in bank.title.lower() or query in str(bank.path).lower()
+        ]
+
+    # -- loading -----------------------------------------------------------
+
+    def get(self, bank: Union[BankInfo, str, Path]) -> Quiz:
+        """The parsed bank, from the LRU or loaded now."""
+        path = bank.path if isinstance(bank, BankInfo) else Path(bank)
+        with self._lock:
+            quiz = self._loaded.get(path)
+            if quiz is not None:
+                self._loaded.move_to_end(path)
+                self._stats["hits"] += 1
+                return quiz
+        quiz = Quiz.load(path)
+        with self._lock:
+            self._stats["loads"] += 1
+            self._loaded[path] = quiz
+            self._loaded.move_to_end(path)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+                self._stats["evictions"] += 1
+        return quiz
+
+    # -- sessions ----------------------------------------------------------
+
+    def sample(
+        self,
+        banks: Optional[Iterable[BankInfo]] = None,
+        count: Optional[int] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Iterator[Tuple[BankInfo, Question]]:
+        """
+        Questions drawn uniformly over all terms of the given banks (default
+        every bank), without repeats; count=None asks every term once.
+        Distractors come from the question's own bank.
+        """
+        rng = rng or random
+        chosen = [b for b in (self.banks() if banks is None else banks) if b.size]
+        ends: List[int] = []
+        total = 0
+        for bank in chosen:
+            total += bank.size
+            ends.append(total)
+        count = total if count is None else min(count, total)
+        for position in rng.sample(range(total), count):
+            i = bisect.bisect_right(ends, position)
+            bank = chosen[i]
+            index = position - (ends[i] - bank.size)
+            yield bank, self.get(bank).question(index, rng=rng)
+
+    def stats(self) -> Dict[str, int]:
+        """banks, terms, loaded, hits, loads, evictions."""
+        banks = self.banks()
+        with self._lock:
+            return {
+                "banks": len(banks),
+                "terms": sum(b.size for b in banks),
+                "loaded": len(self._loaded),
+                **self._stats,
+            }
@@ -0,0 +1,285 @@
+"""
+Quiz banks: loading, compiled cache and question sampling.
+
+A bank is a JSON object mapping each term to its definition, plus an
+optional "__title__". Quiz keeps terms and definitions in two parallel
+sequences, so a question is built from indexes:
+
+- distractors are drawn by rejection sampling over random indexes, O(1)
+  per question instead of copying every other definition;
+- Quiz.load() can keep a compiled copy of the bank (one UTF-8 blob plus an
+  offsets table) and memory-map it on the next launch, so start-up no
+  longer parses the JSON. The compiled file records the source's size and
+  mtime and is rebuilt whenever the JSON changes.
+
+Compiled banks live in ~/.cache/terminal-quiz (override with the
+TERMINAL_QUIZ_CACHE environment variable).
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+TITLE_KEY = "__title__"
+DEFAULT_TITLE = "Vocabulary"
+
+_MAGIC = b"TQZ1"
+_HEADER = struct.Struct("<4sI")  # magic, metadata length
+
+
+def cache_dir() -> Path:
+    default = Path.home() / ".cache" / "terminal-quiz"
+    return Path(os.environ.get("TERMINAL_QUIZ_CACHE", default))
+
+
+@dataclass
+class Question:
+    term: str
+    choices: List[str]
+    answer: int  # index into choices
+
+
+class _PackedStrings(Sequence[str]):
+    """Strings decoded on access from a memory-mapped blob."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview, start: int, count: int):
+        self._blob = blob
+        self._offsets = offsets
+        self._start = start
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        i = self._start + index
+        return str(self._blob[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+
+
+class Quiz:
+    """A bank of (term, definition) pairs with index-based sampling."""
+
+    def __init__(
+        self,
+        title: str,
+        terms: Sequence[str],
+        definitions: Sequence[str],
+        source: Optional[Path] = None,
+    ):
+        if len(terms) != len(definitions):
+            raise ValueError(f"{len(terms)} terms but {len(definitions)} definitions")
+        self.title = title
+        self.terms = terms
+        self.definitions = definitions
+        self.source = source
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str], source: Optional[Path] = None) -> "Quiz":
+        terms = [k for k in data if k != TITLE_KEY]
+        return cls(
+            data.get(TITLE_KEY, DEFAULT_TITLE),
+            terms,
+            [data[k] for k in terms],
+            source,
+        )
+
+    @classmethod
+    def from_json(cls, path: Union[str, Path]) -> "Quiz":
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f), path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], compiled: bool = True) -> "Quiz":
+        """
+        Load a JSON bank, through its compiled copy when compiled=True.
+
+        The compiled copy is (re)built if missing or older than the JSON;
+        if the cache directory is not writable the JSON is used directly.
+        """
+        path = Path(path)
+        if not compiled:
+            return cls.from_json(path)
+        target = compiled_path(path)
+        quiz = cls.open_compiled(target, path)
+        if quiz is not None:
+            return quiz
+        quiz = cls.from_json(path)
+        try:
+            quiz.compile(target)
+        except OSError:
+            return quiz
+        return cls.open_compiled(target, path) or quiz
+
+    # -- compiled form -----------------------------------------------------
+
+    def compile(self, target: Union[str, Path]) -> None:
+        """Write the packed form: header, offsets (uint64), UTF-8 blob."""
+        target = Path(target)
+        stat = self.source.stat() if self.source else None
+        meta = json.dumps(
+            {
+                "title": self.title,
+                "count": len(self),
+                "source_size": stat.st_size if stat else None,
+                "source_mtime_ns": stat.st_mtime_ns if stat else None,
+            }
+        ).encode("utf-8")
+        offsets = array("Q", [0])
+        chunks = []
+        for strings in (self.terms, self.definitions):
+            for text in strings:
+                data = text.encode("utf-8")
+                chunks.append(data)
+                offsets.append(offsets[-1] + len(data))
+        pad = -(_HEADER.size + len(meta)) % 8  # keep the offsets 8-byte aligned
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(meta) + pad))
+            f.write(meta + b" " * pad)
+            f.write(offsets.tobytes())
+            for data in chunks:
+                f.write(data)
+        os.replace(tmp, target)  # atomic: readers see the old or new file
+
+    @classmethod
+    def open_compiled(
+        cls, target: Union[str, Path], source: Optional[Path] = None
+    ) -> Optional["Quiz"]:
+        """
+        Memory-map a compiled bank; None if missing, truncated or corrupt,
+        or stale for source.
+        """
+        try:
+            with open(target, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # missing, or empty file
+            return None
+        try:
+            magic, meta_len = _HEADER.unpack_from(mapped)
+            if magic != _MAGIC:
+                raise ValueError("not a compiled bank")
+            meta = json.loads(mapped[_HEADER.size : _HEADER.size + meta_len])
+            count = meta["count"]
+            start = _HEADER.size + meta_len
+            end = start + 8 * (2 * count + 1)
+            # The last offset is the blob length; a cut-off file is rebuilt
+            (blob_len,) = struct.unpack_from("Q", mapped, end - 8)
+            if len(mapped) < end + blob_len:
+                raise ValueError("truncated compiled bank")
+            stale = False
+            if source is not None:
+                stat = source.stat()
+                stale = (meta["source_size"], meta["source_mtime_ns"]) != (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+        except (struct.error, ValueError, KeyError, TypeError):
+            mapped.close()
+            return None
+        if stale:
+            mapped.close()
+            return None
+        view = memoryview(mapped)
+        offsets = view[start:end].cast("Q")
+        blob = view[end:]
+        quiz = cls(
+            meta["title"],
+            _PackedStrings(blob, offsets, 0, count),
+            _PackedStrings(blob, offsets, count, count),
+            source,
+        )
+        quiz._mmap = mapped
+        return quiz
+
+    # -- sampling ----------------------------------------------------------
+
+    def distractors(
+        self, index: int, k: int = 3, rng: Optional[random.Random] = None
+    ) -> List[int]:
+        """
+        k distinct indexes other than `index`, by rejection sampling.
+
+        Expected O(k) draws while k is small next to the bank; tiny banks
+        fall back to sampling from the full range.
+        """
+        rng = rng or random
+        n = len(self)
+        k = min(k, n - 1)
+        if n <= 4 * (k + 1):
+            return rng.sample([i for i in range(n) if i != index], k)
+        picked: List[int] = []
+        while len(picked) < k:
+            i = rng.randrange(n)
+            if i != index and i not in picked:
+                picked.append(i)
+        return picked
+
+    def question(
+        self, index: int, choices: int = 4, rng: Optional[random.Random] = None
+    ) -> Question:
+        """Term `index` with its definition among choices - 1 distractors."""
+        rng = rng or random
+        options = self.distractors(index, choices - 1, rng) + [index]
+        rng.shuffle(options)
+        return Question(
+            self.terms[index],
+            [self.definitions[i] for i in options],
+            options.index(index),
+        )
+
+    def order(self, rng: Optional[random.Random] = None) -> List[int]:
+        """All question indexes in random order."""
+        indexes = list(range(len(self)))
+        (rng or random).shuffle(indexes)
+        return indexes
+
+
+def compiled_info(source: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """
+    Title and term count of a bank from its compiled header alone; None if
+    it has no compiled copy or the JSON changed since.
+    """
+    source = Path(source)
+    try:
+        with open(compiled_path(source), "rb") as f:
+            magic, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+            meta = json.loads(f.read(meta_len))
+        stat = source.stat()
+        # A malformed header counts as stale (KeyError / TypeError)
+        fresh = (
+            magic == _MAGIC
+            and meta["source_size"] == stat.st_size
+            and meta["source_mtime_ns"] == stat.st_mtime_ns
+            and isinstance(meta["title"], str)
+            and isinstance(meta["count"], int)
+        )
+    except (OSError, struct.error, ValueError, KeyError, TypeError):
+        return None
+    return meta if fresh else None
+
+
+def compiled_path(source: Union[str, Path]) -> Path:
+    """Cache file for a bank, keyed by its absolute path."""
+    resolved = str(Path(source).resolve())
+    digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:16]
+    return cache_dir() / f"{Path(source).stem}-{digest}.tqz"
@@ -0,0 +1,313 @@
+"""
+Spaced repetition (SM-2) for quiz banks, with progress kept on disk.
+
+Each term the learner has seen gets a card: ease factor, interval (days),
+repetitions, lapses and the time it is next due. After every answer the
+card is rescheduled with SM-2 and written straight to a SQLite store, so
+quitting mid-session loses nothing.
+
+A review session (Scheduler) asks, in order:
+
+1. cards already due, most overdue first. They are read from the store's
+   (bank, due) index a page at a time, so start-up cost does not grow with
+   the bank: a bank of 500k terms with 200 due cards reads 200 rows.
+2. up to new_per_session unseen terms, in bank order (a per-bank cursor
+   remembers where the last session stopped).
+3. cards missed in this session, again after a short delay (relearning).
+
+Scheduler keeps these in one heap keyed by due time.
+
+Progress lives in ~/.cache/terminal-quiz/progress.sqlite3 next to the
+compiled banks; the bank key is the JSON's resolved path.
+"""
+
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    from terminal_quiz.quiz import Quiz, cache_dir
+except ImportError:  # run as a script from a checkout, package not installed
+    from quiz import Quiz, cache_dir  # type: ignore[no-redef]
+
+DAY = 86400.0
+MIN_EASE = 1.3
+
+# Answer grades on SM-2's 0-5 scale
+GRADE_CORRECT = 4
+GRADE_WRONG = 1
+
+
+@dataclass(frozen=True)
+class Card:
+    term: str
+    position: int  # index of the term in its bank when last seen
+    ease: float = 2.5
+    interval: float = 0.0  # days
+    reps: int = 0  # successful reviews in a row
+    lapses: int = 0
+    due: float = 0.0  # epoch seconds
+
+
+def sm2(card: Card, grade: int, now: float) -> Card:
+    """Reschedule a card after an answer graded 0-5 (SM-2)."""
+    if grade < 3:
+        reps, interval, lapses = 0, 1.0, card.lapses + 1
+    else:
+        reps, lapses = card.reps + 1, card.lapses
+        if reps == 1:
+            interval = 1.0
+        elif reps == 2:
+            interval = 6.0
+        else:
+            interval = round(card.interval * card.ease, 2)
+    miss = 5 - grade
+    ease = max(MIN_EASE, card.ease + 0.1 - miss * (0.08 + miss * 0.02))
+    return replace(
+        card,
+        ease=round(ease, 3),
+        interval=interval,
+        reps=reps,
+        lapses=lapses,
+        due=now + interval * DAY,
+    )
+
+
+def default_store_path() -> Path:
+    return cache_dir() / "progress.sqlite3"
+
+
+class ProgressStore:
+    """Cards per (bank, term) in SQLite, indexed by due time."""
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        path = Path(path) if path else default_store_path()
+        if str(path) != ":memory:":
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._bank_ids: Dict[str, int] = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS banks (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    new_cursor INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS cards (
+                    bank INTEGER NOT NULL,
+                    term TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    ease REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    reps INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    due REAL NOT NULL,
+                    PRIMARY KEY (bank, term)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS cards_due ON cards (bank, due);
+                """)
+
+    def bank_id(self, key: str) -> int:
+        bank = self._bank_ids.get(key)
+        if bank is None:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO banks (key) VALUES (?)", (key,)
+                )
+                (bank,) = self._conn.execute(
+                    "SELECT id FROM banks WHERE key = ?", (key,)
+                ).fetchone()
+            self._bank_ids[key] = bank
+        return bank
+
+    def get(self, key: str, term: str) -> Optional[Card]:
+        bank = self.bank_id(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT term, position, ease, interval, reps, lapses, due"
+                " FROM cards WHERE bank = ? AND term = ?",
+                (bank, term),
+            ).fetchone()
+        return Card(*row) if row else None
+
+    def due(
+        self,
+        key: str,
+        now: float,
+        limit: int,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> List[Card]:
+        """Up to limit cards due by now, most overdue first, after a (due, term)."""
+        bank = self.bank_id(key)
+        due, term = after or (float("-inf"), "")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT term, position, ease, interval, reps, lapses, due"
+                " FROM cards WHERE bank = ? AND due BETWEEN ? AND ?"
+                " AND (due > ? OR term > ?)"
+                " ORDER BY due, term LIMIT ?",
+                (bank, due, now, due, term, limit),
+            ).fetchall()
+        return [Card(*row) for row in rows]
+
+    def save(self, key: str, card: Card) -> None:
+        """Write one card (committed immediately)."""
+        bank = self.bank_id(key)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cards"
+                " (bank, term, position, ease, interval, reps, lapses, due)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    bank,
+                    card.term,
+                    card.position,
+                    card.ease,
+                    card.interval,
+                    card.reps,
+                    card.lapses,
+                    card.due,
+                ),
+            )
+
+    def new_cursor(self, key: str) -> int:
+        bank = self.bank_id(key)
+        with self._lock:
+            (cursor,) = self._conn.execute(
+                "SELECT new_cursor FROM banks WHERE id = ?", (bank,)
+            ).fetchone()
+        return cursor
+
+    def set_new_cursor(self, key: str, cursor: int) -> None:
+        bank = self.bank_id(key)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE banks SET new_cursor = ? WHERE id = ?", (cursor, bank)
+            )
+
+    def counts(self, key: str, now: float) -> Dict[str, int]:
+        """Cards seen and cards due now for a bank."""
+        bank = self.bank_id(key)
+        with self._lock:
+            (seen,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cards WHERE bank = ?", (bank,)
+            ).fetchone()
+            (due,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cards WHERE bank = ? AND due <= ?", (bank, now)
+            ).fetchone()
+        return {"seen": seen, "due": due}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class Scheduler:
+    """One review session over a bank: due cards, then new, then relearning."""
+
+    def __init__(
+        self,
+        quiz: Quiz,
+        store: ProgressStore,
+        key: Optional[str] = None,
+        new_per_session: int = 20,
+        relearn_delay: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        key: the bank's id in the store (default: its resolved source path).
+        new_per_session: unseen terms introduced in this session.
+        relearn_delay: seconds before a missed card is asked again.
+        """
+        if key is None:
+            if quiz.source is None:
+                raise ValueError("quiz has no source path; pass key")
+            key = str(Path(quiz.source).resolve())
+        self.quiz = quiz
+        self.store = store
+        self.key = key
+        self.new_left = new_per_session
+        self.relearn_delay = relearn_delay
+        self.clock = clock
+        self.started = clock()
+        self._heap: List[Tuple[float, int, Card]] = []
+        self._seq = itertools.count()
+        self._due_after: Optional[Tuple[float, str]] = None
+        self._due_done = False
+        self._cursor = store.new_cursor(key)
+        self._positions: Optional[Dict[str, int]] = None
+
+    # -- queue -------------------------------------------------------------
+
+    def _push(self, card: Card, due: float) -> None:
+        heapq.heappush(self._heap, (due, next(self._seq), card))
+
+    def _refill_due(self, page: int = 256) -> None:
+        """Next page of stored cards due at session start."""
+        cards = self.store.due(self.key, self.started, page, self._due_after)
+        self._due_done = len(cards) < page
+        for card in cards:
+            self._due_after = (card.due, card.term)
+            position = self._locate(card)
+            if position is not None:
+                self._push(replace(card, position=position), card.due)
+
+    def _locate(self, card: Card) -> Optional[int]:
+        """Current index of a card's term (the bank may have been edited)."""
+        n = len(self.quiz)
+        if card.position < n and self.quiz.terms[card.position] == card.term:
+            return card.position
+        if self._positions is None:
+            self._positions = {term: i for i, term in enumerate(self.quiz.terms)}
+        return self._positions.get(card.term)  # None: term was removed
+
+    def _next_new(self) -> Optional[Card]:
+        while self.new_left > 0 and self._cursor < len(self.quiz):
+            position = self._cursor
+            self._cursor += 1
+            term = self.quiz.terms[position]
+            if self.store.get(self.key, term) is None:
+                self.new_left -= 1
+                return Card(term, position)
+        return None
+
+    def next(self) -> Optional[Card]:
+        """The card to ask now, or None when the session is over."""
+        if not self._due_done and (not self._heap or self._heap[0][0] > self.started):
+            self._refill_due()
+        if self._heap and self._heap[0][0] <= self.clock():
+            return heapq.heappop(self._heap)[2]
+        card = self._next_new()
+        if card is not None:
+            return card
+        if self._heap:  # only relearning cards left: ask them early
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    # -- answers -----------------------------------------------------------
+
+    def answer(self, card: Card, grade: int) -> Card:
+        """Record an answer (0-5): reschedule, persist, and requeue a miss."""
+        now = self.clock()
+        updated = sm2(card, grade, now)
+        self.store.save(self.key, updated)
+        if card.reps == 0 and card.lapses == 0 and card.due == 0.0:
+            self.store.set_new_cursor(self.key, self._cursor)
+        if grade < 3:
+            self._push(updated, now + self.relearn_delay)
+        return updated
+
+    def stats(self) -> Dict[str, int]:
+        """Cards seen and due in the store, queued and new left this session."""
+        return {
+            **self.store.counts(self.key, self.clock()),
+            "queued": len(self._heap),
+            "new_left": self.new_left,
+        }
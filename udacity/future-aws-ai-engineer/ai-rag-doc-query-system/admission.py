@@ -0,0 +1,278 @@
+"""
+Admission control for Bedrock model calls: RPM / TPM budgets per model.
+
+Bedrock enforces requests-per-minute and tokens-per-minute quotas per model.
+Exceeding them used to show up only as ThrottlingException, after which
+botocore and call_with_backoff retried on top of each other and latency
+climbed for every user at once. The AdmissionController keeps us under
+the quotas instead:
+
+- Two token buckets per model: requests (capacity rpm, refilled rpm/60 per
+  second) and tokens (capacity tpm). A call takes 1 request and its
+  estimated tokens (prompt length + max_tokens, as Bedrock reserves them).
+  settle() corrects the token bucket once the real usage is known.
+- Callers that cannot be admitted yet wait in a per-model priority queue:
+  INTERACTIVE (chat) ahead of BATCH (batch_qa.py), FIFO within a priority.
+- Load is shed fast: a request is rejected on arrival with Overloaded when
+  the queue is full or its predicted wait exceeds the priority's max_wait,
+  rather than after sitting in the queue until a timeout.
+- stats() exposes queue depth (per priority), admitted/shed counts and
+  bucket levels.
+
+The priority comes from the calling context (see priority()), so code deep
+inside bedrock_utils does not need it passed down.
+"""
+
+import contextvars
+import heapq
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from tokens import approx_tokens
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar(
+    "admission_priority", default=INTERACTIVE
+)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Run the block's Bedrock calls at this priority (INTERACTIVE / BATCH)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(RuntimeError):
+    """Raised instead of queueing when a request cannot be admitted in time."""
+
+    def __init__(self, model_id: str, reason: str, retry_after: float):
+        super().__init__(f"{model_id}: {reason} (retry in {retry_after:.1f}s)")
+        self.model_id = model_id
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def estimate_request_tokens(body: str) -> int:
+    """Input tokens (approximate) + max_tokens for an invoke_model body."""
+    request = json.loads(body)
+    if "inputText" in request:  # Titan embeddings
+        return approx_tokens(request["inputText"])
+    texts: List[str] = [request.get("system", "")]
+    for message in request.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(part.get("text", "") for part in content)
+    return approx_tokens(" ".join(texts)) + int(request.get("max_tokens", 0))
+
+
+class TokenBucket:
+    """Holds up to one minute of budget, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (after refill())."""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+
+
+@dataclass
+class Ticket:
+    """An admitted call; pass to settle() with the real token usage."""
+
+    model_id: str
+    tokens: int
+    waited_s: float = 0.0
+
+
+class _Lane:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        # A zero / None limit is unlimited: that bucket is skipped
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.queue: List[_Waiter] = []
+        self.admitted = 0
+        self.shed = 0
+
+    def buckets(self) -> List[TokenBucket]:
+        return [b for b in (self.requests, self.tokens) if b is not None]
+
+    def refill(self, now: float) -> None:
+        for bucket in self.buckets():
+            bucket.refill(now)
+
+    def wait_time(self, requests: int, tokens: int) -> float:
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(requests))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def take(self, requests: int, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.tokens -= requests
+        if self.tokens is not None:
+            self.tokens.tokens -= tokens
+
+
+class AdmissionController:
+    """Per-model RPM/TPM token buckets with a priority wait queue."""
+
+    def __init__(
+        self,
+        limits: Mapping[str, Tuple[float, float]],
+        max_queue: int = 64,
+        max_wait: Optional[Mapping[int, float]] = None,
+    ):
+        """
+        limits: model id -> (requests per minute, tokens per minute); models
+            not listed are not limited, and a 0 / None limit is unlimited.
+        max_queue: waiting requests per model before new ones are shed.
+        max_wait: priority -> longest predicted wait (seconds) to accept.
+        """
+        self._lanes = {
+            model: _Lane(rpm, tpm) for model, (rpm, tpm) in limits.items() if rpm or tpm
+        }
+        self.max_queue = max_queue
+        self.max_wait = {INTERACTIVE: 10.0, BATCH: 300.0, **(max_wait or {})}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(
+        self, model_id: str, tokens: int, level: Optional[int] = None
+    ) -> Ticket:
+        """
+        Block until the call fits both budgets; raise Overloaded if it won't
+        within max_wait (decided on arrival, or when the deadline passes
+        after higher-priority work jumped ahead).
+        """
+        lane = self._lanes.get(model_id)
+        if lane is None:
+            return Ticket(model_id, 0)
+        level = _priority.get() if level is None else level
+        max_wait = self.max_wait.get(level, self.max_wait[BATCH])
+        if lane.tokens is not None:
+            tokens = int(min(tokens, lane.tokens.capacity))  # never unadmittable
+        start = time.monotonic()
+        with self._cond:
+            lane.refill(start)
+            if len(lane.queue) >= self.max_queue:
+                self._shed(lane, model_id, "queue full", lane.wait_time(1, tokens))
+            ahead = [w for w in lane.queue if w.priority <= level]
+            predicted = lane.wait_time(
+                len(ahead) + 1, sum(w.tokens for w in ahead) + tokens
+            )
+            if predicted > max_wait:
+                self._shed(lane, model_id, "over budget", predicted)
+
+            waiter = _Waiter(level, next(self._seq), tokens)
+            heapq.heappush(lane.queue, waiter)
+            deadline = start + max_wait
+            waited = False
+            while True:
+                now = time.monotonic()
+                lane.refill(now)
+                timeout = deadline - now
+                if lane.queue[0] is waiter:
+                    wait = lane.wait_time(1, tokens)
+                    if wait <= 0:
+                        heapq.heappop(lane.queue)
+                        lane.take(1, tokens)
+                        lane.admitted += 1
+                        self._cond.notify_all()  # next in line re-checks
+                        return Ticket(model_id, tokens, now - start if waited else 0.0)
+                    timeout = min(timeout, wait)
+                if now >= deadline:
+                    lane.queue.remove(waiter)
+                    heapq.heapify(lane.queue)
+                    self._cond.notify_all()
+                    self._shed(lane, model_id, "timed out", lane.wait_time(1, tokens))
+                self._cond.wait(timeout)
+                waited = True
+
+    def _shed(self, lane: _Lane, model_id: str, reason: str, retry_after: float):
+        lane.shed += 1
+        raise Overloaded(model_id, reason, retry_after)
+
+    def settle(self, ticket: Ticket, actual_tokens: int) -> None:
+        """Replace the estimate with the real usage (refund or charge)."""
+        lane = self._lanes.get(ticket.model_id)
+        if lane is None or lane.tokens is None or not ticket.tokens:
+            return
+        with self._cond:
+            lane.tokens.tokens = min(
+                lane.tokens.capacity,
+                lane.tokens.tokens + ticket.tokens - actual_tokens,
+            )
+            self._cond.notify_all()
+
+    def scale(self, factor: float) -> None:
+        """
+        Multiply every budget by factor, e.g. 1 / workers when each server
+        process runs its own controller against the shared account quota.
+        """
+        with self._cond:
+            for lane in self._lanes.values():
+                for bucket in lane.buckets():
+                    bucket.capacity *= factor
+                    bucket.rate *= factor
+                    bucket.tokens = min(bucket.tokens, bucket.capacity)
+            self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(lane.queue) for lane in self._lanes.values())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """model -> queued (total and per priority), admitted, shed, budgets left."""
+        with self._cond:
+            now = time.monotonic()
+            out = {}
+            for model_id, lane in sorted(self._lanes.items()):
+                lane.refill(now)
+                queued = {name: 0 for name in PRIORITY_NAMES.values()}
+                for waiter in lane.queue:
+                    queued[PRIORITY_NAMES.get(waiter.priority, "batch")] += 1
+                out[model_id] = {
+                    "queued": len(lane.queue),
+                    **{f"queued_{name}": n for name, n in queued.items()},
+                    "admitted": lane.admitted,
+                    "shed": lane.shed,
+                    # None: that budget is unlimited
+                    "requests_available": (
+                        round(lane.requests.tokens, 1) if lane.requests else None
+                    ),
+                    "tokens_available": (
+                        round(lane.tokens.tokens) if lane.tokens else None
+                    ),
+                }
+            return out
@@ -1,8 +1,24 @@
 import os
 
+import constants as const
 import streamlit as st
-from bedrock_utils import generate_response, query_knowledge_base, valid_prompt
+from admission import Overloaded
+from bedrock_utils import (
+    AUTO,
+    admission,
+    classify_and_retrieve,
+    flights,
+    make_conversation_memory,
+    make_response_cache,
+    metrics,
+    model_metrics,
+    prompt_classifier,
+    retrieval_cache,
+    router,
+    stream_answer,
+)
 from dotenv import load_dotenv
+from rag_client import RagClient
 
 # ----------------------------------------------------------
 # CONFIGURATION
@@ -11,6 +27,37 @@ load_dotenv()  # loads values from .env into environment
 
 kb_id_output = os.getenv("KB_ID", "")  # fallback to empty string if missing
 
+
+# One answer cache per server process, shared by every session and rerun
+@st.cache_resource
+def get_response_cache():
+    return make_response_cache()
+
+
+response_cache = get_response_cache()
+
+# With rag_server_url set the pipeline runs in server.py and this script only
+# renders the chat (answers then use the server's RAG prompt)
+rag_server_url = getattr(const, "rag_server_url", "") or os.getenv("RAG_SERVER_URL", "")
+rag_client = RagClient(rag_server_url) if rag_server_url else None
+
+
+def show_busy(error):
+    """Over the Bedrock quota: fail fast with a retry hint, skip the turn."""
+    st.warning(
+        f"The assistant is busy right now, please retry in "
+        f"{max(1, round(error.retry_after))} s."
+    )
+    st.stop()
+
+
+def build_chat_prompt(question, kb_results):
+    """Context + question prompt sent to the LLM for this chat UI."""
+    # Extract text chunks from retrieved results
+    context = "\n".join([result["content"]["text"] for result in kb_results])
+    return f"Context: {context}\n\nUser: {question}\n\n"
+
+
 # ------------------------------------------------------------
 # Streamlit application serving as a simple chat UI for AWS
 # Bedrock. It interacts with both a Knowledge Base (RDS/S3)
@@ -28,12 +75,12 @@ st.title("Bedrock Chat Application")
 # ------------------------------------------------------------
 st.sidebar.header("Configuration")
 
+# "Auto" routes each question to the small or large model (model_router.py);
+# prompts are always classified with the fast classifier model
 model_id = st.sidebar.selectbox(
     "Select LLM Model",
-    [
-        "anthropic.claude-3-haiku-20240307-v1:0",
-        "anthropic.claude-3-5-sonnet-20240620-v1:0",
-    ],
+    [AUTO, router.small_model, router.large_model],
+    format_func=lambda m: "Auto (route per question)" if m == AUTO else m,
 )
 
 # ID of the Bedrock Knowledge Base to query
@@ -49,50 +96,155 @@ temperature = st.sidebar.select_slider("Temperature", [i / 10 for i in range(0,
 
 top_p = st.sidebar.select_slider("Top_P", [i / 1000 for i in range(0, 1001)], 1)
 
+cache_stats = response_cache.stats()
+st.sidebar.caption(
+    f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['hit_rate']:.0%})"
+)
+# Retrieval is cached separately from answers (see retrieval_cache.py)
+if retrieval_cache is not None:
+    retrieval_stats = retrieval_cache.stats()
+    st.sidebar.caption(
+        f"Retrieval cache: {retrieval_stats['hits']} hits / "
+        f"{retrieval_stats['misses']} misses ({retrieval_stats['hit_rate']:.0%}), "
+        f"{retrieval_stats['saved_ms'] / 1000:.1f} s saved"
+    )
+classifier_stats = prompt_classifier.stats()
+st.sidebar.caption(
+    f"Classifier: {classifier_stats['llm_calls_avoided']} of "
+    f"{classifier_stats['calls']} LLM calls avoided"
+)
+
+# Identical requests from concurrent sessions that shared one upstream call
+coalesced = sum(group["shared"] for group in flights.stats().values())
+if coalesced:
+    st.sidebar.caption(f"Coalesced: {coalesced} duplicate in-flight calls shared")
+
+# Requests waiting for Bedrock RPM/TPM budget (see admission.py)
+if admission is not None and admission.queue_depth():
+    st.sidebar.caption(f"Queued for Bedrock: {admission.queue_depth()} requests")
+
+# Per-stage latency since the server started (see metrics.py)
+stage_stats = metrics.summary()
+if getattr(const, "metrics_sidebar", True) and stage_stats:
+    with st.sidebar.expander("Latency by stage"):
+        st.table(
+            [
+                {
+                    "stage": stage,
+                    "calls": values["calls"],
+                    "p50 ms": values["p50_ms"],
+                    "p95 ms": values["p95_ms"],
+                }
+                for stage, values in stage_stats.items()
+            ]
+        )
+
+# Per-model latency and generation speed, to tune the routing thresholds
+model_stats = model_metrics.summary()
+if getattr(const, "metrics_sidebar", True) and model_stats:
+    with st.sidebar.expander("Latency by model"):
+        routes = router.stats()["models"]
+        st.table(
+            [
+                {
+                    "model": model,
+                    "calls": values["calls"],
+                    "routed": routes.get(model, 0),
+                    "p50 ms": values["p50_ms"],
+                    "p95 ms": values["p95_ms"],
+                    "tokens/s": values["output_tokens_per_s"],
+                }
+                for model, values in model_stats.items()
+            ]
+        )
+
 # ------------------------------------------------------------
-# Maintain chat history using Streamlit session state
+# Maintain chat history using Streamlit session state: a bounded
+# transcript for display, and a token-bounded window + running
+# summary that is sent to the model with each question
 # ------------------------------------------------------------
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# Render previous messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+if "memory" not in st.session_state:
+    st.session_state.memory = make_conversation_memory(model_id)
+    st.session_state.history_pages = 1
+memory = st.session_state.memory
+
+# Render only the newest page(s) of messages; older ones on demand
+if st.session_state.history_pages < memory.page_count():
+    if st.button("Show older messages"):
+        st.session_state.history_pages += 1
+for page in reversed(range(st.session_state.history_pages)):
+    for message in memory.page(page):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
 
 # ------------------------------------------------------------
 # Main chat input and response flow
 # ------------------------------------------------------------
 if prompt := st.chat_input("What would you like to know?"):
-    # Store and display user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Validate prompt for selected model
-    if valid_prompt(prompt, model_id):
-        # ------------------------------------------------------------
-        # Query the Bedrock Knowledge Base for relevant context
-        # ------------------------------------------------------------
-        kb_results = query_knowledge_base(prompt, kb_id)
-
-        # Extract text chunks from retrieved results
-        context = "\n".join([result["content"]["text"] for result in kb_results])
-
-        # ------------------------------------------------------------
-        # Construct final prompt and send to the LLM
-        # ------------------------------------------------------------
-        full_prompt = f"Context: {context}\n\nUser: {prompt}\n\n"
-        response = generate_response(full_prompt, model_id, temperature, top_p)
-
-    else:
-        # Fallback response if prompt is invalid for chosen model
-        response = "I'm unable to answer this, please try again."
+    # ------------------------------------------------------------
+    # Validate the prompt and query the Knowledge Base at the same time
+    # (short follow-ups are retrieved together with the previous question)
+    # ------------------------------------------------------------
+    try:
+        if rag_client is not None:
+            result, deltas = rag_client.stream(
+                prompt,
+                model_id,
+                kb_id,
+                temperature,
+                top_p,
+                history=memory.history_messages(),
+                retrieval_question=memory.contextualize(prompt),
+            )
+        else:
+            result = classify_and_retrieve(
+                prompt, model_id, kb_id, memory.contextualize(prompt)
+            )
+    except Overloaded as e:
+        with st.chat_message("assistant"):
+            show_busy(e)
 
     # ------------------------------------------------------------
-    # Display model's response and store it in conversation history
+    # Stream the model's response (repeats hit the cache) and store it
+    # in conversation history
     # ------------------------------------------------------------
     with st.chat_message("assistant"):
-        st.markdown(response)
-
-    st.session_state.messages.append({"role": "assistant", "content": response})
+        if result.allowed:
+            if rag_client is None:
+                deltas = stream_answer(
+                    result,
+                    prompt,
+                    model_id,
+                    temperature,
+                    top_p,
+                    cache=response_cache,
+                    prompt_builder=build_chat_prompt,
+                    history=memory.history_messages(),
+                )
+            try:
+                response = st.write_stream(deltas)
+            except Overloaded as e:
+                show_busy(e)
+        else:
+            # Fallback response if prompt is invalid for chosen model
+            response = "I'm unable to answer this, please try again."
+            st.markdown(response)
+        caption = " · ".join(
+            f"{stage} {ms:.0f} ms" for stage, ms in result.timings.items()
+        )
+        if result.allowed and model_id == AUTO:
+            caption += f" · {result.model_id} ({result.route_reason})"
+        if result.context_report:
+            caption += (
+                f" · context tokens saved {result.context_report['tokens_saved']}"
+            )
+        st.caption(caption)
+
+    # Rejected turns stay on screen but are never sent back to the model
+    memory.add("user", prompt, context=result.allowed)
+    memory.add("assistant", response, context=result.allowed)
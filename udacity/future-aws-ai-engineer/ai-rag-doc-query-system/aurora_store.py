@@ -0,0 +1,188 @@
+"""
+Pooled data-access layer for the Aurora pgvector table behind the KB.
+
+scripts/connect_and_test.py opens a fresh connection and fetches Secrets
+Manager credentials on every run. This module is the reusable version:
+
+- SecretCache: Secrets Manager credentials cached in-process, refreshed
+  after a TTL (so rotation is picked up without a call per connection).
+- AuroraVectorStore: psycopg connection pool; new pool connections read the
+  cached credentials, so a rotated password is used on reconnect.
+- similarity_search: cosine top-k over the `embedding` column, executed as a
+  server-side prepared statement; results use the Bedrock retrievalResults
+  shape so they can stand in for query_knowledge_base.
+- ingest: bulk COPY of (id, embedding, chunks, metadata) rows, optionally
+  upserting through a temp staging table.
+
+Table (see scripts/aurora_sql.sql and stack2 `aurora_*_field` settings):
+
+    bedrock_integration.bedrock_kb (
+        id uuid PRIMARY KEY, embedding vector(1536), chunks text, metadata json)
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import boto3
+from psycopg_pool import ConnectionPool
+
+from local_retrieval import to_retrieval_result
+
+DEFAULT_TABLE = "bedrock_integration.bedrock_kb"
+
+
+def vector_literal(embedding: Sequence[float]) -> str:
+    """pgvector text form, e.g. '[0.1,0.2]' (valid for parameters and COPY)."""
+    return "[" + ",".join(repr(float(v)) for v in embedding) + "]"
+
+
+# ---------------------------------------------------------------------------
+# Credentials
+# ---------------------------------------------------------------------------
+
+
+class SecretCache:
+    """Secrets Manager DB credentials, cached for ttl_seconds."""
+
+    def __init__(
+        self,
+        secret_arn: str,
+        region_name: str,
+        ttl_seconds: float = 300,
+        profile_name: Optional[str] = None,
+    ):
+        self.secret_arn = secret_arn
+        self.ttl_seconds = ttl_seconds
+        session = boto3.Session(profile_name=profile_name, region_name=region_name)
+        self._client = session.client("secretsmanager")
+        self._value: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._value is None or time.time() - self._fetched_at > self.ttl_seconds:
+                resp = self._client.get_secret_value(SecretId=self.secret_arn)
+                self._value = json.loads(resp["SecretString"])
+                self._fetched_at = time.time()
+            return self._value
+
+    def connect_kwargs(self) -> Dict[str, Any]:
+        """psycopg connection parameters from the secret."""
+        creds = self.get()
+        return {
+            "host": creds["host"],
+            "port": creds.get("port", 5432),
+            # prefer "dbname", but fall back to "db" if needed
+            "dbname": creds.get("dbname") or creds.get("db"),
+            "user": creds["username"],
+            "password": creds["password"],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Vector store
+# ---------------------------------------------------------------------------
+
+
+class AuroraVectorStore:
+    """Similarity search and bulk ingest over one pgvector table."""
+
+    def __init__(
+        self,
+        conninfo: str = "",
+        secrets: Optional[SecretCache] = None,
+        table: str = DEFAULT_TABLE,
+        min_size: int = 1,
+        max_size: int = 10,
+        connect_timeout: float = 10,
+    ):
+        # Callable kwargs: every new pool connection reads the cached secret
+        kwargs = (
+            (lambda: {**secrets.connect_kwargs(), "connect_timeout": connect_timeout})
+            if secrets
+            else {"connect_timeout": connect_timeout}
+        )
+        self.table = table
+        self.pool = ConnectionPool(
+            conninfo,
+            kwargs=kwargs,
+            min_size=min_size,
+            max_size=max_size,
+            open=True,
+            name="aurora-vector-store",
+        )
+        self._search_sql = (
+            "SELECT id, chunks, metadata, 1 - (embedding <=> %(q)s::vector) "
+            f"FROM {table} ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+        )
+
+    @classmethod
+    def from_secret(
+        cls, secret_arn: str, region_name: str, ttl_seconds: float = 300, **kwargs
+    ) -> "AuroraVectorStore":
+        return cls(secrets=SecretCache(secret_arn, region_name, ttl_seconds), **kwargs)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def similarity_search(
+        self, embedding: Sequence[float], k: int = 3, ef_search: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k chunks by cosine similarity, in retrievalResults shape.
+
+        ef_search: optional hnsw.ef_search for this query (recall vs speed).
+        """
+        params = {"q": vector_literal(embedding), "k": k}
+        with self.pool.connection() as conn:
+            if ef_search:  # SET LOCAL: scoped to this transaction, not the pool
+                conn.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+            rows = conn.execute(self._search_sql, params, prepare=True).fetchall()
+        results = []
+        for row_id, text, metadata, score in rows:
+            record = {"id": str(row_id), "text": text, "metadata": metadata or {}}
+            results.append(to_retrieval_result(record, float(score)))
+        return results
+
+    def ingest(self, rows: Iterable[Dict[str, Any]], upsert: bool = False) -> int:
+        """
+        Bulk-load chunk rows with COPY; returns the number of rows written.
+
+        rows: dicts with "text", "embedding", optional "id" (uuid) and
+        "metadata". With upsert=True rows go through a temp table and
+        replace existing ids; otherwise duplicate ids raise.
+        """
+        target = "_ingest_staging" if upsert else self.table
+        count = 0
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                if upsert:
+                    cur.execute(
+                        f"CREATE TEMP TABLE {target} (LIKE {self.table}) "
+                        "ON COMMIT DROP"
+                    )
+                with cur.copy(
+                    f"COPY {target} (id, embedding, chunks, metadata) FROM STDIN"
+                ) as copy:
+                    for row in rows:
+                        copy.write_row(
+                            (
+                                row.get("id") or str(uuid.uuid4()),
+                                vector_literal(row["embedding"]),
+                                row["text"],
+                                json.dumps(row.get("metadata", {})),
+                            )
+                        )
+                        count += 1
+                if upsert:
+                    cur.execute(
+                        f"INSERT INTO {self.table} SELECT * FROM {target} "
+                        "ON CONFLICT (id) DO UPDATE SET "
+                        "embedding = EXCLUDED.embedding, chunks = EXCLUDED.chunks, "
+                        "metadata = EXCLUDED.metadata"
+                    )
+        return count
@@ -0,0 +1,186 @@
+"""
+Lazy, shared boto3 clients for the RAG app.
+
+bedrock_utils used to build a Session and two clients at import time with the
+default botocore config. This module instead:
+
+- Creates the session/clients on first use (fast imports, and a missing
+  profile no longer breaks `import bedrock_utils`).
+- Shares one client per service across threads (boto3 clients are
+  thread-safe; session creation is guarded by a lock).
+- Exposes the HTTP pool size, timeouts, keep-alive and botocore retry mode.
+- Retries throttled and transient calls (5xx / model timeouts, dropped
+  connections, connect/read timeouts) with capped exponential backoff and
+  full jitter, so bursts of concurrent chat sessions don't retry in
+  lockstep. This is the only retry layer: botocore makes a single attempt
+  (max_attempts=1), so a call makes at most retries + 1 attempts in total.
+
+Note:
+- If the configured profile does not exist (e.g. on EC2/Lambda/ECS), we fall
+  back to the default credential chain (IAM role).
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from boto3.session import Session
+from botocore.config import Config
+from botocore.exceptions import (
+    BotoCoreError,
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ProfileNotFound,
+    ReadTimeoutError,
+)
+
+# Throttling errors worth retrying. ServiceQuotaExceededException is not one:
+# the quota stays exceeded until it is raised
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+}
+# Other transient service errors (botocore "standard" mode retries these)
+TRANSIENT_CODES = {
+    "ServiceUnavailableException",
+    "ServiceUnavailable",
+    "InternalServerException",
+    "InternalServerError",
+    "InternalFailure",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+}
+# Network failures raised before any response arrives
+TRANSIENT_ERRORS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+# Everything a call can raise once call_with_backoff gives up; callers that
+# fail closed catch this, not just ClientError
+AWS_ERRORS = (ClientError, BotoCoreError)
+
+
+class ClientFactory:
+    """Builds boto3 clients lazily and caches one per service name."""
+
+    def __init__(
+        self,
+        profile_name: Optional[str] = None,
+        region_name: Optional[str] = None,
+        max_pool_connections: int = 50,
+        connect_timeout: float = 5,
+        read_timeout: float = 60,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 1,
+        tcp_keepalive: bool = True,
+    ):
+        self.profile_name = profile_name
+        self.region_name = region_name
+        self.config = Config(
+            region_name=region_name,
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={"mode": retry_mode, "max_attempts": max_attempts},
+            tcp_keepalive=tcp_keepalive,
+        )
+        self._session: Optional[Session] = None
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def session(self) -> Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    try:
+                        self._session = Session(profile_name=self.profile_name)
+                    except ProfileNotFound:
+                        print(
+                            f"AWS profile {self.profile_name!r} not found; "
+                            "using the default credential chain."
+                        )
+                        self._session = Session()
+        return self._session
+
+    def client(self, service_name: str) -> Any:
+        """Shared client for service_name, created on first use."""
+        client = self._clients.get(service_name)
+        if client is None:
+            session = self.session()
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = session.client(service_name, config=self.config)
+                    self._clients[service_name] = client
+        return client
+
+
+class LazyClient:
+    """
+    Stand-in for a boto3 client that is only created when first used.
+
+    Lets modules keep a plain `bedrock.invoke_model(...)` call style while
+    deferring session/credential work until the first request.
+    """
+
+    def __init__(self, factory: ClientFactory, service_name: str):
+        self._factory = factory
+        self._service_name = service_name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory.client(self._service_name), name)
+
+
+def is_throttle(error: Exception) -> bool:
+    return (
+        isinstance(error, ClientError)
+        and error.response.get("Error", {}).get("Code") in THROTTLE_CODES
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttles, transient service errors (incl. any 5xx) and network errors."""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    if code in THROTTLE_CODES or code in TRANSIENT_CODES:
+        return True
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+    return status >= 500
+
+
+def call_with_backoff(
+    fn: Callable[..., Any],
+    *args: Any,
+    retries: int = 4,
+    base_delay: float = 0.25,
+    max_delay: float = 8.0,
+    on_retry: Optional[Callable[[Exception, int], None]] = None,
+    **kwargs: Any,
+) -> Any:
+    """
+    Call fn, retrying is_retryable errors with capped exponential full jitter.
+
+    Sleep before retry n is uniform(0, min(max_delay, base_delay * 2**n)).
+    Other errors (and the last retryable one) are re-raised unchanged.
+    on_retry(error, attempt) is called before each retry (for metrics).
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except (ClientError, *TRANSIENT_ERRORS) as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            if on_retry is not None:
+                on_retry(e, attempt)
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2**attempt)))
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Batch question answering over the RAG stack.
+
+For offline jobs (nightly FAQ regeneration, evaluation sets) that would
+otherwise loop the app.py flow one question at a time. Reads questions from
+JSONL, answers them with valid_prompt → retrieve_context →
+build_rag_prompt → generate_response, and appends one JSON line per answer.
+
+- Bounded concurrency: a fixed worker pool (--concurrency).
+- Per-stage rate limiting: classify / retrieve / generate calls per second.
+- Dedupe: identical (normalized) questions are answered once and the answer
+  is written for every input id.
+- Per-stage latency (p50/p95/p99), retries and throttles in the report,
+  plus per-model latency and tokens/s.
+- Model calls run at admission BATCH priority (admission.py), so chat
+  traffic sharing the Bedrock quota goes first.
+- --model-id auto routes each question to the small or large model
+  (model_router.py).
+- Resume: answers are flushed line by line; rerunning with the same output
+  file drops a torn last line left by a crash, then skips ids already
+  written. Failed questions (empty generation, shed, or any error in a
+  stage) are not written, so they are retried on the next run.
+
+Input lines: {"id": "q1", "question": "..."} (id defaults to the line number).
+
+Usage:
+    python batch_qa.py questions.jsonl answers.jsonl \\
+        --model-id anthropic.claude-3-haiku-20240307-v1:0 --kb-id ABC123 \\
+        --concurrency 8 --generate-rps 2
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import bedrock_utils as bu
+from admission import BATCH, Overloaded
+from admission import priority as admission_priority
+from dotenv import load_dotenv
+from response_cache import normalize_prompt
+
+
+class RateLimiter:
+    """Spaces calls to at most `rate` per second across all threads."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (id, question) pairs from a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            yield str(item.get("id", line_no)), item["question"]
+
+
+def trim_torn_line(path: str, block_size: int = 65536) -> int:
+    """
+    Cut a partial last line (no trailing newline) from an output file, so
+    appended answers start on a line of their own. Returns bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                if start + newline + 1 == size:
+                    return 0
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+    return size - end
+
+
+def completed_ids(path: str) -> set:
+    """Ids already present in an output file (for resuming)."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # not an answer record
+    return done
+
+
+class BatchRunner:
+    """Answers deduped questions with bounded concurrency and stage limits."""
+
+    def __init__(
+        self,
+        model_id: str,
+        kb_id: str,
+        temperature: float = bu.DEFAULT_TEMPERATURE,
+        top_p: float = bu.DEFAULT_TOP_P,
+        concurrency: int = 8,
+        classify_rps: Optional[float] = None,
+        retrieve_rps: Optional[float] = None,
+        generate_rps: Optional[float] = None,
+    ):
+        self.model_id = model_id
+        self.kb_id = kb_id
+        self.temperature = temperature
+        self.top_p = top_p
+        self.concurrency = concurrency
+        self.limits = {
+            "classify": RateLimiter(classify_rps),
+            "retrieve": RateLimiter(retrieve_rps),
+            "generate": RateLimiter(generate_rps),
+        }
+        self.report: Dict[str, Any] = {
+            "questions": 0,
+            "unique": 0,
+            "skipped": 0,
+            "allowed": 0,
+            "rejected": 0,
+            "failed": 0,
+            "written": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "context_tokens_saved": 0,
+        }
+
+    def answer(self, question: str) -> Dict[str, Any]:
+        """
+        Run one question through the RAG stages (rate-limited).
+
+        Model calls are admitted at BATCH priority, behind chat traffic in
+        the same process. A shed question, or one whose stages raised,
+        counts as failed and is retried on the next run; the rest of the
+        batch carries on.
+        """
+        try:
+            with admission_priority(BATCH):
+                return self._answer(question)
+        except Overloaded as e:
+            print(f"Shed by admission control: {e}")
+        except Exception as e:
+            print(f"Error answering {question!r}: {e!r}")
+        return {"allowed": True, "answer": "", "sources": [], "usage": {}}
+
+    def _answer(self, question: str) -> Dict[str, Any]:
+        self.limits["classify"].wait()
+        if not bu.valid_prompt(question, self.model_id):
+            return {"allowed": False, "answer": "", "sources": [], "usage": {}}
+
+        self.limits["retrieve"].wait()
+        results, context = bu.retrieve_context(question, self.kb_id)
+
+        self.limits["generate"].wait()
+        model_id, _ = bu.route_model(question, self.model_id, results)
+        answer, usage = bu.generate_response_with_usage(
+            bu.build_rag_prompt(question, results),
+            model_id,
+            self.temperature,
+            self.top_p,
+        )
+        sources = [
+            item.get("metadata", {}).get("x-amz-bedrock-kb-source-uri", "")
+            for item in results
+        ]
+        return {
+            "allowed": True,
+            "answer": answer,
+            "sources": sources,
+            "usage": usage,
+            "context_tokens_saved": context.get("tokens_saved", 0),
+        }
+
+    def run(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        # Before reading ids: a torn line may still parse without its newline
+        if trim_torn_line(output_path):
+            print(f"Dropped a partial last line from {output_path}")
+        done = completed_ids(output_path)
+        groups: Dict[str, List[Tuple[str, str]]] = {}
+        for qid, question in read_questions(input_path):
+            self.report["questions"] += 1
+            if qid in done:
+                self.report["skipped"] += 1
+                continue
+            groups.setdefault(normalize_prompt(question), []).append((qid, question))
+        self.report["unique"] = len(groups)
+
+        start = time.perf_counter()
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="batch-qa"
+        ) as pool:
+            futures = {
+                pool.submit(self.answer, items[0][1]): items
+                for items in groups.values()
+            }
+            for future in as_completed(futures):
+                self._write(out, futures[future], future.result())
+
+        elapsed = time.perf_counter() - start
+        self.report["elapsed_s"] = round(elapsed, 2)
+        self.report["questions_per_s"] = (
+            round(self.report["written"] / elapsed, 2) if elapsed else 0.0
+        )
+        self.report["stages"] = bu.metrics.summary()
+        self.report["models"] = bu.model_metrics.summary()
+        self.report["coalesced"] = bu.flights.stats()
+        if bu.retrieval_cache is not None:
+            self.report["retrieval_cache"] = bu.retrieval_cache.stats()
+        if bu.admission is not None:
+            self.report["admission"] = bu.admission.stats()
+        return self.report
+
+    def _write(self, out, items: List[Tuple[str, str]], result: Dict[str, Any]):
+        # Only the main thread writes, so lines never interleave
+        if result["allowed"] and not result["answer"]:
+            self.report["failed"] += len(items)  # retried on the next run
+            return
+        self.report["allowed" if result["allowed"] else "rejected"] += len(items)
+        usage = result["usage"]
+        self.report["input_tokens"] += usage.get("input_tokens", 0)
+        self.report["output_tokens"] += usage.get("output_tokens", 0)
+        self.report["context_tokens_saved"] += result.get("context_tokens_saved", 0)
+        for qid, question in items:
+            record = {
+                "id": qid,
+                "question": question,
+                "allowed": result["allowed"],
+                "answer": result["answer"],
+                "sources": result["sources"],
+                "usage": usage,
+            }
+            out.write(json.dumps(record) + "\n")
+            self.report["written"] += 1
+        out.flush()
+
+
+def main():
+    load_dotenv()  # KB_ID may come from .env, like app.py
+    parser = argparse.ArgumentParser(description="Batch RAG question answering.")
+    parser.add_argument("input", help="JSONL file with {'id', 'question'} lines")
+    parser.add_argument("output", help="JSONL answers file (appended; resumable)")
+    parser.add_argument("--model-id", default=bu.MODEL_ID, required=not bu.MODEL_ID)
+    parser.add_argument("--kb-id", default=os.getenv("KB_ID") or bu.KB_ID)
+    parser.add_argument("--temperature", type=float, default=bu.DEFAULT_TEMPERATURE)
+    parser.add_argument("--top-p", type=float, default=bu.DEFAULT_TOP_P)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--classify-rps", type=float, default=None)
+    parser.add_argument("--retrieve-rps", type=float, default=None)
+    parser.add_argument("--generate-rps", type=float, default=None)
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        args.model_id,
+        args.kb_id,
+        temperature=args.temperature,
+        top_p=args.top_p,
+        concurrency=args.concurrency,
+        classify_rps=args.classify_rps,
+        retrieve_rps=args.retrieve_rps,
+        generate_rps=args.generate_rps,
+    )
+    report = runner.run(args.input, args.output)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
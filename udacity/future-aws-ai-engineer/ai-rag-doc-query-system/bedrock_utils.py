@@ -2,47 +2,225 @@
 Utility helpers for RAG chat app using AWS Bedrock + Knowledge Base.
 
 This module:
-- Creates AWS Bedrock runtime clients.
+- Creates AWS Bedrock runtime clients (lazily, pooled, throttle-aware).
 - Validates user prompts (only heavy machinery questions allowed).
-- Retrieves relevant context from a Bedrock Knowledge Base.
+- Retrieves relevant context from a Bedrock Knowledge Base (or a local
+  vector index over the same corpus, see local_retrieval.py).
 - Generates an answer with a Bedrock LLM (Claude-style).
 - Builds RAG prompts that ground answers in retrieved context.
+- Caches generated answers so repeated questions skip the model call.
+- Runs classification and retrieval concurrently (answer_question).
+- Streams generated text token-by-token for chat UIs.
+- Sends prior chat turns (see conversation_memory.py) with the question.
+- Fits retrieved context into a token budget (see context_budget.py).
+- Records latency, tokens, retries and throttles per stage (see metrics.py).
+- Classifies with a fast model and routes generation between a small and a
+  large model (see model_router.py).
+- Coalesces identical in-flight requests (see single_flight.py).
+- Keeps model calls within per-model RPM/TPM budgets (see admission.py).
+- Caches retrieval results until the corpus changes (see retrieval_cache.py).
 
 Note:
 - Uses an AWS profile for the Udacity lab; in real deployments prefer IAM roles.
 - Model ID, KB ID, and region should come from configuration (constants/env).
 """
 
+import asyncio
+import contextvars
+import hashlib
 import json
-from typing import Any, Dict, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import constants as const
-from boto3.session import Session
+from admission import AdmissionController, estimate_request_tokens
+from aws_clients import (
+    AWS_ERRORS,
+    ClientFactory,
+    LazyClient,
+    call_with_backoff,
+    is_throttle,
+)
 from botocore.exceptions import ClientError
+from context_budget import ContextBudgeter
+from conversation_memory import ConversationMemory
+from embedding_service import EmbeddingCache, EmbeddingService
+from metrics import MetricsRegistry
+from model_router import AUTO, ModelRouter
+from prompt_classifier import LexicalModel, LexicalRules, PromptClassifier
+from response_cache import ResponseCache, normalize_prompt
+from retrieval_cache import CorpusVersion, RetrievalCache, corpus_version_path
+from single_flight import SingleFlight
 
 # ---------------------------------------------------------------------------
 # AWS Session & Clients
 # ---------------------------------------------------------------------------
 
 # In labs/local dev we use an explicit profile.
-# In production on AWS (EC2/Lambda/ECS), rely on IAM roles and omit profile_name.
-session = Session(profile_name=const.profile_name)
-
-bedrock = session.client(
-    service_name="bedrock-runtime",
+# In production on AWS (EC2/Lambda/ECS), rely on IAM roles; a missing profile
+# falls back to the default credential chain. Nothing is created until the
+# first request, and clients are shared across threads.
+clients = ClientFactory(
+    profile_name=const.profile_name,
     region_name=const.region_name,
+    max_pool_connections=getattr(const, "aws_max_pool_connections", 50),
+    connect_timeout=getattr(const, "aws_connect_timeout", 5),
+    read_timeout=getattr(const, "aws_read_timeout", 60),
+    retry_mode=getattr(const, "aws_retry_mode", "adaptive"),
+    max_attempts=getattr(const, "aws_max_attempts", 1),
 )
 
-bedrock_kb = session.client(
-    service_name="bedrock-agent-runtime",
-    region_name=const.region_name,
+bedrock = LazyClient(clients, "bedrock-runtime")
+bedrock_kb = LazyClient(clients, "bedrock-agent-runtime")
+
+
+# Per-stage latency/token histograms (classify, retrieve, generate, ...)
+metrics = MetricsRegistry()
+# The same per model id (every classify / generate invocation), for routing
+model_metrics = MetricsRegistry()
+
+
+# Identical requests in flight at the same time share one upstream call
+flights = SingleFlight(enabled=getattr(const, "coalesce_requests", True))
+
+
+# RPM/TPM budgets per model with a priority queue; None = no admission control
+admission: Optional[AdmissionController] = (
+    AdmissionController(
+        getattr(const, "admission_limits", {}),
+        max_queue=getattr(const, "admission_max_queue", 64),
+        max_wait=getattr(const, "admission_max_wait", None),
+    )
+    if getattr(const, "admission_control", True)
+    else None
 )
 
+
+def _note(**counts: int) -> None:
+    metrics.note(**counts)
+    model_metrics.note(**counts)
+
+
+def _fail() -> None:
+    metrics.fail()
+    model_metrics.fail()
+
+
+def _call_bedrock(fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """
+    Run a Bedrock API call with jittered backoff on throttling and
+    transient (5xx, timeout, connection) errors.
+
+    Model invocations go through _admitted first. Throttles and retries
+    (ours and botocore's) are noted on the tracked metrics call, if any.
+    """
+    try:
+        response = call_with_backoff(
+            fn,
+            retries=getattr(const, "throttle_retries", 4),
+            base_delay=getattr(const, "throttle_base_delay", 0.25),
+            max_delay=getattr(const, "throttle_max_delay", 8.0),
+            on_retry=lambda error, attempt: _note(
+                retries=1, throttles=int(is_throttle(error))
+            ),
+            **kwargs,
+        )
+    except ClientError as e:
+        if is_throttle(e):
+            _note(throttles=1)
+        raise
+    _note(retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+    return response
+
+
+@contextmanager
+def _admitted(model_id: str, body: str) -> Iterator[Dict[str, int]]:
+    """
+    Admit one model call (see admission.py) and settle its ticket on exit.
+
+    Overloaded is raised before the block runs when the model's budget is
+    exhausted. The block fills the yielded dict with the call's usage
+    (input_tokens / output_tokens); the ticket is settled from it however
+    the block exits, and keeps its estimate if no usage was reported.
+    """
+    usage: Dict[str, int] = {}
+    ticket = None
+    if admission is not None:
+        ticket = admission.acquire(model_id, estimate_request_tokens(body))
+        if ticket.waited_s:
+            metrics.observe("admission_wait", ticket.waited_s * 1000)
+    try:
+        yield usage
+    finally:
+        if ticket is not None and usage:
+            admission.settle(
+                ticket, usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+            )
+
+
+def _note_usage(usage: Dict[str, int]) -> None:
+    _note(
+        input_tokens=usage.get("input_tokens", 0),
+        output_tokens=usage.get("output_tokens", 0),
+    )
+
+
 # Optional defaults (used by CLI or other callers if needed)
 MODEL_ID = getattr(const, "model_id", None)
 KB_ID = getattr(const, "kb_id", None)
 DEFAULT_TEMPERATURE = getattr(const, "default_temperature", 0.1)
 DEFAULT_TOP_P = getattr(const, "default_top_p", 0.9)
+EMBEDDING_MODEL_ID = getattr(const, "embedding_model_id", "amazon.titan-embed-text-v1")
+# "bedrock" (remote KB) or "local" (local_retrieval.py index)
+RETRIEVAL_BACKEND = getattr(const, "retrieval_backend", "bedrock")
+# Fuse BM25 over the same chunks with the vector results (lexical_index.py).
+# Local backend only: the managed KB chunks documents itself, so its results
+# never line up with the locally ingested BM25 chunks and would only be
+# concatenated, not fused
+HYBRID_RETRIEVAL = getattr(const, "hybrid_retrieval", False) and (
+    RETRIEVAL_BACKEND == "local"
+)
+if getattr(const, "hybrid_retrieval", False) and not HYBRID_RETRIEVAL:
+    print("hybrid_retrieval needs retrieval_backend = 'local'; using vector only")
+
+
+# ---------------------------------------------------------------------------
+# Model routing
+# ---------------------------------------------------------------------------
+
+# Pass model_id=AUTO ("auto") to let the router pick the generation model
+router = ModelRouter(
+    classifier_model=getattr(const, "classifier_model_id", ""),
+    small_model=getattr(
+        const, "small_model_id", "anthropic.claude-3-haiku-20240307-v1:0"
+    ),
+    large_model=getattr(
+        const, "large_model_id", "anthropic.claude-3-5-sonnet-20240620-v1:0"
+    ),
+    max_small_words=getattr(const, "router_max_small_words", 30),
+    min_coverage=getattr(const, "router_min_coverage", 0.5),
+)
+
+
+def classifier_model_for(model_id: str) -> str:
+    """Model that classifies prompts: the configured fast one if set."""
+    if router.classifier_model:
+        return router.classifier_model
+    return router.small_model if model_id == AUTO else model_id
+
+
+def route_model(
+    question: str, model_id: str, retrieval_results: List[Dict[str, Any]]
+) -> Tuple[str, str]:
+    """(generation model, reason): model_id as given unless it is AUTO."""
+    if model_id != AUTO:
+        return model_id, "selected"
+    decision = router.route(question, retrieval_results)
+    return decision.model_id, decision.reason
 
 
 # ---------------------------------------------------------------------------
@@ -50,7 +228,7 @@ DEFAULT_TOP_P = getattr(const, "default_top_p", 0.9)
 # ---------------------------------------------------------------------------
 
 
-def valid_prompt(prompt: str, model_id: str) -> bool:
+def classify_prompt_llm(prompt: str, model_id: str) -> Optional[bool]:
     """
     Use the LLM as a classifier to decide if the user request is allowed.
 
@@ -61,7 +239,7 @@ def valid_prompt(prompt: str, model_id: str) -> bool:
       D: asks about instructions / how you work
       E: ONLY related to heavy machinery
 
-    We only allow Category E.
+    We only allow Category E. Returns None if the Bedrock call fails.
     """
     try:
         messages = [
@@ -90,33 +268,235 @@ def valid_prompt(prompt: str, model_id: str) -> bool:
         ]
 
         # Deterministic classification: temperature=0, small top_p, tiny max_tokens
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(
-                {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "messages": messages,
-                    "max_tokens": 10,
-                    "temperature": 0,
-                    "top_p": 0.1,
-                }
-            ),
+        body = json.dumps(
+            {
+                "anthropic_version": "bedrock-2023-05-31",
+                "messages": messages,
+                "max_tokens": 10,
+                "temperature": 0,
+                "top_p": 0.1,
+            }
         )
-        payload = json.loads(response["body"].read())
+        with model_metrics.track(model_id), _admitted(model_id, body) as usage:
+            response = _call_bedrock(
+                bedrock.invoke_model,
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=body,
+            )
+            payload = json.loads(response["body"].read())
+            usage.update(payload.get("usage", {}))
+            _note_usage(usage)
         category = payload["content"][0]["text"]
         print(f"[debug] classifier output: {category!r}")
 
         return category.lower().strip() == "category e"
 
-    except ClientError as e:
+    except AWS_ERRORS as e:
+        _fail()
         print(f"Error validating prompt: {e}")
-        # Fail-closed: if validation fails, treat prompt as invalid
-        return False
+        # Unknown verdict; valid_prompt fails closed and does not memoize it
+        return None
+
+
+def _classify_prompt_llm_coalesced(prompt: str, model_id: str) -> Optional[bool]:
+    return flights.do(
+        "classify",
+        (model_id, normalize_prompt(prompt)),
+        classify_prompt_llm,
+        prompt,
+        model_id,
+    )
+
+
+# Memo + local rules/lexical model in front of the (coalesced) LLM classifier
+prompt_classifier = PromptClassifier(
+    _classify_prompt_llm_coalesced,
+    rules=LexicalRules() if getattr(const, "classifier_local_rules", True) else None,
+    model=LexicalModel() if getattr(const, "classifier_lexical_model", True) else None,
+    max_entries=getattr(const, "classifier_cache_size", 1024),
+)
+
+
+def valid_prompt(prompt: str, model_id: str) -> bool:
+    """
+    Decide if the user request is allowed (Category E only).
+
+    Clear cases are settled locally or from the memo; ambiguous prompts go to
+    classify_prompt_llm. See prompt_classifier.stats() for avoided calls.
+    The LLM verdict comes from classifier_model_for(model_id).
+    """
+    with metrics.track("classify"):
+        return prompt_classifier.classify(prompt, classifier_model_for(model_id))
+
+
+def invoke_embedding_model(texts: List[str], model_id: str) -> List[List[float]]:
+    """
+    One Bedrock embedding request for a batch of texts.
+
+    Cohere embed models accept up to 96 texts per call; Titan takes a single
+    inputText, so a Titan batch is one call per text.
+    """
+    with metrics.track("embed"):
+        return _invoke_embedding_model(texts, model_id)
 
 
-def query_knowledge_base(query: str, kb_id: str) -> List[Dict[str, Any]]:
+def _invoke_embedding_model(texts: List[str], model_id: str) -> List[List[float]]:
+    if model_id.startswith("cohere."):
+        body = json.dumps({"texts": texts, "input_type": "search_document"})
+        with _admitted(model_id, body) as usage:
+            response = _call_bedrock(
+                bedrock.invoke_model,
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=body,
+            )
+            payload = json.loads(response["body"].read())
+            billed = payload.get("meta", {}).get("billed_units", {})
+            usage["input_tokens"] = billed.get("input_tokens", 0)
+        return payload["embeddings"]
+    vectors = []
+    for text in texts:
+        body = json.dumps({"inputText": text})
+        with _admitted(model_id, body) as usage:
+            response = _call_bedrock(
+                bedrock.invoke_model,
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=body,
+            )
+            payload = json.loads(response["body"].read())
+            usage["input_tokens"] = payload.get("inputTextTokenCount", 0)
+        vectors.append(payload["embedding"])
+    return vectors
+
+
+# Shared, persistently cached embedding client (see embedding_service.py)
+embedding_service = EmbeddingService(
+    invoke_embedding_model,
+    model_id=EMBEDDING_MODEL_ID,
+    cache=EmbeddingCache(getattr(const, "embedding_cache_path", ":memory:")),
+    batch_size=getattr(const, "embedding_batch_size", 1),
+    max_workers=getattr(const, "embedding_workers", 8),
+)
+
+
+def embed_text(text: str, model_id: str = EMBEDDING_MODEL_ID) -> List[float]:
+    """
+    Embed one text with the KB's embedding model (Titan text embeddings).
+
+    Used to encode queries for the local retrieval backend, so local vectors
+    live in the same space as the ones Bedrock KB stored in Aurora. Repeated
+    texts are served from the embedding cache.
+    """
+    if model_id == embedding_service.model_id:
+        return embedding_service.embed(text)
+    return invoke_embedding_model([text], model_id)[0]
+
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_index():
+    """Load the local vector index once (memory-mapped) and share it."""
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                # Imported here so numpy is only needed for the local backend
+                from local_retrieval import LocalVectorIndex
+
+                _local_index = LocalVectorIndex.load(const.local_index_path)
+    return _local_index
+
+
+def query_local_index(query: str, number_of_results: int = 3) -> List[Dict[str, Any]]:
+    """Local drop-in for query_knowledge_base (same retrievalResults shape)."""
+    try:
+        index = get_local_index()
+        return index.search(
+            embed_text(query, index.embedding_model or EMBEDDING_MODEL_ID),
+            k=number_of_results,
+            nprobe=getattr(const, "local_index_nprobe", None),
+        )
+    except (*AWS_ERRORS, OSError) as e:
+        metrics.fail()
+        print(f"Error querying local index: {e}")
+        return []
+
+
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    """Load the BM25 index once (memory-mapped) and share it."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_index_lock:
+            if _lexical_index is None:
+                from lexical_index import BM25Index
+
+                _lexical_index = BM25Index.load(
+                    getattr(const, "lexical_index_path", ".cache/lexical_index")
+                )
+    return _lexical_index
+
+
+def fuse_with_lexical(
+    query: str, vector_results: List[Dict[str, Any]], number_of_results: int
+) -> List[Dict[str, Any]]:
+    """
+    Reciprocal-rank fusion of vector results with as many BM25 results.
+
+    Falls back to the top vector results if the lexical index is unavailable.
+    """
+    try:
+        lexical = get_lexical_index().search(
+            query, k=max(len(vector_results), number_of_results)
+        )
+    except OSError as e:
+        print(f"Lexical index unavailable, using vector results only: {e}")
+        return vector_results[:number_of_results]
+    from lexical_index import reciprocal_rank_fusion
+
+    return reciprocal_rank_fusion(
+        [vector_results, lexical],
+        k=getattr(const, "hybrid_rrf_k", 60),
+        top_n=number_of_results,
+    )
+
+
+def _drop_loaded_indexes(version: str) -> None:
+    """Corpus changed: load the local / lexical indexes again on next use."""
+    global _local_index, _lexical_index
+    with _local_index_lock:
+        _local_index = None
+    with _lexical_index_lock:
+        _lexical_index = None
+
+
+# Bumped by upload_s3.py / ingestion.py / lexical_index.py after corpus changes
+corpus_version = CorpusVersion(corpus_version_path(), on_change=_drop_loaded_indexes)
+
+# Results per (backend, KB, normalized query, k); None = no retrieval cache
+retrieval_cache: Optional[RetrievalCache] = (
+    RetrievalCache(
+        max_entries=getattr(const, "retrieval_cache_size", 1024),
+        ttl_seconds=getattr(const, "retrieval_cache_ttl", 900),
+    )
+    if getattr(const, "retrieval_cache", True)
+    else None
+)
+
+
+def query_knowledge_base(
+    query: str, kb_id: str, number_of_results: int = 3
+) -> List[Dict[str, Any]]:
     """
     Retrieve top-k relevant chunks from Bedrock KB via vector search.
 
@@ -124,28 +504,124 @@ def query_knowledge_base(query: str, kb_id: str) -> List[Dict[str, Any]]:
     - content.text     → the chunk text
     - score            → similarity score
     - metadata         → original source information
+
+    With const.retrieval_backend = "local" the same shape comes from the
+    in-process index instead (kb_id is ignored). With const.hybrid_retrieval
+    the vector results are fused with BM25 results and "score" becomes the
+    reciprocal-rank score.
+
+    Concurrent identical queries share one retrieval (see flights.stats()).
+    Repeats are served from retrieval_cache until the corpus version
+    changes (see retrieval_cache.stats()).
     """
+    version = corpus_version.current()
+    if retrieval_cache is None:
+        return _query_knowledge_base_coalesced(query, kb_id, number_of_results)
+    return retrieval_cache.fetch(
+        (RETRIEVAL_BACKEND, kb_id, normalize_prompt(query), number_of_results),
+        version,
+        _query_knowledge_base_coalesced,
+        query,
+        kb_id,
+        number_of_results,
+    )
+
+
+def _query_knowledge_base_coalesced(
+    query: str, kb_id: str, number_of_results: int
+) -> List[Dict[str, Any]]:
+    results = flights.do(
+        "retrieve",
+        (RETRIEVAL_BACKEND, kb_id, query, number_of_results),
+        _query_knowledge_base,
+        query,
+        kb_id,
+        number_of_results,
+    )
+    return list(results)  # callers may reorder; the items are not mutated
+
+
+def _query_knowledge_base(
+    query: str, kb_id: str, number_of_results: int
+) -> List[Dict[str, Any]]:
+    with metrics.track("retrieve"):
+        fetch = number_of_results
+        if HYBRID_RETRIEVAL:
+            # Fusion needs depth: the best chunk may rank low on one side
+            fetch = max(fetch, getattr(const, "hybrid_candidates", 10))
+        if RETRIEVAL_BACKEND == "local":
+            results = query_local_index(query, fetch)
+        else:
+            results = _retrieve_from_kb(query, kb_id, fetch)
+        if HYBRID_RETRIEVAL:
+            return fuse_with_lexical(query, results, number_of_results)
+        return results
+
+
+def _retrieve_from_kb(
+    query: str, kb_id: str, number_of_results: int
+) -> List[Dict[str, Any]]:
     try:
-        response = bedrock_kb.retrieve(
+        response = _call_bedrock(
+            bedrock_kb.retrieve,
             knowledgeBaseId=kb_id,
             retrievalQuery={"text": query},
             retrievalConfiguration={
                 "vectorSearchConfiguration": {
-                    "numberOfResults": 3,  # tune this for more/less context
+                    "numberOfResults": number_of_results,  # more/less context
                 }
             },
         )
         return response.get("retrievalResults", [])
-    except ClientError as e:
+    except AWS_ERRORS as e:
+        metrics.fail()
         print(f"Error querying Knowledge Base: {e}")
         return []
 
 
+# Earlier chat turns: [{"role": "user" | "assistant", "content": str}, ...]
+History = Optional[List[Dict[str, str]]]
+
+
+def _answer_request_body(
+    prompt: str, temperature: float, top_p: float, history: History = None
+) -> str:
+    # Prior turns (alternating, starting with "user") go before the prompt
+    messages = [
+        {"role": turn["role"], "content": [{"type": "text", "text": turn["content"]}]}
+        for turn in history or []
+    ]
+    messages.append(
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt,
+                }
+            ],
+        }
+    )
+    return json.dumps(
+        {
+            "anthropic_version": "bedrock-2023-05-31",
+            "messages": messages,
+            "max_tokens": 500,  # cap answer length
+            "temperature": temperature,
+            "top_p": top_p,
+        }
+    )
+
+
 def generate_response(
-    prompt: str, model_id: str, temperature: float, top_p: float
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    history: History = None,
 ) -> str:
     """
-    Invoke the LLM to generate the final answer.
+    Invoke the LLM to generate the final answer (blocks until complete).
 
     temperature:
       - low (0.0–0.2) → more deterministic, better for RAG / factual answers
@@ -154,39 +630,289 @@ def generate_response(
     top_p:
       - nucleus sampling threshold for probability mass.
       - 0.8–1.0 is usually fine for RAG answers.
+
+    history:
+      - earlier chat turns sent before the prompt (see conversation_memory).
     """
-    try:
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt,
-                    }
-                ],
-            }
-        ]
+    answer, _ = generate_response_with_usage(
+        prompt, model_id, temperature, top_p, history
+    )
+    return answer
 
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(
-                {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "messages": messages,
-                    "max_tokens": 500,  # cap answer length
-                    "temperature": temperature,
-                    "top_p": top_p,
-                }
-            ),
-        )
-        payload = json.loads(response["body"].read())
-        return payload["content"][0]["text"]
-    except ClientError as e:
-        print(f"Error generating response: {e}")
+
+def generate_response_with_usage(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    history: History = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    generate_response that also returns the token usage Bedrock reports.
+
+    usage: {"input_tokens": ..., "output_tokens": ...} (empty on errors).
+    Concurrent identical requests share one invocation.
+    """
+    answer, usage = flights.do(
+        "generate",
+        _generation_key(prompt, model_id, temperature, top_p, history),
+        _generate_response_with_usage,
+        prompt,
+        model_id,
+        temperature,
+        top_p,
+        history,
+    )
+    return answer, dict(usage)
+
+
+def _generation_key(
+    prompt: str, model_id: str, temperature: float, top_p: float, history: History
+) -> tuple:
+    return (model_id, prompt, temperature, top_p, json.dumps(history or []))
+
+
+def _generate_response_with_usage(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    history: History,
+) -> Tuple[str, Dict[str, int]]:
+    with metrics.track("generate"), model_metrics.track(model_id):
+        try:
+            body = _answer_request_body(prompt, temperature, top_p, history)
+            with _admitted(model_id, body) as usage:
+                response = _call_bedrock(
+                    bedrock.invoke_model,
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=body,
+                )
+                payload = json.loads(response["body"].read())
+                usage.update(payload.get("usage", {}))
+            _note_usage(usage)
+            return payload["content"][0]["text"], usage
+        except AWS_ERRORS as e:
+            _fail()
+            print(f"Error generating response: {e}")
+            return "", {}
+
+
+def iter_stream_text(
+    event_stream: Iterable[Dict[str, Any]], usage: Optional[Dict[str, int]] = None
+) -> Iterator[str]:
+    """
+    Yield text deltas from an invoke_model_with_response_stream body.
+
+    Each event looks like {"chunk": {"bytes": b'{"type": ...}'}}; only
+    content_block_delta events carry answer text. If a usage dict is given,
+    it is filled from message_start / message_delta token counts.
+    """
+    for event in event_stream:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        payload = json.loads(chunk["bytes"])
+        kind = payload.get("type")
+        if kind == "content_block_delta":
+            text = payload.get("delta", {}).get("text", "")
+            if text:
+                yield text
+        elif usage is not None and kind == "message_start":
+            usage.update(payload.get("message", {}).get("usage", {}))
+        elif usage is not None and kind == "message_delta":
+            usage.update(payload.get("usage", {}))
+
+
+def generate_response_stream(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    history: History = None,
+) -> Iterator[str]:
+    """
+    Streaming variant of generate_response: yields text deltas as they arrive.
+
+    Same request body as generate_response, so answers are interchangeable;
+    time-to-first-token drops from full generation time to the first chunk.
+    On errors it yields nothing more (like generate_response returning "").
+
+    Concurrent identical requests share one stream: later callers replay
+    what has arrived so far, then follow it live.
+    """
+    yield from flights.stream(
+        "generate_stream",
+        _generation_key(prompt, model_id, temperature, top_p, history),
+        lambda: _generate_response_stream(
+            prompt, model_id, temperature, top_p, history
+        ),
+    )
+
+
+def _generate_response_stream(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    history: History,
+) -> Iterator[str]:
+    start = time.perf_counter()
+    usage: Dict[str, int] = {}
+    with metrics.track("generate_stream"), model_metrics.track(model_id):
+        try:
+            body = _answer_request_body(prompt, temperature, top_p, history)
+            # Settled even when the consumer abandons the stream
+            with _admitted(model_id, body) as usage:
+                response = _call_bedrock(
+                    bedrock.invoke_model_with_response_stream,
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=body,
+                )
+                first = True
+                events = response["body"]
+                try:
+                    for text in iter_stream_text(events, usage):
+                        if first:
+                            metrics.observe(
+                                "first_token", (time.perf_counter() - start) * 1000
+                            )
+                            first = False
+                        yield text
+                finally:
+                    # Abandoned early: drop the connection so generation stops
+                    close = getattr(events, "close", None)
+                    if close is not None:
+                        close()
+        except AWS_ERRORS as e:
+            _fail()
+            print(f"Error streaming response: {e}")
+        finally:
+            _note_usage(usage)
+
+
+# ---------------------------------------------------------------------------
+# Answer caching
+# ---------------------------------------------------------------------------
+
+
+def make_response_cache() -> ResponseCache:
+    """Build the answer cache from the response_cache_* settings in constants."""
+    # Near-duplicate mode compares lexical hashes unless the KB's embedding
+    # model is enabled (one cached Titan call per new prompt)
+    semantic = getattr(const, "response_cache_semantic", False)
+    return ResponseCache(
+        max_entries=getattr(const, "response_cache_size", 256),
+        ttl_seconds=getattr(const, "response_cache_ttl", 3600),
+        db_path=getattr(const, "response_cache_path", "") or None,
+        similarity_threshold=getattr(const, "response_cache_similarity", 0.0),
+        embed_fn=embedding_service.embed if semantic else None,
+    )
+
+
+def retrieval_chunk_ids(retrieval_results: List[Dict[str, Any]]) -> List[str]:
+    """
+    Stable IDs for the retrieved chunks, used in the answer cache key.
+
+    Prefers the KB chunk ID from metadata; falls back to a hash of the text
+    so different context never shares a cached answer.
+    """
+    ids = []
+    for item in retrieval_results:
+        chunk_id = item.get("metadata", {}).get("x-amz-bedrock-kb-chunk-id")
+        if not chunk_id:
+            text = item.get("content", {}).get("text", "")
+            chunk_id = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        ids.append(chunk_id)
+    return ids
+
+
+def _conversation_scope(history: History) -> str:
+    # Same question after different turns ("and its weight?") is a new entry.
+    # Scoped, not appended to the question: near-duplicate matching would
+    # still find a close embedding across conversations
+    if not history:
         return ""
+    return hashlib.sha256(json.dumps(history).encode("utf-8")).hexdigest()[:16]
+
+
+def generate_response_cached(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    cache: ResponseCache,
+    question: Optional[str] = None,
+    chunk_ids: Optional[List[str]] = None,
+    history: History = None,
+) -> str:
+    """
+    generate_response with a cache lookup in front.
+
+    question:
+      - text used for the cache key (the raw user question). Defaults to
+        prompt; pass it when prompt embeds retrieved context, so that
+        near-duplicate matching compares questions, not context.
+    chunk_ids:
+      - IDs of the retrieved chunks (see retrieval_chunk_ids).
+    history:
+      - earlier chat turns; part of the cache scope, so near-duplicate reuse
+        never crosses conversations.
+    """
+    key_text = question if question is not None else prompt
+    chunk_ids = chunk_ids or []
+    conversation = _conversation_scope(history)
+
+    cached = cache.get(model_id, key_text, temperature, top_p, chunk_ids, conversation)
+    if cached is not None:
+        return cached
+
+    answer = generate_response(prompt, model_id, temperature, top_p, history)
+    if answer:  # never cache the "" returned on errors
+        cache.set(
+            model_id, key_text, temperature, top_p, answer, chunk_ids, conversation
+        )
+    return answer
+
+
+def generate_response_stream_cached(
+    prompt: str,
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    cache: ResponseCache,
+    question: Optional[str] = None,
+    chunk_ids: Optional[List[str]] = None,
+    history: History = None,
+) -> Iterator[str]:
+    """
+    generate_response_stream with the same cache as generate_response_cached.
+
+    A hit is yielded as one chunk; a miss streams from Bedrock and stores the
+    joined answer once the stream completes.
+    """
+    key_text = question if question is not None else prompt
+    chunk_ids = chunk_ids or []
+    conversation = _conversation_scope(history)
+
+    cached = cache.get(model_id, key_text, temperature, top_p, chunk_ids, conversation)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    for text in generate_response_stream(prompt, model_id, temperature, top_p, history):
+        parts.append(text)
+        yield text
+    answer = "".join(parts)
+    if answer:
+        cache.set(
+            model_id, key_text, temperature, top_p, answer, chunk_ids, conversation
+        )
 
 
 def build_rag_prompt(question: str, retrieval_results: List[Dict[str, Any]]) -> str:
@@ -231,3 +957,407 @@ Question:
 
 Answer:"""
     return prompt
+
+
+# ---------------------------------------------------------------------------
+# Conversation memory
+# ---------------------------------------------------------------------------
+
+
+def summarize_conversation(
+    summary: str, turns: List[Dict[str, str]], model_id: str, max_words: int = 150
+) -> str:
+    """
+    Fold evicted chat turns into the running summary with one LLM call.
+
+    Returns "" on errors (ConversationMemory then keeps an extractive one).
+    """
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    prompt = f"""Update the running summary of a conversation about heavy machinery.
+Keep machine names, model numbers and figures; drop pleasantries.
+
+<summary>
+{summary or "(empty)"}
+</summary>
+
+<new_turns>
+{transcript}
+</new_turns>
+
+Reply with the updated summary only, at most {max_words} words."""
+    return generate_response(prompt, model_id, 0.0, 0.9)
+
+
+def make_conversation_memory(model_id: str) -> ConversationMemory:
+    """Chat memory from the chat_* settings; summaries are written by model_id."""
+    if model_id == AUTO:
+        model_id = router.small_model
+    return ConversationMemory(
+        max_tokens=getattr(const, "chat_history_tokens", 1000),
+        summarizer=lambda summary, turns: summarize_conversation(
+            summary, turns, model_id
+        ),
+        max_summary_tokens=getattr(const, "chat_summary_tokens", 300),
+        max_messages=getattr(const, "chat_max_messages", 200),
+        page_size=getattr(const, "chat_page_size", 20),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Context assembly
+# ---------------------------------------------------------------------------
+
+# Score cutoff, optional local re-rank, dedupe and a ctx_sz token budget
+# between retrieval and the prompt; None sends chunks verbatim
+context_budgeter: Optional[ContextBudgeter] = (
+    ContextBudgeter(
+        max_tokens=const.ctx_sz,
+        min_score=getattr(const, "context_min_score", 0.0),
+        dedupe_threshold=getattr(const, "context_dedupe_threshold", 0.8),
+        rerank=getattr(const, "context_rerank", False),
+        max_chunks=getattr(const, "context_max_chunks", 3),
+    )
+    if getattr(const, "context_budget", True)
+    else None
+)
+
+
+def assemble_context(
+    question: str, retrieval_results: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Chunks that go into the prompt, plus the tokens-saved report."""
+    if context_budgeter is None:
+        return retrieval_results, {}
+    return context_budgeter.select(question, retrieval_results)
+
+
+def retrieve_context(
+    question: str, kb_id: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    query_knowledge_base + assemble_context.
+
+    With re-ranking on, a wider pool (context_candidates) is retrieved and
+    cut down locally to context_max_chunks.
+    """
+    number_of_results = getattr(const, "context_max_chunks", 3)
+    if context_budgeter is not None and context_budgeter.rerank:
+        number_of_results = getattr(const, "context_candidates", 10)
+    results = query_knowledge_base(question, kb_id, number_of_results)
+    return assemble_context(question, results)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline orchestration
+# ---------------------------------------------------------------------------
+
+# Shared pool for the blocking boto3 calls; classify + retrieve per question
+_pipeline_pool = ThreadPoolExecutor(
+    max_workers=getattr(const, "pipeline_workers", 8),
+    thread_name_prefix="rag-pipeline",
+)
+
+PromptBuilder = Callable[[str, List[Dict[str, Any]]], str]
+
+
+@dataclass
+class RagAnswer:
+    """
+    Result of one classify → retrieve → generate run.
+
+    timings holds wall-clock milliseconds per stage ("classify", "retrieve",
+    "generate", and "first_token" when streamed) plus "total". Because
+    classify and retrieve overlap, total is roughly
+    max(classify, retrieve) + generate instead of their sum.
+
+    retrieval_results are the chunks kept by assemble_context;
+    context_report has its counts and tokens_saved. model_id is the
+    generation model (routed when the request asked for AUTO) and
+    route_reason says why.
+    """
+
+    allowed: bool
+    answer: str = ""
+    retrieval_results: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    context_report: Dict[str, int] = field(default_factory=dict)
+    model_id: str = ""
+    route_reason: str = ""
+
+
+def _timed(fn: Callable, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _generate(
+    question: str,
+    retrieval_results: List[Dict[str, Any]],
+    model_id: str,
+    temperature: float,
+    top_p: float,
+    cache: Optional[ResponseCache],
+    prompt_builder: PromptBuilder,
+    stream: bool = False,
+    history: History = None,
+):
+    prompt = prompt_builder(question, retrieval_results)
+    if cache is None:
+        generate = generate_response_stream if stream else generate_response
+        return generate(prompt, model_id, temperature, top_p, history)
+    generate = generate_response_stream_cached if stream else generate_response_cached
+    return generate(
+        prompt,
+        model_id,
+        temperature,
+        top_p,
+        cache,
+        question=question,
+        chunk_ids=retrieval_chunk_ids(retrieval_results),
+        history=history,
+    )
+
+
+def classify_and_retrieve(
+    question: str, model_id: str, kb_id: str, retrieval_question: str = ""
+) -> RagAnswer:
+    """
+    Run valid_prompt and retrieve_context in parallel.
+
+    The question itself is always what gets classified. retrieval_question,
+    if given, is what gets retrieved instead (e.g. a short follow-up
+    prefixed with the previous question, see ConversationMemory.contextualize),
+    so earlier turns can never get an off-topic prompt past the classifier.
+
+    If the prompt is rejected, retrieval results are discarded (and the
+    retrieval is cancelled if it has not started yet). With model_id=AUTO
+    the generation model is routed once the context is known.
+    """
+    start = time.perf_counter()
+    # copy_context: the admission priority follows the request into the pool
+    classify_future = _pipeline_pool.submit(
+        contextvars.copy_context().run, _timed, valid_prompt, question, model_id
+    )
+    retrieve_future = _pipeline_pool.submit(
+        contextvars.copy_context().run,
+        _timed,
+        retrieve_context,
+        retrieval_question or question,
+        kb_id,
+    )
+
+    allowed, classify_ms = classify_future.result()
+    timings = {"classify": classify_ms}
+    if not allowed:
+        retrieve_future.cancel()  # no-op if already running; result is dropped
+        timings["total"] = (time.perf_counter() - start) * 1000
+        return RagAnswer(allowed=False, timings=timings)
+
+    (retrieval_results, context_report), timings["retrieve"] = retrieve_future.result()
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return RagAnswer(
+        True,
+        "",
+        retrieval_results,
+        timings,
+        context_report,
+        *route_model(question, model_id, retrieval_results),
+    )
+
+
+async def classify_and_retrieve_async(
+    question: str, model_id: str, kb_id: str, retrieval_question: str = ""
+) -> RagAnswer:
+    """asyncio flavour of classify_and_retrieve (same semantics)."""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    classify_task = loop.run_in_executor(
+        _pipeline_pool,
+        contextvars.copy_context().run,
+        _timed,
+        valid_prompt,
+        question,
+        model_id,
+    )
+    retrieve_task = loop.run_in_executor(
+        _pipeline_pool,
+        contextvars.copy_context().run,
+        _timed,
+        retrieve_context,
+        retrieval_question or question,
+        kb_id,
+    )
+
+    allowed, classify_ms = await classify_task
+    timings = {"classify": classify_ms}
+    if not allowed:
+        retrieve_task.cancel()
+        timings["total"] = (time.perf_counter() - start) * 1000
+        return RagAnswer(allowed=False, timings=timings)
+
+    (retrieval_results, context_report), timings["retrieve"] = await retrieve_task
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return RagAnswer(
+        True,
+        "",
+        retrieval_results,
+        timings,
+        context_report,
+        *route_model(question, model_id, retrieval_results),
+    )
+
+
+def answer_question(
+    question: str,
+    model_id: str,
+    kb_id: str,
+    temperature: float = DEFAULT_TEMPERATURE,
+    top_p: float = DEFAULT_TOP_P,
+    cache: Optional[ResponseCache] = None,
+    prompt_builder: PromptBuilder = build_rag_prompt,
+    history: History = None,
+) -> RagAnswer:
+    """
+    Full RAG request: classify_and_retrieve, then generate if allowed.
+    """
+    result = classify_and_retrieve(question, model_id, kb_id)
+    if not result.allowed:
+        return result
+    result.answer, generate_ms = _timed(
+        _generate,
+        question,
+        result.retrieval_results,
+        result.model_id,
+        temperature,
+        top_p,
+        cache,
+        prompt_builder,
+        False,
+        history,
+    )
+    result.timings["generate"] = generate_ms
+    result.timings["total"] = result.timings.pop("total") + generate_ms
+    return result
+
+
+async def answer_question_async(
+    question: str,
+    model_id: str,
+    kb_id: str,
+    temperature: float = DEFAULT_TEMPERATURE,
+    top_p: float = DEFAULT_TOP_P,
+    cache: Optional[ResponseCache] = None,
+    prompt_builder: PromptBuilder = build_rag_prompt,
+    history: History = None,
+) -> RagAnswer:
+    """
+    asyncio flavour of answer_question for async callers (same semantics).
+
+    Concurrent identical requests await one shared run without holding a
+    thread; each caller gets its own copy of the RagAnswer.
+    """
+    key = (
+        question,
+        model_id,
+        kb_id,
+        temperature,
+        top_p,
+        cache,
+        prompt_builder,
+        json.dumps(history or []),
+    )
+    result = await flights.do_async(
+        "answer",
+        key,
+        _answer_question_async,
+        question,
+        model_id,
+        kb_id,
+        temperature,
+        top_p,
+        cache,
+        prompt_builder,
+        history,
+    )
+    return replace(result, timings=dict(result.timings))
+
+
+async def _answer_question_async(
+    question: str,
+    model_id: str,
+    kb_id: str,
+    temperature: float,
+    top_p: float,
+    cache: Optional[ResponseCache],
+    prompt_builder: PromptBuilder,
+    history: History,
+) -> RagAnswer:
+    result = await classify_and_retrieve_async(question, model_id, kb_id)
+    if not result.allowed:
+        return result
+    loop = asyncio.get_running_loop()
+    result.answer, generate_ms = await loop.run_in_executor(
+        _pipeline_pool,
+        contextvars.copy_context().run,
+        _timed,
+        _generate,
+        question,
+        result.retrieval_results,
+        result.model_id,
+        temperature,
+        top_p,
+        cache,
+        prompt_builder,
+        False,
+        history,
+    )
+    result.timings["generate"] = generate_ms
+    result.timings["total"] = result.timings.pop("total") + generate_ms
+    return result
+
+
+def stream_answer(
+    result: RagAnswer,
+    question: str,
+    model_id: str,
+    temperature: float = DEFAULT_TEMPERATURE,
+    top_p: float = DEFAULT_TOP_P,
+    cache: Optional[ResponseCache] = None,
+    prompt_builder: PromptBuilder = build_rag_prompt,
+    history: History = None,
+) -> Iterator[str]:
+    """
+    Generation stage for an allowed classify_and_retrieve result, streamed.
+
+    Yields text deltas; when the stream ends, result.answer holds the full
+    text and result.timings gains "first_token" and "generate". history
+    (earlier chat turns) is sent before the prompt. With model_id=AUTO the
+    model routed by classify_and_retrieve is used.
+    """
+    if model_id == AUTO:
+        if not result.model_id:
+            result.model_id, result.route_reason = route_model(
+                question, AUTO, result.retrieval_results
+            )
+        model_id = result.model_id
+    start = time.perf_counter()
+    parts = []
+    for text in _generate(
+        question,
+        result.retrieval_results,
+        model_id,
+        temperature,
+        top_p,
+        cache,
+        prompt_builder,
+        stream=True,
+        history=history,
+    ):
+        if not parts:
+            result.timings["first_token"] = (time.perf_counter() - start) * 1000
+        parts.append(text)
+        yield text
+    result.answer = "".join(parts)
+    result.timings["generate"] = (time.perf_counter() - start) * 1000
+    result.timings["total"] = result.timings.pop("total") + result.timings["generate"]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Embeddings/sec and cache hit rate of embedding_service on a simulated corpus.
+
+The embed function sleeps --latency-ms per request (no AWS calls). Three
+passes over the same corpus:
+
+- sequential: one text per call, one call at a time (the old embed_text loop)
+- cold: EmbeddingService with an empty cache (batching + concurrency)
+- warm: a second service on the same SQLite file (re-ingesting, 0 API calls)
+
+Usage:
+    python benchmarks/bench_embeddings.py --texts 500 --workers 8 --latency-ms 20
+"""
+
+import argparse
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from embedding_service import EmbeddingCache, EmbeddingService  # noqa: E402
+
+
+def make_embed_fn(latency_s: float, dims: int):
+    def embed_batch(texts, model_id):
+        time.sleep(latency_s)
+        vectors = []
+        for text in texts:
+            seed = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([seed[i % len(seed)] / 255.0 for i in range(dims)])
+        return vectors
+
+    return embed_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    unique = int(args.texts * (1 - args.duplicates))
+    texts = [f"spec sheet chunk {i % unique}" for i in range(args.texts)]
+    embed_batch = make_embed_fn(args.latency_ms / 1000, args.dims)
+
+    start = time.perf_counter()
+    for text in texts:
+        embed_batch([text], "bench")
+    sequential = time.perf_counter() - start
+    print(f"sequential  {args.texts / sequential:8.1f} embeddings/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "embeddings.sqlite3")
+        for label in ("cold", "warm"):
+            service = EmbeddingService(
+                embed_batch,
+                model_id="bench",
+                cache=EmbeddingCache(path),
+                batch_size=args.batch_size,
+                max_workers=args.workers,
+            )
+            start = time.perf_counter()
+            service.embed_many(texts)
+            elapsed = time.perf_counter() - start
+            stats = service.stats()
+            print(
+                f"{label:<10}  {args.texts / elapsed:8.1f} embeddings/s  "
+                f"hit_rate={stats['hit_rate']:.2f}  api_calls={stats['api_calls']}"
+            )
+            service.cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Hit rate and latency of vector, BM25 and hybrid (RRF) retrieval.
+
+Builds a synthetic spec-sheet corpus (--machines models x 6 specs) and a
+labelled question set where each question has exactly one correct chunk.
+Half the questions use the sheet's wording plus the model number ("BD-850
+operating weight"); half are paraphrases ("how heavy is the BD-850 when
+working").
+
+No AWS calls: the vector side uses a stand-in embedding that behaves like
+a dense model in the ways that matter here. It folds synonyms to one
+concept, so paraphrases match, but it blurs model numbers, so "BD-850" and
+"BD-860" look the same. BM25 has the opposite profile. Each retriever
+returns --candidates results, and fusion should beat both at k.
+
+Reports hit@1 / hit@k, per-query latency p50/p95, and BM25 build, save,
+load and incremental-add timings.
+
+Usage:
+    python benchmarks/bench_hybrid.py --machines 500 --k 3
+"""
+
+import argparse
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lexical_index import BM25Index, reciprocal_rank_fusion  # noqa: E402
+from local_retrieval import LocalVectorIndex  # noqa: E402
+from response_cache import lexical_embedding  # noqa: E402
+
+KINDS = {
+    "X": "excavator",
+    "BD": "bulldozer",
+    "DT": "dump truck",
+    "FL": "forklift",
+    "MC": "mobile crane",
+    "WL": "wheel loader",
+}
+# spec as written on the sheet -> paraphrase a user might type
+SPECS = {
+    "operating weight": "how heavy is it when working",
+    "engine power": "how much horsepower does the motor make",
+    "bucket capacity": "how much material fits in the scoop",
+    "fuel tank capacity": "how much diesel does it hold",
+    "maximum reach": "how far can the arm extend",
+    "travel speed": "how fast can it drive",
+}
+SYNONYMS = {
+    "heavy": "weight",
+    "working": "operating",
+    "horsepower": "power",
+    "motor": "engine",
+    "scoop": "bucket",
+    "material": "capacity",
+    "diesel": "fuel",
+    "hold": "tank",
+    "far": "reach",
+    "extend": "maximum",
+    "arm": "reach",
+    "fast": "speed",
+    "drive": "travel",
+}
+
+
+def concept_embedding(text: str):
+    """Stand-in dense embedding: synonym-folded, last two digits masked."""
+    text = re.sub(r"(\d)\d\d\b", r"\1xx", text.lower())
+    words = [SYNONYMS.get(w, w) for w in re.findall(r"[a-z0-9]+", text)]
+    return lexical_embedding(" ".join(words), dims=512)
+
+
+def make_corpus(machines: int, seed: int):
+    rng = random.Random(seed)
+    models = set()
+    while len(models) < machines:
+        prefix = rng.choice(list(KINDS))
+        models.add((prefix, rng.randrange(100, 1000, 10)))
+    records, questions = [], []
+    for prefix, number in sorted(models):
+        kind, code = KINDS[prefix], f"{prefix}-{number}"
+        for spec, paraphrase in SPECS.items():
+            chunk_id = f"{prefix}{number}-{spec.replace(' ', '-')}"
+            records.append(
+                {
+                    "id": chunk_id,
+                    "text": (
+                        f"{code} {kind} specification sheet. The {spec} of the "
+                        f"{code} is {rng.randint(10, 900)} units. See the {kind} "
+                        f"operator manual for service intervals."
+                    ),
+                    "metadata": {
+                        "x-amz-bedrock-kb-source-uri": f"s3://specs/{code}.pdf"
+                    },
+                }
+            )
+            if rng.random() < 0.5:
+                question = f"What is the {spec} of the {code}?"
+            else:
+                question = f"For the {code} {kind}, {paraphrase}?"
+            questions.append((question, chunk_id))
+    rng.shuffle(questions)
+    return records, questions
+
+
+def timed(search, questions):
+    found, latencies = [], []
+    for question, _ in questions:
+        start = time.perf_counter()
+        results = search(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([r["metadata"]["x-amz-bedrock-kb-chunk-id"] for r in results])
+    latencies.sort()
+    return found, statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def hit_rate(found, questions, k):
+    return statistics.mean(label in f[:k] for f, (_, label) in zip(found, questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--machines", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    records, questions = make_corpus(args.machines, args.seed)
+    questions = questions[: args.queries]
+    embeddings = [concept_embedding(r["text"]) for r in records]
+    vectors = LocalVectorIndex.build(records, embeddings)
+
+    split = len(records) * 9 // 10
+    start = time.perf_counter()
+    bm25 = BM25Index()
+    bm25.add(records[:split])
+    build_s = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        bm25.save(tmp)
+        save_s = time.perf_counter() - start
+        size_kb = sum(p.stat().st_size for p in Path(tmp).iterdir()) / 1024
+        start = time.perf_counter()
+        bm25 = BM25Index.load(tmp)
+        load_s = time.perf_counter() - start
+        # The last 10% arrives later, as an incremental ingestion run would
+        start = time.perf_counter()
+        bm25.add(records[split:])
+        add_s = time.perf_counter() - start
+        print(
+            f"BM25 over {len(records)} chunks, {len(bm25.terms)} terms: "
+            f"build {build_s * 1000:.0f} ms, save {save_s * 1000:.0f} ms "
+            f"({size_kb:.0f} KiB), load {load_s * 1000:.1f} ms, "
+            f"add {len(records) - split} more {add_s * 1000:.0f} ms\n"
+        )
+
+        def vector_search(q):
+            return vectors.search(concept_embedding(q), k=args.candidates)
+
+        def bm25_search(q):
+            return bm25.search(q, k=args.candidates)
+
+        def hybrid_search(q):
+            return reciprocal_rank_fusion(
+                [vector_search(q), bm25_search(q)],
+                k=args.rrf_k,
+                top_n=args.k,
+            )
+
+        print(
+            f"{'retriever':<10}{'hit@1':>8}{f'hit@{args.k}':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        )
+        for name, search in (
+            ("vector", vector_search),
+            ("bm25", bm25_search),
+            ("hybrid", hybrid_search),
+        ):
+            found, p50, p95 = timed(search, questions)
+            print(
+                f"{name:<10}{hit_rate(found, questions, 1):>8.1%}"
+                f"{hit_rate(found, questions, args.k):>8.1%}{p50:>9.2f}{p95:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Recall@k and latency of local_retrieval against a brute-force baseline.
+
+Uses a synthetic clustered corpus (no AWS calls). The baseline scores every
+row and fully sorts; the local index uses one matrix-vector product plus
+argpartition (exact) or the IVF index (approximate, nprobe clusters).
+
+Usage:
+    python benchmarks/bench_local_retrieval.py --rows 50000 --dims 1536 --k 5
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_retrieval import LocalVectorIndex  # noqa: E402
+
+
+def synthetic_corpus(rows: int, dims: int, topics: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dims)).astype(np.float32)
+    labels = rng.integers(0, topics, size=rows)
+    matrix = centers[labels] + 0.6 * rng.standard_normal((rows, dims)).astype(
+        np.float32
+    )
+    queries = centers[rng.integers(0, topics, size=200)] + 0.6 * rng.standard_normal(
+        (200, dims)
+    ).astype(np.float32)
+    return matrix, queries
+
+
+def brute_force(matrix: np.ndarray, query: np.ndarray, k: int):
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    scores = (matrix @ query) / norms
+    return list(np.argsort(-scores)[:k])
+
+
+def timed(fn, queries):
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def recall(truth, found, k):
+    return statistics.mean(len(set(t) & set(f)) / k for t, f in zip(truth, found))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    matrix, queries = synthetic_corpus(args.rows, args.dims, args.topics, args.seed)
+    records = [{"id": str(i), "text": f"chunk {i}"} for i in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        index = LocalVectorIndex.build(records, matrix)
+        index.build_ivf()
+        index.save(tmp)
+        build_s = time.perf_counter() - start
+        index = LocalVectorIndex.load(tmp, mmap=True)
+        print(
+            f"{args.rows} x {args.dims} corpus, k={args.k}, "
+            f"index build+save {build_s:.1f}s\n"
+        )
+
+        truth, p50, p95 = timed(lambda q: brute_force(matrix, q, args.k), queries)
+        print(f"{'brute-force':<16} recall@k=1.000  p50={p50:7.2f}ms  p95={p95:7.2f}ms")
+
+        def row_ids(q, nprobe=None):
+            return [row for row, _ in index.search_ids(q, args.k, nprobe)]
+
+        found, p50, p95 = timed(row_ids, queries)
+        print(
+            f"{'exact (mmap)':<16} recall@k={recall(truth, found, args.k):.3f}  "
+            f"p50={p50:7.2f}ms  p95={p95:7.2f}ms"
+        )
+        for nprobe in args.nprobe:
+            found, p50, p95 = timed(lambda q: row_ids(q, nprobe), queries)
+            print(
+                f"{f'ivf nprobe={nprobe}':<16} "
+                f"recall@k={recall(truth, found, args.k):.3f}  "
+                f"p50={p50:7.2f}ms  p95={p95:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
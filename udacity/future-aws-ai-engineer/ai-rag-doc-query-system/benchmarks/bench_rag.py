@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+End-to-end RAG benchmark against a simulated Bedrock backend.
+
+Swaps bedrock_utils.bedrock / bedrock_kb for the fakes in fake_bedrock.py
+(lognormal latencies, throttling, streamed output) and drives the full
+classify → retrieve → generate flow from --concurrency client threads.
+Nothing touches AWS, so it runs on a plain Linux box or in CI.
+
+Reports throughput, end-to-end p50/p95/p99, time to first token (with
+--stream), per-stage and per-model metrics, response cache and classifier
+effectiveness, and throttles. --model auto routes generation between the
+small and large model (model_router.py); the large one is --large-slowdown
+times slower. --rpm / --tpm put every model behind admission control
+(admission.py); --batch-ratio of the requests then run at BATCH priority,
+and shed requests are counted instead of failing the run. The retrieval
+cache (retrieval_cache.py) is reported separately from the response cache;
+--corpus-bumps invalidates it that many times during the run, as a corpus
+sync would. --json prints the same report as one JSON object for comparing
+runs.
+
+Usage:
+    python benchmarks/bench_rag.py --requests 200 --concurrency 16 \\
+        --repeat-ratio 0.3 --throttle-rate 0.02 --stream
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bedrock_utils as bu  # noqa: E402
+import constants as const  # noqa: E402
+from admission import (  # noqa: E402
+    BATCH,
+    INTERACTIVE,
+    AdmissionController,
+    Overloaded,
+    priority,
+)
+from fake_bedrock import (  # noqa: E402
+    MACHINES,
+    SPECS,
+    FakeBedrockAgentRuntime,
+    FakeBedrockRuntime,
+)
+from response_cache import ResponseCache  # noqa: E402
+from retrieval_cache import CorpusVersion, RetrievalCache  # noqa: E402
+
+MODEL_ID = "bench-model"
+KB_ID = "bench-kb"
+ON_TOPIC = [
+    "What is the {spec} of the {model} {kind}?",
+    "Tell me the {spec} for the {kind} {model}",
+    "How does the {kind} {model} rate on {spec}?",
+    "I'm planning a quarry job, is the {spec} of the {model} enough?",
+]
+OFF_TOPIC = [
+    "What's the weather like in Seattle tomorrow?",
+    "Write me a poem about the ocean",
+    "Which language model are you?",
+    "Recommend a good pizza place nearby",
+]
+
+
+def make_questions(
+    n: int, repeat_ratio: float, off_topic: float, seed: int
+) -> List[str]:
+    rng = random.Random(seed)
+    questions: List[str] = []
+    for _ in range(n):
+        if questions and rng.random() < repeat_ratio:
+            questions.append(rng.choice(questions))
+        elif rng.random() < off_topic:
+            questions.append(rng.choice(OFF_TOPIC))
+        else:
+            model, kind = rng.choice(list(MACHINES.items()))
+            questions.append(
+                rng.choice(ON_TOPIC).format(
+                    spec=rng.choice(SPECS), model=model.upper(), kind=kind
+                )
+            )
+    return questions
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_one(
+    question: str, model_id: str, stream: bool, cache, level: int
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        with priority(level):
+            result = _run_one(question, model_id, stream, cache, start)
+    except Overloaded:
+        result = {"allowed": False, "shed": True}
+    result["total_ms"] = (time.perf_counter() - start) * 1000
+    result["priority"] = level
+    return result
+
+
+def _run_one(
+    question: str, model_id: str, stream: bool, cache, start: float
+) -> Dict[str, Any]:
+    if not stream:
+        result = bu.answer_question(question, model_id, KB_ID, cache=cache)
+        return {"allowed": result.allowed}
+    result = bu.classify_and_retrieve(question, model_id, KB_ID)
+    first_ms = None
+    if result.allowed:
+        for _ in bu.stream_answer(result, question, model_id, cache=cache):
+            if first_ms is None:
+                first_ms = (time.perf_counter() - start) * 1000
+    return {"allowed": result.allowed, "first_token_ms": first_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--off-topic", type=float, default=0.1)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-retrieval-cache", action="store_true")
+    parser.add_argument(
+        "--corpus-bumps", type=int, default=0, help="corpus syncs during the run"
+    )
+    parser.add_argument(
+        "--model", default=MODEL_ID, help='generation model id, or "auto" to route'
+    )
+    parser.add_argument("--large-slowdown", type=float, default=2.5)
+    parser.add_argument("--rpm", type=float, default=0, help="0 = no admission")
+    parser.add_argument("--tpm", type=float, default=1_000_000)
+    parser.add_argument("--batch-ratio", type=float, default=0.0)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--first-token-p95-ms", type=float, default=1200)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--output-tokens", type=int, default=100)
+    parser.add_argument("--kb-ms", type=float, default=150)
+    parser.add_argument("--kb-p95-ms", type=float, default=400)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--backoff-ms", type=float, default=50, help="throttle_base_delay for the run"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    runtime = FakeBedrockRuntime(
+        first_token_ms=args.first_token_ms,
+        first_token_p95_ms=args.first_token_p95_ms,
+        token_ms=args.token_ms,
+        output_tokens=args.output_tokens,
+        classifier_answer=None,
+        throttle_rate=args.throttle_rate,
+        slowdown={bu.router.large_model: args.large_slowdown},
+        seed=args.seed,
+    )
+    kb = FakeBedrockAgentRuntime(
+        args.kb_ms, args.kb_p95_ms, throttle_rate=args.throttle_rate, seed=args.seed
+    )
+    bu.bedrock, bu.bedrock_kb = runtime, kb
+    const.throttle_base_delay = args.backoff_ms / 1000  # read per call
+    cache = None if args.no_cache else ResponseCache(max_entries=4096)
+    bu.retrieval_cache = None if args.no_retrieval_cache else RetrievalCache(4096)
+    # A private version file, so the run never invalidates a real deployment
+    version_dir = tempfile.TemporaryDirectory()
+    bu.corpus_version = CorpusVersion(
+        os.path.join(version_dir.name, "corpus_version.json")
+    )
+    bump_at = {
+        (i + 1) * args.requests // (args.corpus_bumps + 1)
+        for i in range(args.corpus_bumps)
+    }
+    models = {args.model, bu.router.small_model, bu.router.large_model}
+    if bu.router.classifier_model:
+        models.add(bu.router.classifier_model)
+    bu.admission = (
+        AdmissionController({m: (args.rpm, args.tpm) for m in models - {"auto"}})
+        if args.rpm
+        else None
+    )
+    rng = random.Random(args.seed)
+    levels = [
+        BATCH if rng.random() < args.batch_ratio else INTERACTIVE
+        for _ in range(args.requests)
+    ]
+
+    questions = make_questions(
+        args.requests, args.repeat_ratio, args.off_topic, args.seed
+    )
+    # Keep stdout parseable with --json (valid_prompt prints debug lines)
+    quiet = contextlib.redirect_stdout(io.StringIO()) if args.json else None
+    start = time.perf_counter()
+
+    def submit(i: int, question: str, level: int) -> Dict[str, Any]:
+        if i in bump_at:
+            bu.corpus_version.bump(f"bench bump at request {i}")
+        return run_one(question, args.model, args.stream, cache, level)
+
+    with quiet or contextlib.nullcontext():
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(submit, range(len(questions)), questions, levels))
+    elapsed = time.perf_counter() - start
+    version_dir.cleanup()
+
+    served = [r for r in results if not r.get("shed")]
+    totals = [r["total_ms"] for r in served]
+    first = [r["first_token_ms"] for r in results if r.get("first_token_ms")]
+    classifier = bu.prompt_classifier.stats()
+    report = {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_s": round(len(results) / elapsed, 2),
+        "allowed": sum(r["allowed"] for r in results),
+        "shed": len(results) - len(served),
+        "p50_ms_by_priority": {
+            name: round(statistics.median(samples), 1)
+            for name, samples in (
+                ("interactive", [r["total_ms"] for r in served if not r["priority"]]),
+                ("batch", [r["total_ms"] for r in served if r["priority"]]),
+            )
+            if samples
+        },
+        "latency_ms": {
+            "p50": round(statistics.median(totals), 1),
+            "p95": round(percentile(totals, 0.95), 1),
+            "p99": round(percentile(totals, 0.99), 1),
+        },
+        "first_token_ms": (
+            {
+                "p50": round(statistics.median(first), 1),
+                "p95": round(percentile(first, 0.95), 1),
+            }
+            if first
+            else None
+        ),
+        "response_cache": cache.stats() if cache else None,
+        "retrieval_cache": (bu.retrieval_cache.stats() if bu.retrieval_cache else None),
+        "classifier_llm_calls_avoided": classifier["llm_calls_avoided"],
+        "bedrock_calls": runtime.calls,
+        "kb_calls": kb.calls,
+        "throttles_injected": runtime.throttler.count + kb.throttler.count,
+        "stages": bu.metrics.summary(),
+        "models": bu.model_metrics.summary(),
+        "routes": bu.router.stats()["reasons"],
+        "coalesced": bu.flights.stats(),
+        "admission": bu.admission.stats() if bu.admission else None,
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    lat = report["latency_ms"]
+    print(
+        f"{report['requests']} requests @ concurrency {args.concurrency}: "
+        f"{report['requests_per_s']} req/s, "
+        f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms"
+    )
+    if bu.admission:
+        print(
+            f"admission: {report['shed']} shed; p50 by priority "
+            f"{report['p50_ms_by_priority']}"
+        )
+    if first:
+        ft = report["first_token_ms"]
+        print(f"time to first token: p50={ft['p50']}ms p95={ft['p95']}ms")
+    if cache:
+        rc = report["response_cache"]
+        print(f"response cache: {rc['hits']} hits, hit rate {rc['hit_rate']:.0%}")
+    if bu.retrieval_cache:
+        rt = report["retrieval_cache"]
+        print(
+            f"retrieval cache: {rt['hits']} hits, hit rate {rt['hit_rate']:.0%}, "
+            f"{rt['saved_ms'] / 1000:.1f}s retrieval saved "
+            f"(avg {rt['avg_saved_ms']}ms), {rt['invalidations']} invalidations"
+        )
+    print(
+        f"classifier: {classifier['llm_calls_avoided']} of {classifier['calls']} "
+        f"LLM calls avoided; bedrock calls {runtime.calls}, kb calls {kb.calls}, "
+        f"throttles injected {report['throttles_injected']}"
+    )
+    print(f"\n{'stage':<16}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'retries':>9}")
+    for stage, s in report["stages"].items():
+        print(
+            f"{stage:<16}{s['calls']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+            f"{s['retries']:>9}"
+        )
+    print(f"\n{'model':<44}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'tok/s':>8}")
+    for model, s in report["models"].items():
+        print(
+            f"{model:<44}{s['calls']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+            f"{s['output_tokens_per_s']:>8}"
+        )
+    for route, n in report["routes"].items():
+        print(f"routed {n:>5} × {route}")
+    for group, c in report["coalesced"].items():
+        print(f"coalesced {group}: {c['shared']} of {c['calls']} calls shared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Measure time-to-first-token: generate_response vs generate_response_stream.
+
+Runs offline against benchmarks/fake_bedrock.py, which emits the same
+chunked event stream as invoke_model_with_response_stream.
+
+Usage:
+    python benchmarks/bench_streaming.py --runs 5 --first-token-ms 400 --token-ms 15
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bedrock_utils  # noqa: E402
+from fake_bedrock import FakeBedrockRuntime  # noqa: E402
+
+PROMPT = "What is the operating weight of the X950 excavator?"
+
+
+def time_blocking():
+    start = time.perf_counter()
+    bedrock_utils.generate_response(PROMPT, "bench-model", 0.1, 0.9)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, elapsed  # first token arrives with the whole answer
+
+
+def time_streaming():
+    start = time.perf_counter()
+    first = None
+    for _ in bedrock_utils.generate_response_stream(PROMPT, "bench-model", 0.1, 0.9):
+        if first is None:
+            first = (time.perf_counter() - start) * 1000
+    return first, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    bedrock_utils.bedrock = FakeBedrockRuntime(
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        output_tokens=args.output_tokens,
+    )
+
+    for name, fn in (("invoke_model", time_blocking), ("stream", time_streaming)):
+        samples = [fn() for _ in range(args.runs)]
+        ttft = statistics.median(s[0] for s in samples)
+        total = statistics.median(s[1] for s in samples)
+        print(f"{name:<14} ttft={ttft:8.1f}ms  total={total:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Offline stand-ins for the boto3 clients used by bedrock_utils.
+
+FakeBedrockRuntime mimics bedrock-runtime closely enough for benchmarks:
+invoke_model returns a readable JSON body (answers, classifier verdicts or
+Titan-style embeddings), and invoke_model_with_response_stream returns
+chunked message events the same shape Bedrock sends for Anthropic models.
+
+FakeBedrockAgentRuntime mimics bedrock-agent-runtime.retrieve over a small
+synthetic spec-sheet corpus.
+
+Both take LatencyModel delays (lognormal: median + p95) and a throttle_rate
+at which calls raise ThrottlingException, so backoff, tail latency and
+concurrency effects show up without AWS.
+"""
+
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+
+MACHINES = {
+    "x950": "excavator",
+    "bd850": "bulldozer",
+    "dt1000": "dump truck",
+    "fl250": "forklift",
+    "mc750": "mobile crane",
+}
+SPECS = [
+    "operating weight",
+    "engine power",
+    "bucket capacity",
+    "fuel tank capacity",
+    "maximum reach",
+    "travel speed",
+]
+_DOMAIN_RE = re.compile(
+    r"\b(" + "|".join(list(MACHINES) + list(MACHINES.values())) + r"|machine\w*)\b"
+)
+
+
+class LatencyModel:
+    """
+    Lognormal delay in milliseconds, set by its median and p95.
+
+    p95_ms=None (or equal to the median) gives a constant delay.
+    """
+
+    def __init__(self, median_ms: float, p95_ms: Optional[float] = None, seed: int = 0):
+        self.median_ms = median_ms
+        ratio = (p95_ms or median_ms) / median_ms if median_ms else 1.0
+        self.sigma = math.log(ratio) / 1.645 if ratio > 1 else 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if not self.sigma:
+            return self.median_ms
+        with self._lock:
+            return self.median_ms * math.exp(self._rng.gauss(0, self.sigma))
+
+    def sleep(self) -> None:
+        time.sleep(self.sample() / 1000)
+
+
+class _Throttler:
+    def __init__(self, rate: float, operation: str, seed: int):
+        self.rate = rate
+        self.operation = operation
+        self.count = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def maybe_raise(self) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            throttled = self._rng.random() < self.rate
+            self.count += throttled
+        if throttled:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                self.operation,
+            )
+
+
+class FakeBedrockRuntime:
+    """
+    Deterministic-by-seed fake of the bedrock-runtime client.
+
+    first_token_ms / first_token_p95_ms: delay before the first output token
+    token_ms: delay per subsequent output token
+    output_tokens: answer length (words) for generation requests
+    classifier_answer: fixed classifier reply; None answers "Category E" for
+        requests mentioning a machine and "Category C" otherwise
+    throttle_rate: fraction of calls that raise ThrottlingException
+    embed_ms: delay per embedding request
+    slowdown: {substring of modelId: latency factor}, e.g. {"sonnet": 2.5},
+        so routing between a small and a large model shows up in latency
+    """
+
+    def __init__(
+        self,
+        first_token_ms: float = 400,
+        token_ms: float = 15,
+        output_tokens: int = 200,
+        classifier_answer: Optional[str] = "Category E",
+        first_token_p95_ms: Optional[float] = None,
+        throttle_rate: float = 0.0,
+        embedding_dims: int = 1536,
+        embed_ms: float = 20,
+        slowdown: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+    ):
+        self.first_token = LatencyModel(first_token_ms, first_token_p95_ms, seed)
+        self.token_ms = token_ms
+        self.output_tokens = output_tokens
+        self.classifier_answer = classifier_answer
+        self.embedding_dims = embedding_dims
+        self.embed_ms = embed_ms
+        self.slowdown = slowdown or {}
+        self.throttler = _Throttler(throttle_rate, "InvokeModel", seed + 1)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.calls += 1
+        self.throttler.maybe_raise()
+
+    def _classify(self, text: str) -> str:
+        if self.classifier_answer is not None:
+            return self.classifier_answer
+        request = text.split("<user_request>")[-1].split("</user_request>")[0]
+        return "Category E" if _DOMAIN_RE.search(request.lower()) else "Category C"
+
+    def _tokens(self, body: Dict[str, Any]):
+        if body.get("max_tokens", 0) <= 10:  # classifier request
+            return self._classify(body["messages"][0]["content"][0]["text"]).split(" ")
+        count = min(self.output_tokens, body.get("max_tokens", self.output_tokens))
+        return [f"token{i}" for i in range(count)]
+
+    def _factor(self, model_id: str) -> float:
+        for fragment, factor in self.slowdown.items():
+            if fragment in model_id:
+                return factor
+        return 1.0
+
+    def _input_tokens(self, body: Dict[str, Any]) -> int:
+        text = body["messages"][0]["content"][0]["text"]
+        return max(1, len(text) // 4)
+
+    def _embedding(self, text: str) -> List[float]:
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        return [
+            (seed[i % len(seed)] - 127.5) / 127.5 for i in range(self.embedding_dims)
+        ]
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        self._count()
+        request = json.loads(body)
+        if "inputText" in request:  # Titan embeddings
+            time.sleep(self.embed_ms / 1000)
+            payload: Dict[str, Any] = {
+                "embedding": self._embedding(request["inputText"]),
+                "inputTextTokenCount": max(1, len(request["inputText"]) // 4),
+            }
+            return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+        tokens = self._tokens(request)
+        delay = self.first_token.sample() + self.token_ms * (len(tokens) - 1)
+        time.sleep(delay * self._factor(modelId) / 1000)
+        payload = {
+            "content": [{"type": "text", "text": " ".join(tokens)}],
+            "usage": {
+                "input_tokens": self._input_tokens(request),
+                "output_tokens": len(tokens),
+            },
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(
+        self, modelId: str, body: str, **kwargs
+    ) -> Dict[str, Any]:
+        self._count()
+        request = json.loads(body)
+        return {"body": self._events(request, self._factor(modelId))}
+
+    def _events(
+        self, request: Dict[str, Any], factor: float = 1.0
+    ) -> Iterator[Dict[str, Any]]:
+        def event(payload: Dict[str, Any]) -> Dict[str, Any]:
+            return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+        tokens = self._tokens(request)
+        yield event(
+            {
+                "type": "message_start",
+                "message": {"usage": {"input_tokens": self._input_tokens(request)}},
+            }
+        )
+        for i, token in enumerate(tokens):
+            delay = self.first_token.sample() if i == 0 else self.token_ms
+            time.sleep(delay * factor / 1000)
+            text = token if i == 0 else f" {token}"
+            yield event(
+                {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": text},
+                }
+            )
+        yield event({"type": "message_delta", "usage": {"output_tokens": len(tokens)}})
+        yield event({"type": "message_stop"})
+
+
+def synthetic_corpus() -> List[Dict[str, Any]]:
+    """One chunk per (machine, spec) pair, in KB retrievalResults shape."""
+    chunks = []
+    for i, (model, kind) in enumerate(MACHINES.items()):
+        for j, spec in enumerate(SPECS):
+            text = (
+                f"{model.upper()} {kind} specification. The {spec} of the "
+                f"{model.upper()} {kind} is {100 + 37 * i + 11 * j} units. "
+                f"Refer to the {kind} operator manual for service intervals."
+            )
+            uri = f"s3://fake-bucket/spec-sheets/{kind.replace(' ', '-')}-{model}.pdf"
+            chunks.append(
+                {
+                    "content": {"type": "TEXT", "text": text},
+                    "location": {"type": "S3", "s3Location": {"uri": uri}},
+                    "metadata": {
+                        "x-amz-bedrock-kb-source-uri": uri,
+                        "x-amz-bedrock-kb-chunk-id": f"chunk-{model}-{j}",
+                    },
+                }
+            )
+    return chunks
+
+
+class FakeBedrockAgentRuntime:
+    """
+    Fake of bedrock-agent-runtime.retrieve over synthetic_corpus().
+
+    Scores are word-overlap fractions, so the same query always returns the
+    same chunks (which keeps response-cache keys stable across runs).
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 150,
+        latency_p95_ms: Optional[float] = None,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = LatencyModel(latency_ms, latency_p95_ms, seed + 2)
+        self.throttler = _Throttler(throttle_rate, "Retrieve", seed + 3)
+        self.corpus = synthetic_corpus()
+        self._terms = [
+            set(re.findall(r"[a-z0-9]+", c["content"]["text"].lower()))
+            for c in self.corpus
+        ]
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def retrieve(
+        self,
+        knowledgeBaseId: str,
+        retrievalQuery: Dict[str, str],
+        retrievalConfiguration: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+        self.throttler.maybe_raise()
+        self.latency.sleep()
+        k = (
+            (retrievalConfiguration or {})
+            .get("vectorSearchConfiguration", {})
+            .get("numberOfResults", 5)
+        )
+        query = set(re.findall(r"[a-z0-9]+", retrievalQuery["text"].lower()))
+        scored = sorted(
+            (
+                (len(query & terms) / (len(query) or 1), i)
+                for i, terms in enumerate(self._terms)
+            ),
+            key=lambda pair: (-pair[0], pair[1]),
+        )[:k]
+        return {
+            "retrievalResults": [
+                {**self.corpus[i], "score": round(score, 4)} for score, i in scored
+            ]
+        }
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for server.py (JSON and SSE endpoints).
+
+By default starts the service in-process under uvicorn, with the fake
+Bedrock backend from fake_bedrock.py, on a free local port. Pass --url to
+load an already running server instead (then nothing is faked).
+
+Clients are plain asyncio sockets (no extra dependencies). --concurrency
+keeps that many requests in flight (closed loop); --rate instead sends
+requests at a fixed arrival rate (open loop), which is how overload and
+backpressure show up: the service answers 503 / 429 with Retry-After
+instead of letting latency grow without bound.
+
+Reports throughput, status codes, latency p50/p95/p99 of successful
+requests, time to first delta with --stream, and the server's /stats gate
+and admission counters.
+
+Usage:
+    python benchmarks/load_test.py --requests 300 --concurrency 32 --stream
+    python benchmarks/load_test.py --rate 80 --requests 400 --max-active 16
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --stream
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_rag import KB_ID, make_questions, percentile  # noqa: E402
+
+
+async def http_request(
+    url: str, method: str, path: str, payload: Optional[Dict[str, Any]] = None
+) -> Tuple[int, Dict[str, str], bytes, Optional[float]]:
+    """(status, headers, body, seconds to the first SSE delta) over one connection."""
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        (
+            f"{method} {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        + body
+    )
+    await writer.drain()
+    raw = bytearray()
+    first_delta = None
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        raw += data
+        if first_delta is None and b"event: delta" in raw:
+            first_delta = time.perf_counter() - start
+    writer.close()
+    head, _, content = bytes(raw).partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {
+        k.strip().lower(): v.strip()
+        for k, _, v in (line.partition(":") for line in lines[1:])
+    }
+    if headers.get("transfer-encoding") == "chunked":
+        content = _dechunk(content)
+    return status, headers, content, first_delta
+
+
+def _dechunk(data: bytes) -> bytes:
+    out = bytearray()
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0] or b"0", 16)
+        if size == 0:
+            break
+        out += data[:size]
+        data = data[size + 2 :]
+    return bytes(out)
+
+
+async def one_request(url: str, question: str, args) -> Dict[str, Any]:
+    path = "/v1/answer/stream" if args.stream else "/v1/answer"
+    payload = {"question": question, "model_id": args.model, "kb_id": KB_ID}
+    start = time.perf_counter()
+    try:
+        status, headers, body, first = await http_request(url, "POST", path, payload)
+    except OSError as e:
+        return {"status": type(e).__name__, "ms": 0.0}
+    result = {
+        "status": status,
+        "ms": (time.perf_counter() - start) * 1000,
+        "first_ms": first * 1000 if first is not None else None,
+        "retry_after": headers.get("retry-after"),
+    }
+    if status == 200 and args.stream and b"event: error" in body:
+        result["status"] = "stream error"
+    return result
+
+
+async def run_load(url: str, questions: List[str], args) -> List[Dict[str, Any]]:
+    if args.rate:
+        rng = random.Random(args.seed)
+        tasks = []
+        for question in questions:
+            tasks.append(asyncio.ensure_future(one_request(url, question, args)))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        return list(await asyncio.gather(*tasks))
+
+    pending = iter(questions)
+    results: List[Dict[str, Any]] = []
+
+    async def client() -> None:
+        for question in pending:
+            results.append(await one_request(url, question, args))
+
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    return results
+
+
+def serve_in_process(args) -> Tuple[str, Any]:
+    """Start server.app under uvicorn on a free port, with fake Bedrock."""
+    import uvicorn
+
+    import bedrock_utils as bu
+    import constants as const
+    from fake_bedrock import FakeBedrockAgentRuntime, FakeBedrockRuntime
+
+    bu.bedrock = FakeBedrockRuntime(
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        output_tokens=args.output_tokens,
+        classifier_answer=None,
+        seed=args.seed,
+    )
+    bu.bedrock_kb = FakeBedrockAgentRuntime(args.kb_ms, seed=args.seed)
+    const.throttle_base_delay = 0.05
+    if args.rpm:
+        from admission import AdmissionController
+
+        models = {bu.router.small_model, bu.router.large_model, args.model}
+        models |= {bu.router.classifier_model} - {""}
+        bu.admission = AdmissionController(
+            {m: (args.rpm, 1_000_000) for m in models - {"auto"}}
+        )
+    import server
+
+    server.gate = server.Gate(args.max_active, args.max_waiting, args.queue_timeout)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    uv = uvicorn.Server(
+        uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=uv.run, daemon=True).start()
+    while not uv.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", uv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", help="running server; default: start one in-process")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0, help="requests/s, open loop")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--model", default="auto")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--off-topic", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    # In-process server only
+    parser.add_argument("--max-active", type=int, default=32)
+    parser.add_argument("--max-waiting", type=int, default=64)
+    parser.add_argument("--queue-timeout", type=float, default=5.0)
+    parser.add_argument("--rpm", type=float, default=0, help="0 = no admission")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--kb-ms", type=float, default=120)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    uv = None
+    url = args.url
+    if not url:
+        url, uv = serve_in_process(args)
+    questions = make_questions(
+        args.requests, args.repeat_ratio, args.off_topic, args.seed
+    )
+    start = time.perf_counter()
+    results = asyncio.run(run_load(url, questions, args))
+    elapsed = time.perf_counter() - start
+    _, _, body, _ = asyncio.run(http_request(url, "GET", "/stats"))
+    stats = json.loads(body)
+    if uv is not None:
+        uv.should_exit = True
+
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["ms"] for r in ok]
+    first = [r["first_ms"] for r in ok if r.get("first_ms")]
+    report = {
+        "requests": len(results),
+        "mode": (
+            f"rate {args.rate}/s" if args.rate else f"concurrency {args.concurrency}"
+        ),
+        "seconds": round(elapsed, 2),
+        "ok_per_s": round(len(ok) / elapsed, 2),
+        "status": dict(Counter(str(r["status"]) for r in results)),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1) if latencies else None,
+            "p95": round(percentile(latencies, 0.95), 1),
+            "p99": round(percentile(latencies, 0.99), 1),
+        },
+        "first_delta_ms": (
+            {
+                "p50": round(statistics.median(first), 1),
+                "p95": round(percentile(first, 0.95), 1),
+            }
+            if first
+            else None
+        ),
+        "server": stats["server"],
+        "admission": stats["admission"],
+        "coalesced": stats["coalesced"],
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    lat = report["latency_ms"]
+    print(
+        f"{report['requests']} requests ({report['mode']}) in {report['seconds']}s: "
+        f"{report['ok_per_s']} ok/s, status {report['status']}"
+    )
+    print(f"latency of 200s: p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms")
+    if first:
+        fd = report["first_delta_ms"]
+        print(f"first delta: p50={fd['p50']}ms p95={fd['p95']}ms")
+    print(f"server gate: {report['server']}")
+    for model, s in (report["admission"] or {}).items():
+        print(f"admission {model}: admitted {s['admitted']}, shed {s['shed']}")
+
+
+if __name__ == "__main__":
+    main()
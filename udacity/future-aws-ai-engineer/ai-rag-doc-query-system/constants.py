@@ -9,6 +9,117 @@ profile_name = "udacity-aws-lab-1"
 ctx_sz = 4000
 byte_sz = 4500
 
+# Answer cache in front of generate_response (see response_cache.py)
+response_cache_size = 256  # in-memory LRU entries
+response_cache_ttl = 3600  # seconds; 0 disables expiry
+response_cache_path = ""  # e.g. ".cache/responses.sqlite3"; empty = memory only
+response_cache_similarity = 0.0  # > 0 (e.g. 0.93) reuses near-duplicate prompts
+response_cache_semantic = False  # True: compare prompts with embedding_model_id
+
+# Retrieval cache in front of query_knowledge_base (see retrieval_cache.py),
+# cleared when upload_s3.py / ingestion.py bump the corpus version
+retrieval_cache = True
+retrieval_cache_size = 1024  # (KB, query, numberOfResults) entries
+retrieval_cache_ttl = 900  # seconds; backstop for changes made elsewhere; 0 = none
+corpus_version_path = ".cache/corpus_version.json"  # relative to this directory
+
+# Model routing (see model_router.py). The classifier always uses
+# classifier_model_id ("" = the request's model); model_id="auto" routes
+# generation between the small and large model.
+classifier_model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+small_model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+large_model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+router_max_small_words = 30  # longer questions go to the large model
+router_min_coverage = 0.5  # escalate if less of the question is in the context
+
+# Identical classify/retrieve/generate requests in flight at the same time
+# share one upstream call (see single_flight.py)
+coalesce_requests = True
+
+# Admission control for model calls (see admission.py): per-model
+# (requests per minute, tokens per minute), set to the account's Bedrock
+# quotas. Models not listed are not limited; 0 or None = unlimited.
+admission_control = True
+admission_limits = {
+    "anthropic.claude-3-haiku-20240307-v1:0": (1000, 2_000_000),
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (50, 400_000),
+}
+admission_max_queue = 64  # waiting calls per model before shedding
+admission_max_wait = {0: 10.0, 1: 300.0}  # seconds: interactive, batch
+
+# Headless HTTP service (see server.py). Each worker process has its own
+# clients, caches and admission budgets (split evenly between workers).
+server_host = "127.0.0.1"
+server_port = 8000
+server_workers = 1
+server_max_active = 32  # requests running per worker
+server_max_waiting = 64  # requests queued per worker before 503
+server_queue_timeout = 5.0  # seconds a queued request waits for a slot
+server_stream_buffer = 64  # streamed chunks buffered for a slow client
+rag_server_url = ""  # e.g. "http://127.0.0.1:8000": app.py becomes a thin client
+
+# Prompt classifier in front of valid_prompt (see prompt_classifier.py)
+classifier_cache_size = 1024  # memoized verdicts per (model, normalized prompt)
+classifier_local_rules = True  # deny clear meta/toxic prompts with regex rules
+classifier_lexical_model = True  # learn from LLM verdicts, deny when confident
+
+# boto3 clients (see aws_clients.py): HTTP pool, timeouts, botocore retries
+aws_max_pool_connections = 50  # >= concurrent chat sessions + pipeline_workers
+aws_connect_timeout = 5  # seconds
+aws_read_timeout = 60  # seconds; long generations need headroom
+aws_retry_mode = "adaptive"  # "standard" | "adaptive" (client-side rate limiting)
+aws_max_attempts = 1  # botocore attempts per call; throttle_retries does retries
+# App-level backoff on throttling, 5xx/model timeouts and connection/read
+# timeouts: full jitter, capped exponential. The only retry layer: at most
+# throttle_retries + 1 attempts per call
+throttle_retries = 4
+throttle_base_delay = 0.25  # seconds
+throttle_max_delay = 8.0  # seconds
+
+# Retrieval backend for query_knowledge_base: "bedrock" (KB) or "local"
+retrieval_backend = "bedrock"
+embedding_model_id = "amazon.titan-embed-text-v1"  # same model as the KB
+local_index_path = ".cache/local_index"  # see local_retrieval.py for layout
+local_index_nprobe = None  # IVF clusters to scan; None = exact search
+
+# Hybrid retrieval: fuse BM25 (lexical_index.py) with the vector results.
+# Local backend only (KB chunks never match the locally ingested ones).
+# Fused scores are reciprocal ranks (< 0.05), so keep context_min_score at 0.
+hybrid_retrieval = False
+lexical_index_path = ".cache/lexical_index"
+hybrid_rrf_k = 60
+hybrid_candidates = 10  # results fetched from each side before fusing
+
+# Embedding client (see embedding_service.py)
+embedding_cache_path = ".cache/embeddings.sqlite3"  # ":memory:" to disable
+embedding_batch_size = 1  # texts per request; Titan takes 1, Cohere up to 96
+embedding_workers = 8  # concurrent embedding requests
+
+# Local chunking (see ingestion.py); byte_sz caps a chunk's UTF-8 size
+chunk_tokens = 300  # approx tokens per chunk (KB default fixed-size chunking)
+chunk_overlap = 60  # tokens repeated at the start of the next chunk (20%)
+ingest_workers = 4  # parser processes
+
+# Context assembly before the prompt (see context_budget.py); ctx_sz = tokens
+context_budget = True  # False sends retrieved chunks verbatim
+context_min_score = 0.0  # drop chunks with a lower retrieval score
+context_dedupe_threshold = 0.8  # shingle containment that marks a duplicate
+context_max_chunks = 3  # chunks kept (and numberOfResults without re-rank)
+context_rerank = False  # re-rank a wider pool with a local scorer
+context_candidates = 10  # numberOfResults fetched when re-ranking
+
+# Chat memory (see conversation_memory.py)
+chat_history_tokens = 1000  # recent turns sent with each question
+chat_summary_tokens = 300  # running summary of older turns
+chat_max_messages = 200  # transcript kept for display
+chat_page_size = 20  # messages rendered per page
+
+# Stage latency p50/p95 panel in the app sidebar (see metrics.py)
+metrics_sidebar = True
+
+# Worker threads for answer_question (classify + retrieve run side by side)
+pipeline_workers = 8
+
 # {'db': 'myapp', 
 #  'dbClusterIdentifier': 'my-aurora-serverless',
 #  'engine': 'aurora-postgresql',
@@ -0,0 +1,179 @@
+"""
+Context assembly between retrieval and build_rag_prompt.
+
+build_rag_prompt (and the chat prompt in app.py) paste every retrieved chunk
+verbatim, so long or redundant chunks go straight into input tokens. The
+ContextBudgeter picks what actually reaches the prompt:
+
+1. Score cutoff: chunks below min_score are dropped.
+2. Re-rank (optional): a wider retrieval pool is re-scored with a cheap
+   local scorer (retrieval score blended with question-term coverage) and
+   cut to max_chunks.
+3. Near-duplicates: a chunk whose word shingles are mostly contained in an
+   already kept chunk is dropped; when consecutive chunks of one source
+   overlap (fixed-size chunking with overlap), the repeated words are
+   trimmed from the later chunk.
+4. Token budget: chunks are packed in rank order until max_tokens
+   (constants.ctx_sz); the chunk that crosses the budget is truncated at a
+   word boundary if a useful amount still fits.
+
+select() returns the kept items (same retrievalResults shape) and a report
+with the prompt tokens saved for this request.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from tokens import CHARS_PER_TOKEN, STOPWORDS, TOKEN_RE, approx_tokens
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def chunk_text(item: Dict[str, Any]) -> str:
+    """Text of a retrievalResults item (content may be a dict or a list)."""
+    content = item.get("content", {})
+    if isinstance(content, dict):
+        return content.get("text", "") or ""
+    return content[0].get("text", "") if content else ""
+
+
+def _source(item: Dict[str, Any]) -> str:
+    return item.get("metadata", {}).get("x-amz-bedrock-kb-source-uri", "")
+
+
+def _shingles(words: List[str], size: int = 3) -> Set[int]:
+    lowered = [w.lower() for w in words]
+    if len(lowered) < size:
+        return {hash(tuple(lowered))} if lowered else set()
+    return {hash(tuple(lowered[i : i + size])) for i in range(len(lowered) - size + 1)}
+
+
+def _overlap_prefix(prev: List[str], words: List[str], max_words: int) -> int:
+    """Length of the longest suffix of prev that is a prefix of words."""
+    for n in range(min(len(prev), len(words), max_words), 4, -1):
+        if prev[-n:] == words[:n]:
+            return n
+    return 0
+
+
+class ContextBudgeter:
+    """Filters, re-ranks, dedupes and packs retrieved chunks into a budget."""
+
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        min_score: float = 0.0,
+        dedupe_threshold: float = 0.8,
+        rerank: bool = False,
+        max_chunks: Optional[int] = None,
+        rerank_weight: float = 0.5,
+        min_truncated_tokens: int = 64,
+    ):
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.dedupe_threshold = dedupe_threshold
+        self.rerank = rerank
+        self.max_chunks = max_chunks
+        self.rerank_weight = rerank_weight
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def rerank_score(self, question_terms: Set[str], item: Dict[str, Any]) -> float:
+        """Retrieval score blended with the share of question terms covered."""
+        coverage = 0.0
+        if question_terms:
+            terms = set(TOKEN_RE.findall(chunk_text(item).lower()))
+            coverage = len(question_terms & terms) / len(question_terms)
+        score = float(item.get("score") or 0.0)
+        return (1 - self.rerank_weight) * score + self.rerank_weight * coverage
+
+    def select(
+        self, question: str, retrieval_results: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Kept items in prompt order, plus a per-request token report.
+
+        tokens_before is what the verbatim prompt would carry: the first
+        max_chunks results (all of them when max_chunks is None) in
+        retrieval order.
+        """
+        baseline = retrieval_results[: self.max_chunks]
+        report = {
+            "candidates": len(retrieval_results),
+            "kept": 0,
+            "below_score": 0,
+            "reranked_out": 0,
+            "duplicates": 0,
+            "over_budget": 0,
+            "tokens_before": sum(approx_tokens(chunk_text(i)) for i in baseline),
+            "tokens_after": 0,
+        }
+
+        items = [
+            item
+            for item in retrieval_results
+            if float(item.get("score") or 0.0) >= self.min_score
+        ]
+        report["below_score"] = len(retrieval_results) - len(items)
+
+        if self.rerank:
+            terms = set(TOKEN_RE.findall(question.lower())) - STOPWORDS
+            items = sorted(
+                items, key=lambda item: self.rerank_score(terms, item), reverse=True
+            )
+        if self.max_chunks is not None and len(items) > self.max_chunks:
+            report["reranked_out"] = len(items) - self.max_chunks
+            items = items[: self.max_chunks]
+
+        kept: List[Dict[str, Any]] = []
+        kept_shingles: List[Set[int]] = []
+        last_words: Dict[str, List[str]] = {}  # source -> words of its last chunk
+        budget = self.max_tokens
+        for item in items:
+            original = chunk_text(item)
+            spans = [m.span() for m in _WORD_RE.finditer(original)]
+            words = [original[a:b] for a, b in spans]
+            shingles = _shingles(words)
+            if any(
+                len(shingles & other)
+                >= self.dedupe_threshold * min(len(shingles), len(other))
+                for other in kept_shingles
+                if shingles and other
+            ):
+                report["duplicates"] += 1
+                continue
+            source = _source(item)
+            first = 0
+            if source in last_words:
+                first = _overlap_prefix(last_words[source], words, 200)
+            last = len(words)
+
+            text, trimmed = original, bool(first)
+            if trimmed:
+                text = original[spans[first][0] :] if first < last else ""
+            tokens = approx_tokens(text)
+            if tokens > budget:
+                if budget < self.min_truncated_tokens:
+                    report["over_budget"] += 1
+                    continue
+                # Keep whole words up to the remaining budget, sliced from
+                # the original so newlines and table layout survive
+                start = spans[first][0] if first < last else len(original)
+                limit = start + budget * CHARS_PER_TOKEN
+                last = first
+                while last < len(spans) and spans[last][1] <= limit:
+                    last += 1
+                text = original[start : spans[last - 1][1]] if last > first else ""
+                tokens = approx_tokens(text)
+                trimmed = True
+
+            if trimmed:
+                item = {**item, "content": {"type": "TEXT", "text": text}}
+            kept.append(item)
+            kept_shingles.append(shingles)
+            last_words[source] = words[first:last]
+            budget -= tokens
+
+        report["kept"] = len(kept)
+        report["tokens_after"] = sum(approx_tokens(chunk_text(i)) for i in kept)
+        report["tokens_saved"] = report["tokens_before"] - report["tokens_after"]
+        return kept, report
@@ -0,0 +1,179 @@
+"""
+Bounded conversation memory for the chat app.
+
+app.py used to keep every message in st.session_state forever, re-render
+all of them on each rerun, and still send the model only the latest
+question. ConversationMemory replaces that list:
+
+- transcript: the last max_messages messages, for display only, read a
+  page at a time (page(0) = newest) so reruns render a fixed amount.
+- window: the most recent turns that fit in max_tokens; this is the
+  history sent to the model with each question.
+- summary: turns evicted from the window are folded into a running summary
+  in batches (summarize_batch_tokens), so old context survives in a
+  bounded number of tokens. The summarizer is injected (bedrock_utils wires
+  in an LLM call); without one, or when it fails, an extractive summary of
+  the earlier user questions is kept instead.
+
+history_messages() returns Anthropic-style messages (user/assistant
+alternating, summary first) ready to prepend to the new question.
+"""
+
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from tokens import approx_tokens
+
+# (previous summary, evicted turns) -> new summary ("" on failure)
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+# Short follow-ups ("and its weight?") need the previous question to be
+# retrieved sensibly
+FOLLOW_UP_MAX_WORDS = 8
+
+
+class ConversationMemory:
+    """Token-bounded sliding window + incremental summary + paged transcript."""
+
+    def __init__(
+        self,
+        max_tokens: int = 1000,
+        summarizer: Optional[Summarizer] = None,
+        max_summary_tokens: int = 300,
+        summarize_batch_tokens: int = 400,
+        max_messages: int = 200,
+        page_size: int = 20,
+    ):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.max_summary_tokens = max_summary_tokens
+        self.summarize_batch_tokens = summarize_batch_tokens
+        self.page_size = page_size
+        self.transcript: Deque[Dict[str, str]] = deque(maxlen=max_messages)
+        self.window: Deque[Dict[str, str]] = deque()
+        self.summary = ""
+        self._window_tokens = 0
+        self._evicted: List[Dict[str, str]] = []
+        self._evicted_tokens = 0
+
+    # -- writing -------------------------------------------------------------
+
+    def add(self, role: str, content: str, context: bool = True) -> None:
+        """
+        Record one message (role "user" or "assistant").
+
+        context=False only shows it in the transcript: it never reaches the
+        window, the summary or history_messages() (e.g. a rejected prompt
+        and the fallback reply).
+        """
+        message = {"role": role, "content": content}
+        self.transcript.append(message)
+        if not context:
+            return
+        self.window.append(message)
+        self._window_tokens += approx_tokens(content)
+        # Evict whole user/assistant pairs so the window starts with "user"
+        while self._window_tokens > self.max_tokens and len(self.window) > 2:
+            self._evict(self.window.popleft())
+            if self.window and self.window[0]["role"] == "assistant":
+                self._evict(self.window.popleft())
+        if self._evicted_tokens >= self.summarize_batch_tokens:
+            self._summarize()
+
+    def clear(self) -> None:
+        self.transcript.clear()
+        self.window.clear()
+        self.summary = ""
+        self._window_tokens = 0
+        self._evicted = []
+        self._evicted_tokens = 0
+
+    def _evict(self, message: Dict[str, str]) -> None:
+        tokens = approx_tokens(message["content"])
+        self._window_tokens -= tokens
+        self._evicted.append(message)
+        self._evicted_tokens += tokens
+
+    def _summarize(self) -> None:
+        turns, self._evicted, self._evicted_tokens = self._evicted, [], 0
+        summary = ""
+        if self.summarizer is not None:
+            summary = self.summarizer(self.summary, turns).strip()
+        if not summary:
+            summary = self._extractive_summary(turns)
+        self.summary = self._clip(summary)
+
+    def _extractive_summary(self, turns: List[Dict[str, str]]) -> str:
+        asked = [t["content"].strip() for t in turns if t["role"] == "user"]
+        if not asked:
+            return self.summary
+        earlier = f"{self.summary} " if self.summary else "Earlier the user asked: "
+        return earlier + " | ".join(asked)
+
+    def _clip(self, text: str) -> str:
+        # Keep the newest part: drop words from the front until it fits
+        words = text.split()
+        while words and approx_tokens(" ".join(words)) > self.max_summary_tokens:
+            words = words[max(1, len(words) // 10) :]
+        return " ".join(words)
+
+    # -- reading -------------------------------------------------------------
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """Summary + window as alternating user/assistant messages."""
+        messages: List[Dict[str, str]] = []
+        if self.summary:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": f"Summary of our earlier conversation: {self.summary}",
+                }
+            )
+            messages.append({"role": "assistant", "content": "Understood."})
+        for message in self.window:
+            if messages and messages[-1]["role"] == message["role"]:
+                # Same role twice (e.g. a rejected prompt): merge, keep alternation
+                messages[-1] = {
+                    "role": message["role"],
+                    "content": f"{messages[-1]['content']}\n\n{message['content']}",
+                }
+            else:
+                messages.append(dict(message))
+        if messages and messages[-1]["role"] == "user":
+            messages.append({"role": "assistant", "content": "(no answer)"})
+        return messages
+
+    def contextualize(self, question: str) -> str:
+        """
+        Query text for retrieval (never for classification).
+
+        A short follow-up is prefixed with the previous user question, so
+        "and its weight?" is searched as part of the machine it refers to.
+        The raw question is still what gets classified, so an earlier
+        on-topic turn cannot carry an off-topic follow-up through.
+        """
+        if len(question.split()) > FOLLOW_UP_MAX_WORDS:
+            return question
+        for message in reversed(self.window):
+            if message["role"] == "user":
+                return f"{message['content']} {question}"
+        return question
+
+    def page_count(self) -> int:
+        return max(1, -(-len(self.transcript) // self.page_size))
+
+    def page(self, number: int = 0) -> List[Dict[str, str]]:
+        """Messages of page `number` (0 = newest), oldest first."""
+        end = len(self.transcript) - number * self.page_size
+        if end <= 0:
+            return []
+        start = max(0, end - self.page_size)
+        return [self.transcript[i] for i in range(start, end)]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "messages": len(self.transcript),
+            "window_messages": len(self.window),
+            "window_tokens": self._window_tokens,
+            "summary_tokens": approx_tokens(self.summary),
+        }
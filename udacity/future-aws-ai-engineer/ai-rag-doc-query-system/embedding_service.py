@@ -0,0 +1,168 @@
+"""
+Batched, cached embedding client for chunk ingestion and query encoding.
+
+The KB embeds with amazon.titan-embed-text-v1 (modules/bedrock_kb/main.tf).
+Anything we embed locally (re-indexing, local retrieval queries) goes through
+this service so that:
+
+- Identical texts are embedded once: vectors are cached under a content hash
+  of (model_id, text) in SQLite as compact float32 blobs, so re-ingesting an
+  unchanged corpus makes zero API calls.
+- Misses are split into request batches and sent concurrently on a thread
+  pool (Titan takes one text per request; Cohere models take up to 96).
+- Hit rate and embeddings/sec are tracked in stats().
+
+Note:
+- The caller supplies embed_batch(texts, model_id) -> vectors, which keeps
+  this module free of boto3 (bedrock_utils wires in the Bedrock call).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+EmbedBatchFn = Callable[[List[str], str], List[List[float]]]
+
+
+def content_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent key -> float32 vector store (SQLite, one blob per vector)."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so importing bedrock_utils touches no files
+        if self._conn is None:
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+        return self._conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(keys), 500):  # stay under SQLite's param limit
+                batch = list(keys[i : i + 500])
+                rows = db.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vec).tobytes()) for key, vec in items.items()],
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class EmbeddingService:
+    """Dedupe → cache lookup → concurrent batched API calls for the misses."""
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFn,
+        model_id: str = "amazon.titan-embed-text-v1",
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 1,
+        max_workers: int = 8,
+    ):
+        self.embed_batch = embed_batch
+        self.model_id = model_id
+        # Not `cache or ...`: an empty cache has len 0 and is falsy
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "requested": 0,
+            "cache_hits": 0,
+            "embedded": 0,
+            "api_calls": 0,
+            "api_seconds": 0.0,
+        }
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Vectors for texts, in order; only uncached unique texts hit the API."""
+        keys = [content_key(self.model_id, text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self.cache.get_many(list(unique))
+        missing = [(key, text) for key, text in unique.items() if key not in vectors]
+
+        if missing:
+            batches = [
+                missing[i : i + self.batch_size]
+                for i in range(0, len(missing), self.batch_size)
+            ]
+            start = time.perf_counter()
+            workers = min(self.max_workers, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(
+                    lambda batch: self.embed_batch(
+                        [text for _, text in batch], self.model_id
+                    ),
+                    batches,
+                )
+                new: Dict[str, List[float]] = {}
+                for batch, batch_vectors in zip(batches, results):
+                    for (key, _), vec in zip(batch, batch_vectors):
+                        new[key] = vec
+            elapsed = time.perf_counter() - start
+            self.cache.put_many(new)
+            vectors.update(new)
+            with self._lock:
+                self._stats["embedded"] += len(new)
+                self._stats["api_calls"] += len(batches)
+                self._stats["api_seconds"] += elapsed
+
+        with self._lock:
+            self._stats["requested"] += len(texts)
+            self._stats["cache_hits"] += len(texts) - len(missing)
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus cache hit rate and embeddings/sec of API work."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = (
+            stats["cache_hits"] / stats["requested"] if stats["requested"] else 0.0
+        )
+        stats["embeddings_per_s"] = (
+            stats["embedded"] / stats["api_seconds"] if stats["api_seconds"] else 0.0
+        )
+        return stats
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Streaming chunker and ingestion pipeline for the spec-sheet corpus.
+
+The managed KB chunks documents server-side; this module does it locally so
+chunk size, overlap and re-ingestion cost are under our control (e.g. to
+build the local retrieval index or load Aurora through aurora_store).
+
+- Files under scripts/spec-sheets (PDF, .txt, .md) are parsed on a process
+  pool. PDFs are read page by page and text files in byte_sz blocks, so a
+  document is never held in memory whole.
+- Text is chunked by an approximate token budget (chunk_tokens, ~4 chars per
+  token) with chunk_overlap tokens carried into the next chunk. byte_sz caps
+  the UTF-8 size of a chunk.
+- Chunks are deduped by content hash; the hash is also the chunk id (a UUID,
+  as the Aurora table expects).
+- Workers hand chunks back in small batches through a bounded queue, and
+  IngestionPipeline.iter_chunks() yields them as they arrive.
+- report() has files, chunks, duplicates, chunks/sec, MB/sec and peak RSS.
+
+Chunk records: {"id", "text", "metadata"} with metadata
+x-amz-bedrock-kb-source-uri and x-amz-bedrock-kb-document-page-number, the
+same keys Bedrock KB returns, so records feed LocalVectorIndex.build and
+AuroraVectorStore.ingest directly.
+
+Usage:
+    python ingestion.py scripts/spec-sheets chunks.jsonl \\
+        --source-prefix s3://<bucket>/spec-sheets --workers 4 \\
+        --local-index .cache/local_index --lexical-index .cache/lexical_index
+"""
+
+import argparse
+import codecs
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import queue as queue_module
+import resource
+import sys
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import constants as const
+from tokens import CHARS_PER_TOKEN, approx_tokens
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md")
+QUEUE_BATCH = 32  # chunks per queue message
+
+
+def chunk_id(text: str) -> str:
+    """Deterministic UUID from the chunk's content hash."""
+    return str(uuid.UUID(hex=hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]))
+
+
+def iter_source_files(folder: str) -> Iterator[Path]:
+    for path in sorted(Path(folder).rglob("*")):
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES:
+            yield path
+
+
+# ---------------------------------------------------------------------------
+# Parsing & chunking
+# ---------------------------------------------------------------------------
+
+
+def iter_text_blocks(path: Path, block_bytes: int) -> Iterator[Tuple[int, str]]:
+    """(page_number, text) blocks; text files report page 1."""
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader  # only needed for PDFs
+
+        reader = PdfReader(str(path))
+        for page_number, page in enumerate(reader.pages, start=1):
+            # Trailing newline: a page never ends mid-word
+            yield page_number, (page.extract_text() or "") + "\n"
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_bytes), b""):
+            yield 1, decoder.decode(block)
+    yield 1, decoder.decode(b"", final=True)
+
+
+def split_long_word(word: str, max_chars: int, max_bytes: int) -> Iterator[str]:
+    """Hard-split a run of text with no whitespace into chunk-sized pieces."""
+    while word:
+        piece = word[:max_chars]
+        encoded = len(piece.encode("utf-8"))
+        while encoded > max_bytes and len(piece) > 1:
+            piece = piece[: max(1, len(piece) * max_bytes // encoded)]
+            encoded = len(piece.encode("utf-8"))
+        yield piece
+        word = word[len(piece) :]
+
+
+def chunk_blocks(
+    blocks: Iterable[Tuple[int, str]],
+    max_tokens: int,
+    overlap_tokens: int,
+    max_bytes: int,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Sliding window over the words of a block stream.
+
+    Yields (page_number of the first word, chunk text). A chunk closes when
+    the next word would exceed max_tokens or max_bytes; its last
+    overlap_tokens worth of words start the next chunk. Words longer than a
+    whole chunk (e.g. base64 or minified text) are hard-split, so no chunk
+    exceeds the limits and the carried partial word stays bounded.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    max_word_bytes = max_bytes - 1  # each word also pays for one separator
+    window: Deque[Tuple[str, int, int, int]] = deque()  # word, tokens, bytes, page
+    tokens = size = 0
+    carry = ""
+    emitted_upto = 0  # words of the window already covered by a chunk
+
+    def add(word: str, page: int) -> Iterator[Tuple[int, str]]:
+        nonlocal tokens, size, emitted_upto
+        word_tokens, word_bytes = approx_tokens(word), len(word.encode("utf-8")) + 1
+        if window and (
+            tokens + word_tokens > max_tokens or size + word_bytes > max_bytes
+        ):
+            yield window[0][3], " ".join(w for w, _, _, _ in window)
+            while window and (
+                tokens > overlap_tokens
+                or tokens + word_tokens > max_tokens
+                or size + word_bytes > max_bytes
+            ):
+                _, t, b, _ = window.popleft()
+                tokens -= t
+                size -= b
+            emitted_upto = len(window)
+        window.append((word, word_tokens, word_bytes, page))
+        tokens += word_tokens
+        size += word_bytes
+
+    def add_word(word: str, page: int) -> Iterator[Tuple[int, str]]:
+        for piece in split_long_word(word, max_chars, max_word_bytes):
+            yield from add(piece, page)
+
+    for page, block in blocks:
+        words = (carry + block).split()
+        carry = ""
+        if words and block and not block[-1].isspace():
+            carry = words.pop()  # may continue in the next block
+            if len(carry) > max_chars:
+                # No whitespace for a whole chunk: emit all but the tail
+                *pieces, carry = split_long_word(carry, max_chars, max_word_bytes)
+                words.extend(pieces)
+        for word in words:
+            yield from add_word(word, page)
+    if carry:
+        yield from add_word(carry, page)
+    if len(window) > emitted_upto:
+        yield window[0][3], " ".join(w for w, _, _, _ in window)
+
+
+def iter_file_chunks(
+    path: Path,
+    root: Path,
+    source_prefix: str,
+    max_tokens: int,
+    overlap_tokens: int,
+    max_bytes: int,
+) -> Iterator[Dict[str, Any]]:
+    """Chunk records for one file (no dedupe)."""
+    relative = path.relative_to(root).as_posix()
+    source = f"{source_prefix.rstrip('/')}/{relative}" if source_prefix else relative
+    blocks = iter_text_blocks(path, max_bytes)
+    for page, text in chunk_blocks(blocks, max_tokens, overlap_tokens, max_bytes):
+        yield {
+            "id": chunk_id(text),
+            "text": text,
+            "metadata": {
+                "x-amz-bedrock-kb-source-uri": source,
+                "x-amz-bedrock-kb-document-page-number": page,
+            },
+        }
+
+
+# ---------------------------------------------------------------------------
+# Process pool
+# ---------------------------------------------------------------------------
+
+_queue: Optional[Any] = None
+
+
+def _init_worker(queue: Any) -> None:
+    global _queue
+    _queue = queue
+
+
+def _file_messages(task: Tuple[str, str, str, int, int, int]) -> Iterator[Tuple]:
+    """("chunks", [records]) batches for one file, then ("done", stats)."""
+    path, root, source_prefix, max_tokens, overlap_tokens, max_bytes = task
+    batch: List[Dict[str, Any]] = []
+    error = None
+    try:
+        for record in iter_file_chunks(
+            Path(path), Path(root), source_prefix, max_tokens, overlap_tokens, max_bytes
+        ):
+            batch.append(record)
+            if len(batch) >= QUEUE_BATCH:
+                yield "chunks", batch
+                batch = []
+    except Exception as e:  # reported per file; other files keep going
+        error = f"{type(e).__name__}: {e}"
+    if batch:
+        yield "chunks", batch
+    try:
+        size = os.path.getsize(path)
+    except OSError as e:  # removed while ingesting
+        size, error = 0, error or f"{type(e).__name__}: {e}"
+    yield "done", (path, size, error)
+
+
+def _produce(task: Tuple[str, str, str, int, int, int]) -> None:
+    """Worker: stream one file's messages to the parent, always ending in "done"."""
+    done = False
+    error = "worker stopped before finishing the file"
+    try:
+        for message in _file_messages(task):
+            _queue.put(message)
+            done = message[0] == "done"
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if not done:  # the parent counts one "done" per file
+            _queue.put(("done", (task[0], 0, error)))
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss * scale / 1e6, 1)
+
+
+class IngestionPipeline:
+    """Parse → chunk → dedupe, streaming chunk records from a process pool."""
+
+    def __init__(
+        self,
+        chunk_tokens: int = getattr(const, "chunk_tokens", 300),
+        chunk_overlap: int = getattr(const, "chunk_overlap", 60),
+        max_chunk_bytes: int = const.byte_sz,
+        workers: int = getattr(const, "ingest_workers", 4),
+        source_prefix: str = "",
+    ):
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.max_chunk_bytes = max_chunk_bytes
+        self.workers = workers
+        self.source_prefix = source_prefix
+        self._report: Dict[str, Any] = {}
+
+    def iter_chunks(self, folder: str) -> Iterator[Dict[str, Any]]:
+        """Unique chunk records for every supported file under folder."""
+        start = time.perf_counter()
+        files = [str(p) for p in iter_source_files(folder)]
+        report = self._report = {
+            "files": len(files),
+            "failed": [],
+            "bytes": 0,
+            "chunks": 0,
+            "duplicates": 0,
+        }
+        seen = set()
+        tasks = [
+            (
+                path,
+                folder,
+                self.source_prefix,
+                self.chunk_tokens,
+                self.chunk_overlap,
+                self.max_chunk_bytes,
+            )
+            for path in files
+        ]
+        try:
+            for kind, payload in self._messages(tasks):
+                if kind == "done":
+                    path, size, error = payload
+                    report["bytes"] += size
+                    if error:
+                        report["failed"].append({"file": path, "error": error})
+                    continue
+                for record in payload:
+                    if record["id"] in seen:
+                        report["duplicates"] += 1
+                        continue
+                    seen.add(record["id"])
+                    report["chunks"] += 1
+                    yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            report["seconds"] = round(elapsed, 2)
+            report["chunks_per_s"] = (
+                round(report["chunks"] / elapsed, 1) if elapsed else 0.0
+            )
+            report["mb_per_s"] = (
+                round(report["bytes"] / 1e6 / elapsed, 2) if elapsed else 0.0
+            )
+            report["peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF)
+            report["peak_rss_workers_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    def _messages(self, tasks: List[Tuple]) -> Iterator[Tuple[str, Any]]:
+        if self.workers <= 1 or len(tasks) <= 1:
+            # In-process: same message stream, no pool start-up cost
+            for task in tasks:
+                yield from _file_messages(task)
+            return
+
+        ctx = mp.get_context("spawn")  # no forked copy of the parent's heap
+        # Bounded queue: workers block instead of buffering whole documents
+        queue = ctx.Queue(maxsize=self.workers * 4)
+        with ctx.Pool(
+            min(self.workers, len(tasks)), initializer=_init_worker, initargs=(queue,)
+        ) as pool:
+            pending = pool.map_async(_produce, tasks, chunksize=1)
+            remaining = len(tasks)
+            while remaining:
+                try:
+                    kind, payload = queue.get(timeout=1.0)
+                except queue_module.Empty:
+                    if pending.ready():
+                        pending.get()  # re-raises a worker's exception
+                        if queue.empty():
+                            raise RuntimeError(
+                                f"ingestion workers finished with {remaining} "
+                                "files unreported"
+                            ) from None
+                    continue
+                if kind == "done":
+                    remaining -= 1
+                yield kind, payload
+            pending.get()
+
+    def report(self) -> Dict[str, Any]:
+        """Counters from the last iter_chunks() run."""
+        return dict(self._report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk the spec-sheet corpus.")
+    parser.add_argument("folder", nargs="?", default="scripts/spec-sheets")
+    parser.add_argument("output", nargs="?", default="chunks.jsonl")
+    parser.add_argument("--source-prefix", default="")
+    parser.add_argument(
+        "--workers", type=int, default=getattr(const, "ingest_workers", 4)
+    )
+    parser.add_argument(
+        "--chunk-tokens", type=int, default=getattr(const, "chunk_tokens", 300)
+    )
+    parser.add_argument(
+        "--chunk-overlap", type=int, default=getattr(const, "chunk_overlap", 60)
+    )
+    parser.add_argument(
+        "--lexical-index",
+        help="also add the chunks to this BM25 index directory (lexical_index.py)",
+    )
+    parser.add_argument(
+        "--local-index",
+        help="also embed the chunks into this vector index directory "
+        "(local_retrieval.py, rebuilt)",
+    )
+    parser.add_argument(
+        "--ivf-lists", type=int, default=0, help="IVF clusters for --local-index"
+    )
+    args = parser.parse_args()
+
+    pipeline = IngestionPipeline(
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap=args.chunk_overlap,
+        workers=args.workers,
+        source_prefix=args.source_prefix,
+    )
+    with open(args.output, "w", encoding="utf-8") as out:
+        for record in pipeline.iter_chunks(args.folder):
+            out.write(json.dumps(record) + "\n")
+    report = pipeline.report()
+    changed = False
+    if args.local_index:
+        import bedrock_utils
+        from local_retrieval import build_from_chunks
+
+        with open(args.output, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        vector_index = build_from_chunks(
+            records, bedrock_utils.embedding_service, args.ivf_lists
+        )
+        vector_index.save(args.local_index)
+        report["local_index_chunks"] = len(vector_index)
+        report["embeddings"] = bedrock_utils.embedding_service.stats()
+        changed = True
+    if args.lexical_index:
+        from lexical_index import BM25Index
+
+        exists = (Path(args.lexical_index) / "terms.json").exists()
+        index = (
+            BM25Index.load(args.lexical_index, mmap=False) if exists else BM25Index()
+        )
+        with open(args.output, encoding="utf-8") as f:
+            report["lexical_index_added"] = index.add(
+                json.loads(line) for line in f if line.strip()
+            )
+        index.save(args.lexical_index)
+        changed = changed or bool(report["lexical_index_added"])
+    if changed:
+        from retrieval_cache import bump_corpus_version
+
+        bump_corpus_version(f"ingestion: {args.folder}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
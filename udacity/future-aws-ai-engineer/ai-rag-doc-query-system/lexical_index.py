@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+BM25 inverted index over chunk records, plus reciprocal-rank fusion.
+
+Embedding search tends to miss exact model numbers and part codes ("X950",
+"BD-850"), which pushed us to raise numberOfResults. This index scores
+chunks by those exact terms, and reciprocal_rank_fusion merges its ranking
+with the vector ranking.
+
+- Tokens: lowercase alphanumerics; hyphenated codes are indexed both whole
+  ("bd850") and by part ("bd", "850").
+- Postings are array-backed: per term, a run of uint32 doc ids and uint16
+  term frequencies in two flat arrays with int64 offsets (like
+  local_retrieval's IVF lists).
+- Incremental: add() appends records (skipping known ids) to small
+  in-memory delta postings; save() merges delta and base into compact
+  arrays. A loaded index memory-maps the base arrays.
+- Results use the Bedrock retrievalResults shape (local_retrieval's
+  to_retrieval_result), so they mix freely with KB / vector results.
+
+Index directory layout:
+- terms.json         term list (position = term id)
+- postings_*.npy     offsets (n_terms + 1), doc ids, term frequencies
+- doc_len.npy        tokens per chunk
+- records.jsonl      one {"id", "text", "metadata"} per doc id
+
+Usage (chunks.jsonl from ingestion.py):
+    python lexical_index.py chunks.jsonl .cache/lexical_index
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from local_retrieval import top_k, to_retrieval_result
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if "-" in token:
+            parts = token.split("-")
+            tokens.extend(parts)
+            tokens.append("".join(parts))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over chunk records with array-backed postings."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.records: List[Dict[str, Any]] = []
+        self.terms: Dict[str, int] = {}
+        self.doc_len = array("I")
+        self._ids = set()
+        # Base postings (compact, possibly memory-mapped)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.uint32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+        # Delta postings for records added since the last save/load
+        self._delta: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Index new records ({"id", "text", "metadata"}); returns count added."""
+        added = 0
+        for record in records:
+            record_id = (
+                record.get("id")
+                or hashlib.sha256(record["text"].encode("utf-8")).hexdigest()
+            )
+            if record_id in self._ids:
+                continue
+            doc = len(self.records)
+            tokens = tokenize(record["text"])
+            for term, tf in Counter(tokens).items():
+                term_id = self.terms.setdefault(term, len(self.terms))
+                docs, tfs = self._delta.setdefault(term_id, (array("I"), array("H")))
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+            self.records.append(
+                {
+                    "id": record_id,
+                    "text": record["text"],
+                    "metadata": record.get("metadata", {}),
+                }
+            )
+            self.doc_len.append(len(tokens))
+            self._ids.add(record_id)
+            added += 1
+        return added
+
+    def _postings(self, term_id: int):
+        """(doc ids, tfs) for a term: base run followed by delta run."""
+        parts_docs, parts_tfs = [], []
+        if term_id + 1 < len(self._offsets):
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            parts_docs.append(self._docs[start:end])
+            parts_tfs.append(self._tfs[start:end])
+        if term_id in self._delta:
+            docs, tfs = self._delta[term_id]
+            parts_docs.append(np.frombuffer(docs, dtype=np.uint32))
+            parts_tfs.append(np.frombuffer(tfs, dtype=np.uint16))
+        if len(parts_docs) == 1:
+            return parts_docs[0], parts_tfs[0]
+        if not parts_docs:
+            return None, None
+        return np.concatenate(parts_docs), np.concatenate(parts_tfs)
+
+    def search_ids(self, query: str, k: int = 3) -> List[tuple]:
+        """(doc id, BM25 score) for the k best chunks with a positive score."""
+        n = len(self.records)
+        if not n:
+            return []
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / max(doc_len.mean(), 1.0))
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            docs, tfs = self._postings(term_id)
+            if docs is None or not len(docs):
+                continue
+            df = len(docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        best = top_k(scores, k)
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top-k chunks in Bedrock retrievalResults shape (score = BM25)."""
+        return [
+            to_retrieval_result(self.records[doc], score)
+            for doc, score in self.search_ids(query, k)
+        ]
+
+    # -- persistence ---------------------------------------------------------
+
+    def _compact(self) -> None:
+        """Merge delta postings into the base arrays."""
+        if not self._delta:
+            return
+        offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        docs_parts, tfs_parts = [], []
+        for term_id in range(len(self.terms)):
+            docs, tfs = self._postings(term_id)
+            if docs is None:
+                docs = np.zeros(0, dtype=np.uint32)
+                tfs = np.zeros(0, dtype=np.uint16)
+            docs_parts.append(docs)
+            tfs_parts.append(tfs)
+            offsets[term_id + 1] = offsets[term_id] + len(docs)
+        self._offsets = offsets
+        self._docs = np.concatenate(docs_parts).astype(np.uint32)
+        self._tfs = np.concatenate(tfs_parts).astype(np.uint16)
+        self._delta = {}
+
+    def save(self, path: str) -> None:
+        self._compact()
+        out = Path(path)
+        out.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.terms, key=self.terms.get)
+        (out / "terms.json").write_text(json.dumps(terms))
+        np.save(out / "postings_offsets.npy", self._offsets)
+        np.save(out / "postings_docs.npy", self._docs)
+        np.save(out / "postings_tfs.npy", self._tfs)
+        np.save(out / "doc_len.npy", np.frombuffer(self.doc_len, dtype=np.uint32))
+        with open(out / "records.jsonl", "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs: Any) -> "BM25Index":
+        src = Path(path)
+        index = cls(**kwargs)
+        mode = "r" if mmap else None
+        index.terms = {
+            term: i
+            for i, term in enumerate(json.loads((src / "terms.json").read_text()))
+        }
+        index._offsets = np.load(src / "postings_offsets.npy", mmap_mode=mode)
+        index._docs = np.load(src / "postings_docs.npy", mmap_mode=mode)
+        index._tfs = np.load(src / "postings_tfs.npy", mmap_mode=mode)
+        index.doc_len = array("I", np.load(src / "doc_len.npy").tobytes())
+        with open(src / "records.jsonl", encoding="utf-8") as f:
+            index.records = [json.loads(line) for line in f if line.strip()]
+        index._ids = {record["id"] for record in index.records}
+        return index
+
+
+# ---------------------------------------------------------------------------
+# Fusion
+# ---------------------------------------------------------------------------
+
+
+def _result_key(item: Dict[str, Any]) -> str:
+    # Source URI + hash of the whitespace-normalized text, the same on both
+    # sides: chunk ids are not (KB ids vs local ingestion UUIDs)
+    source = item.get("metadata", {}).get("x-amz-bedrock-kb-source-uri") or (
+        item.get("location", {}).get("s3Location", {}).get("uri", "")
+    )
+    content = item.get("content", {})
+    text = content.get("text", "") if isinstance(content, dict) else ""
+    digest = hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+    return f"{source}\0{digest}"
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    k: int = 60,
+    top_n: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked retrievalResults lists: score = sum of 1 / (k + rank).
+
+    Items are matched by source URI and text hash, so the same chunk from
+    different indexes fuses even though their chunk ids differ. The fused
+    item keeps the first list's copy, with "score" set to the RRF score.
+    """
+    fused: Dict[str, float] = {}
+    items: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, item in enumerate(results, start=1):
+            key = _result_key(item)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(key, item)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_n]
+    return [{**items[key], "score": fused[key]} for key in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or extend a BM25 index.")
+    parser.add_argument("chunks", help="JSONL chunk records (see ingestion.py)")
+    parser.add_argument("index", help="index directory (extended if it exists)")
+    args = parser.parse_args()
+
+    exists = (Path(args.index) / "terms.json").exists()
+    index = BM25Index.load(args.index, mmap=False) if exists else BM25Index()
+    with open(args.chunks, encoding="utf-8") as f:
+        added = index.add(json.loads(line) for line in f if line.strip())
+    index.save(args.index)
+    print(
+        f"Added {added} chunks; index has {len(index)} chunks, {len(index.terms)} terms"
+    )
+    if added:
+        from retrieval_cache import bump_corpus_version
+
+        bump_corpus_version(f"lexical index: {args.chunks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+In-process vector retrieval over the spec-sheet corpus.
+
+The corpus uploaded by scripts/upload_s3.py is small enough to search locally,
+so this backend answers query_knowledge_base without a Bedrock KB round trip.
+Results use the same shape as Bedrock `retrievalResults`:
+
+    {"content": {"type": "TEXT", "text": ...},
+     "location": {"type": "S3", "s3Location": {"uri": ...}},
+     "metadata": {"x-amz-bedrock-kb-source-uri": ...,
+                  "x-amz-bedrock-kb-chunk-id": ..., ...},
+     "score": cosine similarity}
+
+Index directory layout:
+- embeddings.npy   float32 matrix (n, dims), rows L2-normalized; memory-mapped
+- records.jsonl    one {"id", "text", "metadata"} per row, same order
+- ivf_*.npy        optional approximate (IVF) index for larger corpora
+- meta.json        dims, count, embedding model
+
+Note:
+- Search is exact by default (one matrix-vector product + argpartition).
+- The IVF index trades a little recall for scanning only nprobe clusters.
+
+Usage (chunks.jsonl from ingestion.py; embeds with embedding_model_id):
+    python local_retrieval.py chunks.jsonl .cache/local_index [--ivf-lists 256]
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from embedding_service import EmbeddingService
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+# ---------------------------------------------------------------------------
+# Approximate index
+# ---------------------------------------------------------------------------
+
+
+class IVFIndex:
+    """
+    Inverted-file index: spherical k-means clusters, array-backed posting lists.
+
+    Rows of cluster c are ids[offsets[c]:offsets[c + 1]].
+    """
+
+    def __init__(self, centroids: np.ndarray, ids: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.ids = ids
+        self.offsets = offsets
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_iter: int = 10,
+        sample_size: int = 20000,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        n = matrix.shape[0]
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize_rows(centroids)
+
+        assign = np.concatenate(
+            [
+                np.argmax(matrix[i : i + 8192] @ centroids.T, axis=1)
+                for i in range(0, n, 8192)
+            ]
+        )
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return cls(centroids, ids, offsets)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = top_k(self.centroids @ query, nprobe)
+        return np.concatenate(
+            [self.ids[self.offsets[c] : self.offsets[c + 1]] for c in lists]
+        )
+
+    def save(self, path: Path) -> None:
+        np.save(path / "ivf_centroids.npy", self.centroids)
+        np.save(path / "ivf_ids.npy", self.ids)
+        np.save(path / "ivf_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        if not (path / "ivf_centroids.npy").exists():
+            return None
+        return cls(
+            np.load(path / "ivf_centroids.npy"),
+            np.load(path / "ivf_ids.npy"),
+            np.load(path / "ivf_offsets.npy"),
+        )
+
+
+# ---------------------------------------------------------------------------
+# Vector index
+# ---------------------------------------------------------------------------
+
+
+class LocalVectorIndex:
+    """Cosine top-k over an (optionally memory-mapped) embedding matrix."""
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        records: List[Dict[str, Any]],
+        ivf: Optional[IVFIndex] = None,
+        embedding_model: str = "",
+    ):
+        if matrix.shape[0] != len(records):
+            raise ValueError(f"{matrix.shape[0]} embeddings but {len(records)} records")
+        self.matrix = matrix
+        self.records = records
+        self.ivf = ivf
+        self.embedding_model = embedding_model
+
+    @classmethod
+    def build(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        embeddings: Sequence[Sequence[float]],
+        embedding_model: str = "",
+    ) -> "LocalVectorIndex":
+        """records: dicts with "text", optional "id" and "metadata"."""
+        records = [
+            {
+                "id": r.get("id") or str(i),
+                "text": r["text"],
+                "metadata": r.get("metadata", {}),
+            }
+            for i, r in enumerate(records)
+        ]
+        matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        return cls(matrix, records, embedding_model=embedding_model)
+
+    def build_ivf(self, n_lists: Optional[int] = None, **kwargs: Any) -> None:
+        """Train the optional approximate index (worth it from ~50k chunks)."""
+        self.ivf = IVFIndex.train(np.asarray(self.matrix), n_lists, **kwargs)
+
+    def save(self, path: str) -> None:
+        out = Path(path)
+        out.mkdir(parents=True, exist_ok=True)
+        # Replaced, not rewritten: a running app may have the old file mapped
+        tmp = out / "embeddings.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(self.matrix, dtype=np.float32))
+        os.replace(tmp, out / "embeddings.npy")
+        with open(out / "records.jsonl", "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+        if self.ivf is not None:
+            self.ivf.save(out)
+        else:  # an IVF index from an earlier build no longer matches the rows
+            for stale in out.glob("ivf_*.npy"):
+                stale.unlink()
+        meta = {
+            "dims": int(self.matrix.shape[1]),
+            "count": len(self.records),
+            "embedding_model": self.embedding_model,
+        }
+        (out / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalVectorIndex":
+        src = Path(path)
+        matrix = np.load(src / "embeddings.npy", mmap_mode="r" if mmap else None)
+        with open(src / "records.jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        meta = json.loads((src / "meta.json").read_text())
+        return cls(matrix, records, IVFIndex.load(src), meta.get("embedding_model", ""))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def search_ids(
+        self, query: Sequence[float], k: int = 3, nprobe: Optional[int] = None
+    ) -> List[tuple]:
+        """
+        (row, score) pairs for the k best rows.
+
+        nprobe: clusters to scan when an IVF index exists; None → exact.
+        """
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        if self.ivf is not None and nprobe:
+            cand = self.ivf.candidates(q, nprobe)
+            scores = self.matrix[cand] @ q
+            best = top_k(scores, k)
+            return [(int(cand[i]), float(scores[i])) for i in best]
+        scores = self.matrix @ q
+        return [(int(i), float(scores[i])) for i in top_k(scores, k)]
+
+    def search(
+        self, query: Sequence[float], k: int = 3, nprobe: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k chunks in Bedrock retrievalResults shape."""
+        return [
+            to_retrieval_result(self.records[row], score)
+            for row, score in self.search_ids(query, k, nprobe)
+        ]
+
+
+def to_retrieval_result(record: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Shape a local chunk record like a Bedrock KB retrievalResults item."""
+    metadata = dict(record.get("metadata", {}))
+    metadata.setdefault("x-amz-bedrock-kb-chunk-id", record["id"])
+    source = metadata.get("x-amz-bedrock-kb-source-uri", "")
+    return {
+        "content": {"type": "TEXT", "text": record["text"]},
+        "location": {"type": "S3", "s3Location": {"uri": source}},
+        "metadata": metadata,
+        "score": score,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Building from ingested chunks
+# ---------------------------------------------------------------------------
+
+
+def build_from_chunks(
+    records: Iterable[Dict[str, Any]],
+    service: "EmbeddingService",
+    ivf_lists: Optional[int] = None,
+) -> LocalVectorIndex:
+    """
+    Embed chunk records (see ingestion.py) with service and index them.
+
+    Unchanged chunks come from the embedding cache, so rebuilding after a
+    re-ingest only pays for new text. ivf_lists > 0 also trains an IVF index.
+    """
+    records = list(records)
+    if not records:
+        raise ValueError("no chunks to index")
+    vectors = service.embed_many([record["text"] for record in records])
+    index = LocalVectorIndex.build(records, vectors, embedding_model=service.model_id)
+    if ivf_lists:
+        index.build_ivf(ivf_lists)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local vector index.")
+    parser.add_argument("chunks", help="JSONL chunk records (see ingestion.py)")
+    parser.add_argument(
+        "index", nargs="?", default=None, help="index directory (local_index_path)"
+    )
+    parser.add_argument(
+        "--ivf-lists", type=int, default=0, help="IVF clusters; 0 = exact search only"
+    )
+    args = parser.parse_args()
+
+    # Imported here so the search path does not need boto3
+    import bedrock_utils
+    import constants as const
+    from retrieval_cache import bump_corpus_version
+
+    path = args.index or const.local_index_path
+    with open(args.chunks, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    index = build_from_chunks(records, bedrock_utils.embedding_service, args.ivf_lists)
+    index.save(path)
+    stats = bedrock_utils.embedding_service.stats()
+    print(
+        f"Indexed {len(index)} chunks ({index.matrix.shape[1]} dims) into {path}; "
+        f"{stats['embedded']} embedded, {stats['cache_hits']} from cache"
+    )
+    bump_corpus_version(f"local index: {args.chunks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+In-process latency and token metrics for the Bedrock calls.
+
+bedrock_utils records one observation per stage call ("classify",
+"retrieve", "generate", "generate_stream", "embed"):
+
+- wall time into a fixed-bucket histogram (p50/p95/p99 are interpolated
+  from the buckets, like Prometheus' histogram_quantile)
+- input/output tokens from the response payload
+- retries (app-level throttle backoff + botocore's RetryAttempts),
+  throttles and errors
+
+Code inside a tracked call adds to it with metrics.note(...) and
+metrics.fail(), so helpers like _call_bedrock don't need the record passed
+around.
+
+Export with to_prometheus() (text exposition format) or write_jsonl()
+(one summary line per stage), or read summary() directly.
+"""
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Milliseconds; LLM calls sit in the 250 ms - 30 s range
+DEFAULT_BUCKETS_MS = (
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+    60000,
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of millisecond observations."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation inside the bucket holding the q-th sample."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - seen) / n
+                return min(value, self.max)  # never beyond what was observed
+            seen += n
+        return self.max
+
+
+@dataclass
+class CallRecord:
+    """Counters for one in-flight call; filled by metrics.note()."""
+
+    stage: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    retries: int = 0
+    throttles: int = 0
+    error: bool = False
+
+
+class _StageStats:
+    def __init__(self, buckets: Sequence[float]):
+        self.latency = Histogram(buckets)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+
+class MetricsRegistry:
+    """Per-stage histograms and counters, safe to share across threads."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # -- recording ---------------------------------------------------------
+
+    @contextmanager
+    def track(self, stage: str) -> Iterator[CallRecord]:
+        """Time the block as one `stage` call; exceptions count as errors."""
+        call = CallRecord(stage)
+        stack = self._stack()
+        stack.append(call)
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception:  # not GeneratorExit: an abandoned stream is no error
+            call.error = True
+            raise
+        finally:
+            # remove, not pop: a suspended generator may have left its own
+            # record above ours on this thread
+            stack.remove(call)
+            self.record(call, (time.perf_counter() - start) * 1000)
+
+    def note(self, **counts: int) -> None:
+        """Add to the innermost tracked call on this thread (if any)."""
+        stack = self._stack()
+        if stack:
+            call = stack[-1]
+            for name, value in counts.items():
+                setattr(call, name, getattr(call, name) + value)
+
+    def fail(self) -> None:
+        """Mark the innermost tracked call as failed (for swallowed errors)."""
+        stack = self._stack()
+        if stack:
+            stack[-1].error = True
+
+    def record(self, call: CallRecord, duration_ms: float) -> None:
+        with self._lock:
+            stats = self._stages.get(call.stage)
+            if stats is None:
+                stats = self._stages[call.stage] = _StageStats(self.buckets)
+            stats.latency.observe(duration_ms)
+            stats.calls += 1
+            stats.errors += int(call.error)
+            stats.retries += call.retries
+            stats.throttles += call.throttles
+            stats.input_tokens += call.input_tokens
+            stats.output_tokens += call.output_tokens
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        """Latency-only observation (e.g. time to first token)."""
+        self.record(CallRecord(stage), duration_ms)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def _stack(self) -> List[CallRecord]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # -- reading / export ----------------------------------------------------
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """stage -> calls, errors, retries, throttles, tokens, latency, tokens/s."""
+        with self._lock:
+            out = {}
+            for stage, stats in sorted(self._stages.items()):
+                latency = stats.latency
+                out[stage] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "throttles": stats.throttles,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "mean_ms": round(latency.sum / latency.count, 1),
+                    "p50_ms": round(latency.quantile(0.50), 1),
+                    "p95_ms": round(latency.quantile(0.95), 1),
+                    "p99_ms": round(latency.quantile(0.99), 1),
+                    "max_ms": round(latency.max, 1),
+                    # output tokens per second of call time (generation speed)
+                    "output_tokens_per_s": (
+                        round(stats.output_tokens / (latency.sum / 1000), 1)
+                        if latency.sum
+                        else 0.0
+                    ),
+                }
+            return out
+
+    def to_prometheus(self, prefix: str = "rag") -> str:
+        """Prometheus text exposition (durations in seconds)."""
+        lines = [
+            f"# HELP {prefix}_call_duration_seconds Wall time per Bedrock stage call.",
+            f"# TYPE {prefix}_call_duration_seconds histogram",
+        ]
+        counters: Dict[str, List[str]] = {
+            "calls": [],
+            "errors": [],
+            "retries": [],
+            "throttles": [],
+            "tokens": [],
+        }
+        with self._lock:
+            for stage, stats in sorted(self._stages.items()):
+                label = f'stage="{stage}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets, stats.latency.counts):
+                    cumulative += n
+                    lines.append(
+                        f"{prefix}_call_duration_seconds_bucket"
+                        f'{{{label},le="{bound / 1000:g}"}} {cumulative}'
+                    )
+                lines.append(
+                    f"{prefix}_call_duration_seconds_bucket"
+                    f'{{{label},le="+Inf"}} {stats.latency.count}'
+                )
+                lines.append(
+                    f"{prefix}_call_duration_seconds_sum{{{label}}} "
+                    f"{stats.latency.sum / 1000:.6f}"
+                )
+                lines.append(
+                    f"{prefix}_call_duration_seconds_count{{{label}}} "
+                    f"{stats.latency.count}"
+                )
+                for name in ("calls", "errors", "retries", "throttles"):
+                    counters[name].append(
+                        f"{prefix}_{name}_total{{{label}}} {getattr(stats, name)}"
+                    )
+                for direction in ("input", "output"):
+                    counters["tokens"].append(
+                        f'{prefix}_tokens_total{{{label},direction="{direction}"}} '
+                        f"{getattr(stats, direction + '_tokens')}"
+                    )
+        for name, samples in counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        """Append one {"ts", "stage", ...summary} line per stage to path."""
+        now = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for stage, values in self.summary().items():
+                record = {"ts": now, "stage": stage, **values, **(extra or {})}
+                f.write(json.dumps(record) + "\n")
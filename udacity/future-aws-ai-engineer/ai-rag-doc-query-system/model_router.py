@@ -0,0 +1,119 @@
+"""
+Route each request to the cheapest model that can answer it.
+
+The chat app used to run both gatekeeping and generation on whichever model
+the user picked, so a Sonnet session paid Sonnet latency just to learn a
+question was off-topic. With routing:
+
+- classification always uses classifier_model (the cheapest fast model)
+- generation goes to small_model by default, and escalates to large_model
+  by rule (long question, comparison/reasoning wording, several machines
+  named) or by confidence (little of the question is covered by the
+  retrieved context, or nothing was retrieved)
+
+ModelRouter only decides; bedrock_utils records per-model latency and
+tokens (model_metrics) so the thresholds can be tuned from real numbers.
+route() returns the decision with its reason, and stats() counts decisions
+per model and reason.
+"""
+
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from context_budget import chunk_text
+from tokens import STOPWORDS, TOKEN_RE
+
+# Pass as model_id to let the router pick the generation model
+AUTO = "auto"
+
+_REASONING_RE = re.compile(
+    r"\b(compare|comparison|versus|vs|difference|differ|better|best|why|explain"
+    r"|recommend|should i|pros and cons|trade ?offs?|calculate|estimate|plan"
+    r"|step by step|summari[sz]e)\b"
+)
+# Model numbers / part codes: letters and digits in one token ("bd850", "x-950")
+_CODE_RE = re.compile(r"\b(?=[a-z-]*\d)(?=[\d-]*[a-z])[a-z0-9]+(?:-[a-z0-9]+)*\b")
+
+
+@dataclass
+class RouteDecision:
+    model_id: str
+    reason: str
+    escalated: bool = False
+
+
+class ModelRouter:
+    """Rule + confidence router between a small and a large model."""
+
+    def __init__(
+        self,
+        classifier_model: str,
+        small_model: str,
+        large_model: str,
+        max_small_words: int = 30,
+        min_coverage: float = 0.5,
+    ):
+        self.classifier_model = classifier_model
+        self.small_model = small_model
+        self.large_model = large_model
+        self.max_small_words = max_small_words
+        self.min_coverage = min_coverage
+        self._decisions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def route(
+        self, question: str, retrieval_results: Optional[List[Dict[str, Any]]] = None
+    ) -> RouteDecision:
+        """Pick the generation model for a question and its retrieved chunks."""
+        reason = self._escalation_reason(question.lower(), retrieval_results)
+        if reason:
+            decision = RouteDecision(self.large_model, reason, escalated=True)
+        else:
+            decision = RouteDecision(self.small_model, "short factual")
+        with self._lock:
+            self._decisions[(decision.model_id, decision.reason)] += 1
+        return decision
+
+    def _escalation_reason(
+        self, question: str, retrieval_results: Optional[List[Dict[str, Any]]]
+    ) -> str:
+        if len(question.split()) > self.max_small_words:
+            return "long question"
+        if _REASONING_RE.search(question):
+            return "reasoning"
+        if len(set(_CODE_RE.findall(question))) > 1:
+            return "multiple machines"
+        if retrieval_results is not None:
+            if not retrieval_results:
+                return "no context"
+            if self.coverage(question, retrieval_results) < self.min_coverage:
+                return "low confidence"
+        return ""
+
+    @staticmethod
+    def coverage(question: str, retrieval_results: List[Dict[str, Any]]) -> float:
+        """Fraction of the question's content words found in the context."""
+        terms = set(TOKEN_RE.findall(question.lower())) - STOPWORDS
+        if not terms:
+            return 1.0
+        context = set()
+        for item in retrieval_results:
+            context.update(TOKEN_RE.findall(chunk_text(item).lower()))
+        return len(terms & context) / len(terms)
+
+    def stats(self) -> Dict[str, Any]:
+        """Decisions per model, and per (model, reason)."""
+        with self._lock:
+            per_model: Counter = Counter()
+            for (model_id, _), n in self._decisions.items():
+                per_model[model_id] += n
+            return {
+                "models": dict(per_model),
+                "reasons": {
+                    f"{model_id}: {reason}": n
+                    for (model_id, reason), n in sorted(self._decisions.items())
+                },
+            }
@@ -0,0 +1,188 @@
+"""
+Gatekeeping layer for bedrock_utils.valid_prompt.
+
+Calling the LLM for every chat message just to get back "Category E" doubles
+the round trips per question. This module settles as many prompts as it can
+locally and only sends the rest to the model:
+
+1. Memo: verdicts are memoized per (classifier model, normalized prompt)
+   (bounded LRU).
+2. Rules: keyword/regex pre-classifier for clear deny (categories A, B, D).
+3. Lexical model: optional naive Bayes over tokens, trained online from the
+   LLM's own verdicts (or offline via fit()); denies when confident.
+4. LLM: everything else goes to the model classifier.
+
+Note:
+- The local layers only ever deny. A keyword match cannot tell that every
+  part of a prompt is about heavy machinery ("excavator payload: what is the
+  capital of France?"), so every possible allow is the LLM's call.
+- Errors from the LLM path (None verdicts) are never memoized, so a transient
+  Bedrock failure stays fail-closed without poisoning the cache.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from response_cache import normalize_prompt
+
+# (prompt, model_id) -> True (allowed), False (rejected) or None (error)
+LLMClassifier = Callable[[str, str], Optional[bool]]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Category A / D: model internals, architecture, instructions, jailbreaks
+_DENY_META = re.compile(
+    r"\b(system prompt|your instructions|ignore (all |the )?(previous|prior|above)"
+    r"|how do you work|what model are you|which llm|language model|"
+    r"jailbreak|developer mode|your (architecture|prompt|rules))\b"
+)
+# Category B: profanity / toxic wording (kept short on purpose)
+_DENY_TOXIC = re.compile(r"\b(fuck\w*|shit\w*|bitch\w*|asshole\w*|idiot\w*|kill you)\b")
+
+
+class LexicalRules:
+    """
+    Regex pre-classifier. Returns False for a clear deny, else None.
+
+    Denies meta / jailbreak / toxic prompts; everything else goes on to the
+    next layer.
+    """
+
+    def classify(self, normalized: str) -> Optional[bool]:
+        if _DENY_META.search(normalized) or _DENY_TOXIC.search(normalized):
+            return False
+        return None
+
+
+class LexicalModel:
+    """
+    Tiny multinomial naive Bayes over prompt tokens.
+
+    Trained from logged verdicts; denies only once it has min_examples per
+    class and the deny posterior clears confidence, otherwise returns None.
+    It never allows: padding an off-topic prompt with domain words shifts
+    the posterior toward allow.
+    """
+
+    def __init__(self, confidence: float = 0.98, min_examples: int = 50):
+        self.confidence = confidence
+        self.min_examples = min_examples
+        self._tokens = {True: Counter(), False: Counter()}
+        self._docs = {True: 0, False: 0}
+        self._lock = threading.Lock()
+
+    def update(self, normalized: str, verdict: bool) -> None:
+        with self._lock:
+            self._tokens[verdict].update(_TOKEN_RE.findall(normalized))
+            self._docs[verdict] += 1
+
+    def fit(self, verdicts: Iterable[Tuple[str, bool]]) -> "LexicalModel":
+        """Train from (prompt, allowed) pairs, e.g. a log of LLM verdicts."""
+        for prompt, verdict in verdicts:
+            self.update(normalize_prompt(prompt), bool(verdict))
+        return self
+
+    def classify(self, normalized: str) -> Optional[bool]:
+        with self._lock:
+            if min(self._docs.values()) < self.min_examples:
+                return None
+            vocab = len(set(self._tokens[True]) | set(self._tokens[False])) or 1
+            total_docs = self._docs[True] + self._docs[False]
+            log_p = {}
+            for label in (True, False):
+                counts = self._tokens[label]
+                denom = sum(counts.values()) + vocab
+                score = math.log(self._docs[label] / total_docs)
+                for tok in _TOKEN_RE.findall(normalized):
+                    score += math.log((counts[tok] + 1) / denom)
+                log_p[label] = score
+        diff = max(min(log_p[False] - log_p[True], 700), -700)
+        p_allow = 1.0 / (1.0 + math.exp(diff))
+        if 1.0 - p_allow >= self.confidence:
+            return False
+        return None
+
+
+class PromptClassifier:
+    """Memo → rules → lexical model (deny only) → LLM, with counters."""
+
+    def __init__(
+        self,
+        llm_classify: LLMClassifier,
+        rules: Optional[LexicalRules] = None,
+        model: Optional[LexicalModel] = None,
+        max_entries: int = 1024,
+    ):
+        self.llm_classify = llm_classify
+        self.rules = rules
+        self.model = model
+        self.max_entries = max_entries
+        self._memo: "OrderedDict[Tuple[str, str], bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "calls": 0,
+            "memo_hits": 0,
+            "rule_deny": 0,
+            "model_deny": 0,
+            "llm_calls": 0,
+            "llm_errors": 0,
+        }
+
+    def _remember(self, key: Tuple[str, str], verdict: bool) -> None:
+        with self._lock:
+            self._memo[key] = verdict
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def classify(self, prompt: str, model_id: str) -> bool:
+        """True if the prompt is allowed (Category E)."""
+        normalized = normalize_prompt(prompt)
+        key = (model_id, normalized)
+        self._count("calls")
+
+        with self._lock:
+            verdict = self._memo.get(key)
+            if verdict is not None:
+                self._memo.move_to_end(key)
+                self._stats["memo_hits"] += 1
+                return verdict
+
+        for name, layer in (("rule", self.rules), ("model", self.model)):
+            if layer is None:
+                continue
+            if layer.classify(normalized) is False:
+                self._count(f"{name}_deny")
+                self._remember(key, False)
+                return False
+
+        self._count("llm_calls")
+        verdict = self.llm_classify(prompt, model_id)
+        if verdict is None:
+            self._count("llm_errors")
+            return False  # fail-closed, not memoized
+        self._remember(key, verdict)
+        if self.model is not None:
+            self.model.update(normalized, verdict)
+        return verdict
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus how many LLM calls were avoided."""
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+        stats["llm_calls_avoided"] = stats["calls"] - stats["llm_calls"]
+        stats["avoided_rate"] = (
+            stats["llm_calls_avoided"] / stats["calls"] if stats["calls"] else 0.0
+        )
+        return stats
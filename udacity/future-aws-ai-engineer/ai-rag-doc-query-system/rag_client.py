@@ -0,0 +1,164 @@
+"""
+Thin HTTP client for server.py (standard library only).
+
+app.py uses it when rag_server_url is set, so the Streamlit process only
+renders the chat and the pipeline runs in the service:
+
+    client = RagClient("http://127.0.0.1:8000")
+    result, deltas = client.stream(question, model_id, kb_id)
+    for text in deltas: ...        # result.answer / timings filled at the end
+
+429 (admission control) and 503 (server queue full) are raised as
+admission.Overloaded with the server's Retry-After, like in-process calls.
+"""
+
+import json
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from admission import Overloaded
+from bedrock_utils import DEFAULT_TEMPERATURE, DEFAULT_TOP_P, RagAnswer
+
+
+class RagClient:
+    def __init__(self, base_url: str, timeout: float = 120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _open(self, path: str, payload: Dict[str, Any]):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise _error(e.code, json.loads(e.read() or b"{}")) from None
+
+    @staticmethod
+    def _payload(
+        question: str,
+        model_id: str,
+        kb_id: str,
+        temperature: float,
+        top_p: float,
+        history: Optional[List[Dict[str, str]]],
+        retrieval_question: str,
+    ) -> Dict[str, Any]:
+        return {
+            "question": question,
+            "model_id": model_id,
+            "kb_id": kb_id,
+            "temperature": temperature,
+            "top_p": top_p,
+            "history": history,
+            "retrieval_question": retrieval_question,
+        }
+
+    def answer(
+        self,
+        question: str,
+        model_id: str,
+        kb_id: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P,
+        history: Optional[List[Dict[str, str]]] = None,
+        retrieval_question: str = "",
+    ) -> RagAnswer:
+        """POST /v1/answer."""
+        payload = self._payload(
+            question, model_id, kb_id, temperature, top_p, history, retrieval_question
+        )
+        with self._open("/v1/answer", payload) as response:
+            data = json.loads(response.read())
+        result = _result(data)
+        result.answer = data.get("answer", "")
+        return result
+
+    def stream(
+        self,
+        question: str,
+        model_id: str,
+        kb_id: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P,
+        history: Optional[List[Dict[str, str]]] = None,
+        retrieval_question: str = "",
+    ) -> Tuple[RagAnswer, Iterator[str]]:
+        """
+        POST /v1/answer/stream. Returns once classification and retrieval
+        are done: the result (allowed, model, sources) and an iterator of
+        text deltas, which fills result.answer and timings when it ends.
+        """
+        payload = self._payload(
+            question, model_id, kb_id, temperature, top_p, history, retrieval_question
+        )
+        response = self._open("/v1/answer/stream", payload)
+        events = _read_events(response)
+        event, data = next(events, ("error", {"error": "empty response"}))
+        if event == "error":
+            response.close()
+            raise _error(data.get("status", 500), data)
+        result = _result(data)
+
+        def deltas() -> Iterator[str]:
+            parts = []
+            with response:
+                for event, data in events:
+                    if event == "delta":
+                        parts.append(data["text"])
+                        yield data["text"]
+                    elif event == "done":
+                        result.timings = data["timings"]
+                        result.context_report = data["context_report"]
+                    elif event == "error":
+                        raise _error(data.get("status", 500), data)
+            result.answer = "".join(parts)
+
+        return result, deltas()
+
+
+def _result(data: Dict[str, Any]) -> RagAnswer:
+    return RagAnswer(
+        allowed=data["allowed"],
+        retrieval_results=[
+            {
+                "content": {"text": source["text"]},
+                "location": source.get("location"),
+                "score": source.get("score"),
+            }
+            for source in data.get("sources", [])
+        ],
+        timings=data.get("timings", {}),
+        context_report=data.get("context_report", {}),
+        model_id=data.get("model_id", ""),
+        route_reason=data.get("route_reason", ""),
+    )
+
+
+def _error(status: int, data: Dict[str, Any]) -> Exception:
+    if status in (429, 503):
+        return Overloaded(
+            data.get("model_id", "server"),
+            data.get("reason", "busy"),
+            float(data.get("retry_after", 1)),
+        )
+    return RuntimeError(f"RAG server error {status}: {data.get('error', '')}")
+
+
+def _read_events(response) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Server-sent events as (event, decoded JSON data)."""
+    event, data = "message", []
+    for raw in response:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
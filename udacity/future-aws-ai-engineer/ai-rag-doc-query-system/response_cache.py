@@ -0,0 +1,324 @@
+"""
+Answer cache that sits in front of bedrock_utils.generate_response.
+
+Repeated heavy-machinery questions should not pay a full Bedrock round trip
+every time. Answers are keyed on:
+
+    (model_id, normalized prompt, temperature, top_p, retrieved chunk IDs,
+     conversation)
+
+conversation is an opaque digest of earlier chat turns ("" for none).
+
+Tiers:
+- Memory tier: in-process LRU with a TTL (always on).
+- Disk tier: optional SQLite file so answers survive app restarts.
+- Near-duplicate mode: optional; reuses an answer whose prompt embedding is
+  close enough (cosine >= threshold) to the new prompt, within the same
+  model / sampling / chunk / conversation scope. Embeddings come from embed_fn (lexical
+  hashing by default). The neighbor list is in memory only, so after a
+  restart only exact matches hit the disk tier until answers are re-stored.
+
+Note:
+- Only successful (non-empty) answers should be stored; callers decide that.
+- All tiers are thread-safe so one cache can be shared across sessions.
+"""
+
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+EmbedFn = Callable[[str], Sequence[float]]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------------------------------------------------------------------------
+# Keys & embeddings
+# ---------------------------------------------------------------------------
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase and collapse whitespace so trivial edits share a key."""
+    return " ".join(prompt.lower().split())
+
+
+def make_key(
+    model_id: str,
+    prompt: str,
+    temperature: float,
+    top_p: float,
+    chunk_ids: Iterable[str] = (),
+    conversation: str = "",
+) -> str:
+    """Stable hash of everything that can change the generated answer."""
+    parts = [
+        model_id,
+        normalize_prompt(prompt),
+        round(float(temperature), 4),
+        round(float(top_p), 4),
+        sorted(chunk_ids),
+    ]
+    if conversation:  # keys without history stay as they were
+        parts.append(conversation)
+    raw = json.dumps(parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lexical_embedding(text: str, dims: int = 256) -> List[float]:
+    """
+    Cheap local embedding: hashed unigrams + bigrams, L2-normalized.
+
+    Good enough to catch reworded duplicates ("bulldozer bd850 weight" vs
+    "what is the weight of the bd850 bulldozer") without a model call.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vec = [0.0] * dims
+    for feature in features:
+        digest = hashlib.md5(feature.encode("utf-8")).digest()
+        vec[int.from_bytes(digest[:4], "little") % dims] += 1.0
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec] if norm else vec
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+# ---------------------------------------------------------------------------
+# Storage tiers
+# ---------------------------------------------------------------------------
+
+
+class MemoryTier:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteTier:
+    """Optional on-disk tier; survives restarts and can be shared by processes."""
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, stored_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Cache facade
+# ---------------------------------------------------------------------------
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache with optional near-duplicate reuse.
+
+    similarity_threshold:
+      - 0 (default) → exact matches only
+      - 0.9–0.97 → reuse answers for reworded prompts in the same scope
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        db_path: Optional[str] = None,
+        similarity_threshold: float = 0.0,
+        embed_fn: Optional[EmbedFn] = None,
+    ):
+        self.memory = MemoryTier(max_entries, ttl_seconds)
+        self.disk = SQLiteTier(db_path, ttl_seconds) if db_path else None
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn or lexical_embedding
+        self.max_entries = max_entries
+        # (scope, embedding, exact key) — newest last, bounded like the LRU
+        self._neighbors: List[Tuple[str, Sequence[float], str]] = []
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "similar_hits": 0,
+        }
+
+    @staticmethod
+    def _scope(model_id, temperature, top_p, chunk_ids, conversation) -> str:
+        # Same key as make_key, minus the prompt text
+        return make_key(model_id, "", temperature, top_p, chunk_ids, conversation)
+
+    def _embed(self, prompt: str) -> Optional[Sequence[float]]:
+        # A failing embedding model only disables near-duplicate reuse
+        try:
+            return self.embed_fn(normalize_prompt(prompt))
+        except Exception as e:
+            print(f"Response cache embedding failed: {e}")
+            return None
+
+    def _count(self, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _lookup(self, key: str) -> Tuple[Optional[str], str]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value, "memory_hits"
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)  # promote
+                return value, "disk_hits"
+        return None, ""
+
+    def get(
+        self,
+        model_id: str,
+        prompt: str,
+        temperature: float,
+        top_p: float,
+        chunk_ids: Iterable[str] = (),
+        conversation: str = "",
+    ) -> Optional[str]:
+        """Return a cached answer or None (and count the hit/miss)."""
+        chunk_ids = list(chunk_ids)
+        key = make_key(model_id, prompt, temperature, top_p, chunk_ids, conversation)
+        value, tier = self._lookup(key)
+        if value is not None:
+            self._count("hits", tier)
+            return value
+
+        query_vec = self._embed(prompt) if self.similarity_threshold > 0 else None
+        if query_vec is not None:
+            scope = self._scope(model_id, temperature, top_p, chunk_ids, conversation)
+            with self._lock:
+                candidates = [n for n in self._neighbors if n[0] == scope]
+            best_key, best_sim = None, self.similarity_threshold
+            for _, vec, other_key in candidates:
+                sim = _cosine(query_vec, vec)
+                if sim >= best_sim:
+                    best_key, best_sim = other_key, sim
+            if best_key is not None:
+                value, _ = self._lookup(best_key)
+                if value is not None:
+                    self._count("hits", "similar_hits")
+                    return value
+
+        self._count("misses")
+        return None
+
+    def set(
+        self,
+        model_id: str,
+        prompt: str,
+        temperature: float,
+        top_p: float,
+        answer: str,
+        chunk_ids: Iterable[str] = (),
+        conversation: str = "",
+    ) -> None:
+        """Store an answer in every configured tier."""
+        chunk_ids = list(chunk_ids)
+        key = make_key(model_id, prompt, temperature, top_p, chunk_ids, conversation)
+        self.memory.set(key, answer)
+        if self.disk is not None:
+            self.disk.set(key, answer)
+        vec = self._embed(prompt) if self.similarity_threshold > 0 else None
+        if vec is not None:
+            scope = self._scope(model_id, temperature, top_p, chunk_ids, conversation)
+            with self._lock:
+                self._neighbors = [n for n in self._neighbors if n[2] != key]
+                self._neighbors.append((scope, vec, key))
+                if len(self._neighbors) > self.max_entries:
+                    del self._neighbors[: len(self._neighbors) - self.max_entries]
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self._neighbors.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters plus hit rate, e.g. for a sidebar caption."""
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.memory)
+        return stats
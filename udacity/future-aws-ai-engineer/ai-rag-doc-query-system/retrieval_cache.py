@@ -0,0 +1,244 @@
+"""
+Retrieval cache in front of bedrock_utils.query_knowledge_base.
+
+The answer cache (response_cache.py) only helps when the whole answer can be
+reused. The same question asked with another model, temperature or chat
+history still paid a fresh bedrock_kb.retrieve call. This caches the
+retrieval itself, keyed on:
+
+    (backend, kb_id, normalized query, numberOfResults)
+
+- In-process LRU bounded by retrieval_cache_size, with a TTL as a backstop
+  for corpus changes made outside this repo (e.g. a sync started from the
+  console).
+- Corpus version: a small JSON file (corpus_version_path) that
+  scripts/upload_s3.py, ingestion.py and lexical_index.py rewrite after they
+  change the corpus. Callers pass the current version with every lookup; a
+  new version drops every entry, in every process that reads the same file
+  (app, server workers, batch jobs). Results fetched under an older version
+  are not stored.
+- Empty results are never stored (retrieval errors come back as []).
+- stats(): hits, misses, hit rate, invalidations, and the retrieval time the
+  hits saved (each entry keeps how long its original retrieval took).
+
+Mark the corpus as changed by hand, e.g. after an ingestion job started
+from the console or a direct aurora_store load:
+
+    python retrieval_cache.py bump --reason "console sync"
+    python retrieval_cache.py show
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import constants as const
+
+Results = List[Dict[str, Any]]
+
+
+# ---------------------------------------------------------------------------
+# Corpus version
+# ---------------------------------------------------------------------------
+
+
+def corpus_version_path() -> str:
+    """corpus_version_path from constants, relative to this directory."""
+    path = Path(getattr(const, "corpus_version_path", ".cache/corpus_version.json"))
+    # Anchored here so scripts/ and the app agree whatever the working directory
+    return str(path if path.is_absolute() else Path(__file__).resolve().parent / path)
+
+
+class CorpusVersion:
+    """
+    Version token stored in a JSON file and replaced atomically by bump().
+
+    current() costs one stat(); the file is only re-read when its inode,
+    mtime or size changes. on_change is called (outside the lock) when a
+    different version is seen, e.g. to reload in-memory indexes.
+    """
+
+    def __init__(self, path: str, on_change: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.on_change = on_change
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        """The version in the file ("" while it does not exist)."""
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            if self._version is not None and signature == self._signature:
+                return self._version
+            previous = self._version
+            self._signature = signature
+            self._version = self._read() if signature else ""
+            version = self._version
+        if previous is not None and version != previous and self.on_change:
+            self.on_change(version)
+        return version
+
+    def _read(self) -> str:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return str(json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            # Unreadable counts as changed, so nothing stale is served
+            return f"unreadable:{self._signature}"
+
+    def info(self) -> Dict[str, Any]:
+        """The version file's contents ({} if it does not exist)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def bump(self, reason: str = "") -> str:
+        """Write a new version (write-then-rename) and return it."""
+        version = uuid.uuid4().hex[:16]
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": version, "updated_at": time.time(), "reason": reason}, f
+            )
+        os.replace(tmp_path, self.path)
+        return version
+
+
+def bump_corpus_version(reason: str = "", path: Optional[str] = None) -> str:
+    """Invalidate cached retrievals in every process sharing the version file."""
+    version = CorpusVersion(path or corpus_version_path()).bump(reason)
+    print(f"Corpus version {version} ({reason or 'manual'})")
+    return version
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+
+class RetrievalCache:
+    """Bounded LRU of retrieval results, cleared when the corpus version changes."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (stored_at, results, milliseconds the retrieval took)
+        self._data: "OrderedDict[Hashable, Tuple[float, Tuple, float]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "invalidations": 0,
+            "saved_ms": 0.0,
+        }
+
+    def _sync_version(self, version: str) -> None:
+        # Caller holds the lock
+        if version != self._version:
+            if self._version is not None:
+                self._data.clear()
+                self._stats["invalidations"] += 1
+            self._version = version
+
+    def get(self, key: Hashable, version: str = "") -> Optional[Results]:
+        """Cached results or None (and count the hit/miss)."""
+        with self._lock:
+            self._sync_version(version)
+            item = self._data.get(key)
+            if item is not None:
+                stored_at, results, cost_ms = item
+                if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                    del self._data[key]
+                    self._stats["expired"] += 1
+                else:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["saved_ms"] += cost_ms
+                    return list(results)
+            self._stats["misses"] += 1
+            return None
+
+    def set(
+        self, key: Hashable, results: Results, cost_ms: float, version: str = ""
+    ) -> None:
+        """Store non-empty results fetched under version (if still current)."""
+        if not results:
+            return
+        with self._lock:
+            if version != self._version:
+                return  # the corpus changed while this retrieval ran
+            self._data[key] = (time.time(), tuple(results), cost_ms)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def fetch(
+        self,
+        key: Hashable,
+        version: str,
+        fn: Callable[..., Results],
+        *args: Any,
+    ) -> Results:
+        """get, or call fn(*args), time it and set."""
+        results = self.get(key, version)
+        if results is not None:
+            return results
+        start = time.perf_counter()
+        results = fn(*args)
+        self.set(key, results, (time.perf_counter() - start) * 1000, version)
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus hit rate and saved retrieval time."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._data)
+            stats["version"] = self._version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["avg_saved_ms"] = (
+            round(stats["saved_ms"] / stats["hits"], 1) if stats["hits"] else 0.0
+        )
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or bump the corpus version.")
+    parser.add_argument("command", choices=["show", "bump"])
+    parser.add_argument("--reason", default="")
+    parser.add_argument("--path", default=None, help="default: corpus_version_path")
+    args = parser.parse_args()
+
+    if args.command == "bump":
+        bump_corpus_version(args.reason, args.path)
+    else:
+        info = CorpusVersion(args.path or corpus_version_path()).info()
+        print(json.dumps(info, indent=2) if info else "No corpus version yet")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,336 @@
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from boto3.session import Session
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
-session = Session(profile_name="udacity-aws-lab-1")
+# retrieval_cache.py lives in the app directory, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval_cache import bump_corpus_version  # noqa: E402
 
+PROFILE_NAME = "udacity-aws-lab-1"
+MANIFEST_NAME = ".s3_sync_manifest.json"
 
-def upload_files_to_s3(folder_path, bucket_name, prefix=""):
+# upload_file wraps service errors in S3UploadFailedError; network failures
+# are BotoCoreError. Either fails one file, not the whole run
+S3_ERRORS = (ClientError, S3UploadFailedError, BotoCoreError)
+
+# Multipart settings for large spec-sheet drops
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+
+def get_s3_client(endpoint_url=None, max_pool_connections=50):
+    # endpoint_url points at a local S3 stand-in (MinIO, moto server) for tests
+    session = Session(profile_name=PROFILE_NAME)
+    return session.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=max_pool_connections),
+    )
+
+
+def upload_files_to_s3(folder_path, bucket_name, prefix="", endpoint_url=None):
     # Initialize S3 client
-    s3_client = session.client("s3")
+    s3_client = get_s3_client(endpoint_url)
 
     # Check if the folder exists
     if not os.path.exists(folder_path):
         print(f"Error: The folder '{folder_path}' does not exist.")
         return
 
-    # Walk through the directory
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            local_path = os.path.join(root, filename)
+    # Walk through the directory (sync manifests are never uploaded)
+    for s3_key, local_path in list_local_files(folder_path, prefix).items():
+        relative_path = os.path.relpath(local_path, folder_path)
+        try:
+            # Upload the file to S3
+            s3_client.upload_file(local_path, bucket_name, s3_key)
+            print(f"Successfully uploaded {relative_path} to {bucket_name}/{s3_key}")
+        except S3_ERRORS as e:
+            print(f"Error uploading {relative_path}: {e}")
+
+
+# ----------------------------------------------------------
+# Incremental sync
+# ----------------------------------------------------------
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-            # Calculate relative path for S3 key
+
+def default_manifest_path(folder_path):
+    # Next to the folder, not inside it, so the manifest is never uploaded
+    return os.path.normpath(os.path.abspath(folder_path)) + MANIFEST_NAME
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except ValueError as e:
+        # Corrupt or truncated: a full sync rebuilds it (hashes skip unchanged)
+        print(f"Warning: ignoring unreadable sync manifest {path}: {e}")
+        return {}
+    if not isinstance(manifest, dict):
+        print(f"Warning: ignoring sync manifest {path}: not a JSON object")
+        return {}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    # Write-then-rename so an interrupted run never leaves a torn manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def list_local_files(folder_path, prefix):
+    """Map S3 key -> local path for every file under folder_path."""
+    files = {}
+    for root, dirs, filenames in os.walk(folder_path):
+        for filename in filenames:
+            if filename.startswith(MANIFEST_NAME):  # left by older versions
+                continue
+            local_path = os.path.join(root, filename)
             relative_path = os.path.relpath(local_path, folder_path)
-            s3_key = os.path.join(prefix, relative_path).replace("\\", "/")
+            files[os.path.join(prefix, relative_path).replace("\\", "/")] = local_path
+    return files
+
+
+def list_remote_keys(s3_client, bucket_name, prefix):
+    # Trailing slash so "spec-sheets" never matches "spec-sheets-old/..."
+    list_prefix = f"{prefix.rstrip('/')}/" if prefix else ""
+    keys = set()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=list_prefix):
+        keys.update(obj["Key"] for obj in page.get("Contents", []))
+    return keys
 
-            try:
-                # Upload the file to S3
-                s3_client.upload_file(local_path, bucket_name, s3_key)
-                print(
-                    f"Successfully uploaded {relative_path} to {bucket_name}/{s3_key}"
+
+def sync_files_to_s3(
+    folder_path,
+    bucket_name,
+    prefix="",
+    workers=8,
+    delete=False,
+    manifest_path=None,
+    s3_client=None,
+    endpoint_url=None,
+):
+    """
+    Upload only new or changed files, in parallel.
+
+    A local manifest (next to the folder by default) keeps size, mtime and
+    SHA-256 per key for this bucket/prefix. Files whose size+mtime match
+    are skipped without reading them; otherwise the hash decides. With delete=True, keys under prefix
+    that no longer exist locally are removed from the bucket; keys S3 fails
+    to delete count as failed.
+
+    Returns a summary dict (also printed) with counts, bytes and MB/s.
+    """
+    if not os.path.exists(folder_path):
+        print(f"Error: The folder '{folder_path}' does not exist.")
+        return None
+
+    s3_client = s3_client or get_s3_client(
+        endpoint_url, max_pool_connections=workers * TRANSFER_CONFIG.max_concurrency
+    )
+    manifest_path = manifest_path or default_manifest_path(folder_path)
+    manifest = load_manifest(manifest_path) or load_manifest(
+        os.path.join(folder_path, MANIFEST_NAME)  # older versions kept it inside
+    )
+    entries = manifest.setdefault(f"s3://{bucket_name}/{prefix}", {})
+
+    start = time.perf_counter()
+    local_files = list_local_files(folder_path, prefix)
+    to_upload = []
+    for s3_key, local_path in local_files.items():
+        stat = os.stat(local_path)
+        entry = entries.get(s3_key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue
+        sha256 = file_sha256(local_path)
+        if entry and entry["sha256"] == sha256:
+            entry["mtime"] = stat.st_mtime  # touched but unchanged
+            continue
+        to_upload.append((s3_key, local_path, stat, sha256))
+
+    summary = {
+        "uploaded": 0,
+        "skipped": len(local_files) - len(to_upload),
+        "deleted": 0,
+        "failed": 0,
+        "bytes": 0,
+    }
+
+    def upload(s3_key, local_path, sha256):
+        s3_client.upload_file(
+            local_path,
+            bucket_name,
+            s3_key,
+            ExtraArgs={"Metadata": {"sha256": sha256}},
+            Config=TRANSFER_CONFIG,
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(upload, s3_key, local_path, sha256): (
+                    s3_key,
+                    stat,
+                    sha256,
                 )
-            except ClientError as e:
-                print(f"Error uploading {relative_path}: {e}")
+                for s3_key, local_path, stat, sha256 in to_upload
+            }
+            for future in as_completed(futures):
+                s3_key, stat, sha256 = futures[future]
+                try:
+                    future.result()
+                except S3_ERRORS as e:
+                    summary["failed"] += 1
+                    print(f"Error uploading {s3_key}: {e}")
+                    continue
+                entries[s3_key] = {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "sha256": sha256,
+                }
+                summary["uploaded"] += 1
+                summary["bytes"] += stat.st_size
+                print(f"Successfully uploaded {s3_key} to {bucket_name}")
+
+        if delete:
+            stale = sorted(
+                list_remote_keys(s3_client, bucket_name, prefix) - set(local_files)
+            )
+            for i in range(0, len(stale), 1000):  # delete_objects batch limit
+                batch = stale[i : i + 1000]
+                try:
+                    response = s3_client.delete_objects(
+                        Bucket=bucket_name,
+                        Delete={
+                            "Objects": [{"Key": key} for key in batch],
+                            "Quiet": True,
+                        },
+                    )
+                    errors = response.get("Errors", [])
+                except (ClientError, BotoCoreError) as e:
+                    errors = [{"Key": key, "Message": str(e)} for key in batch]
+                # Quiet mode only reports failures; failed keys stay in the
+                # manifest so the next --delete run retries them
+                failed = {error["Key"] for error in errors}
+                for error in errors:
+                    print(f"Error deleting {error['Key']}: {error.get('Message')}")
+                for key in batch:
+                    if key not in failed:
+                        entries.pop(key, None)
+                summary["deleted"] += len(batch) - len(failed)
+                summary["failed"] += len(failed)
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 2)
+    summary["mb_per_s"] = round(summary["bytes"] / 1e6 / elapsed, 2) if elapsed else 0.0
+    print(
+        f"Sync complete: {summary['uploaded']} uploaded, {summary['skipped']} "
+        f"unchanged, {summary['deleted']} deleted, {summary['failed']} failed; "
+        f"{summary['bytes'] / 1e6:.1f} MB in {summary['seconds']}s "
+        f"({summary['mb_per_s']} MB/s)"
+    )
+    return summary
+
+
+# ----------------------------------------------------------
+# Knowledge Base ingestion
+# ----------------------------------------------------------
+
+INGESTION_RUNNING = ("STARTING", "IN_PROGRESS", "STOPPING")
+
+
+def start_kb_ingestion(kb_id, data_source_id, wait=True, poll_seconds=10):
+    """
+    Start a Bedrock KB ingestion job for the synced data source.
+
+    With wait=True, polls until the job finishes and returns its final
+    description (status COMPLETE, FAILED or STOPPED).
+    """
+    client = Session(profile_name=PROFILE_NAME).client("bedrock-agent")
+    job = client.start_ingestion_job(
+        knowledgeBaseId=kb_id, dataSourceId=data_source_id
+    )["ingestionJob"]
+    while wait and job["status"] in INGESTION_RUNNING:
+        time.sleep(poll_seconds)
+        job = client.get_ingestion_job(
+            knowledgeBaseId=kb_id,
+            dataSourceId=data_source_id,
+            ingestionJobId=job["ingestionJobId"],
+        )["ingestionJob"]
+    print(f"Ingestion job {job['ingestionJobId']}: {job['status']}")
+    return job
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload spec sheets to S3.")
     # Folder path
-    folder_path = "spec-sheets"
-
+    parser.add_argument("--folder", default="spec-sheets")
     # S3 bucket name
     # Replace with your actual bucket name
-    bucket_name = "bedrock-kb-702043267423"
-
+    parser.add_argument("--bucket", default="bedrock-kb-702043267423")
     # S3 prefix (optional)
-    prefix = "spec-sheets"
+    parser.add_argument("--prefix", default="spec-sheets")
+    parser.add_argument(
+        "--sync", action="store_true", help="only upload new/changed files"
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--delete", action="store_true", help="with --sync, delete removed keys"
+    )
+    # Local S3 stand-in (MinIO, moto server) instead of AWS
+    parser.add_argument("--endpoint-url", default=None)
+    # Re-ingest the KB after uploading (Bedrock console: KB > Data source)
+    parser.add_argument("--kb-id", default=os.getenv("KB_ID", ""))
+    parser.add_argument("--data-source-id", default="")
+    args = parser.parse_args()
 
-    upload_files_to_s3(folder_path, bucket_name, prefix)
+    # Cached retrievals in the app are dropped whenever the corpus changes
+    # (see retrieval_cache.py): after the upload, and again once the KB has
+    # re-indexed it
+    if args.sync:
+        summary = sync_files_to_s3(
+            args.folder,
+            args.bucket,
+            args.prefix,
+            args.workers,
+            delete=args.delete,
+            endpoint_url=args.endpoint_url,
+        )
+        changed = bool(summary and (summary["uploaded"] or summary["deleted"]))
+    else:
+        upload_files_to_s3(args.folder, args.bucket, args.prefix, args.endpoint_url)
+        changed = os.path.exists(args.folder)
+    if changed:
+        bump_corpus_version(f"s3 upload: s3://{args.bucket}/{args.prefix}")
+    if changed and args.kb_id and args.data_source_id:
+        job = start_kb_ingestion(args.kb_id, args.data_source_id)
+        # Even a failed job may have re-indexed part of the corpus
+        bump_corpus_version(f"kb ingestion {job['ingestionJobId']}: {job['status']}")
@@ -0,0 +1,559 @@
+"""
+Headless HTTP service for the RAG pipeline (ASGI).
+
+app.py re-runs the whole Streamlit script on every interaction and makes
+blocking boto3 calls on the script thread, so it serves one browser tab at
+a time and nothing else. server.py exposes the same classify → retrieve →
+generate flow from bedrock_utils to any HTTP client:
+
+- POST /v1/answer: JSON in, one JSON answer out. Runs answer_question_async,
+  so identical concurrent requests share one run.
+- POST /v1/answer/stream: the answer as server-sent events. "meta" is sent
+  once the prompt is classified and context retrieved, then "delta" per
+  text chunk, then "done" with timings (or "error").
+- GET /healthz, GET /stats (stage/model metrics, caches, admission, gate).
+
+Request body: {"question": ..., "model_id": "auto", "kb_id": "",
+"temperature": 0.1, "top_p": 0.9, "history": [{"role", "content"}],
+"retrieval_question": ""}. retrieval_question, if given, is what gets
+retrieved (e.g. a follow-up rewritten with the previous question);
+question is what gets classified and what the model answers. kb_id defaults to $KB_ID.
+
+This is a plain ASGI callable with no framework dependency; serve it with
+uvicorn:
+
+    uvicorn server:app --port 8000
+    python server.py --workers 4
+
+Inside a worker every request shares the boto3 clients (one connection
+pool), the response cache, single-flight and admission control. Worker
+processes cannot share those, so the admission budgets are divided by the
+number of workers (RAG_SERVER_WORKERS, set by `python server.py`, or
+server_workers).
+
+Backpressure: at most server_max_active requests run per worker, and up to
+server_max_waiting more wait (FIFO) for at most server_queue_timeout
+seconds. Anything beyond that gets 503, and requests shed by admission
+control get 429; both carry Retry-After, so clients back off instead of
+timing out. A slow SSE reader only holds back its own stream (bounded
+buffer). A client that disconnects stops its stream: the generator chain
+down to single-flight is closed, and the Bedrock stream is closed at its
+next chunk unless another request is still reading the same answer.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import bedrock_utils as bu
+import constants as const
+from admission import Overloaded
+from context_budget import chunk_text
+from model_router import AUTO
+
+MAX_BODY_BYTES = 1 << 20
+
+WORKERS = int(os.getenv("RAG_SERVER_WORKERS") or getattr(const, "server_workers", 1))
+STREAM_BUFFER = getattr(const, "server_stream_buffer", 64)
+
+
+class BadRequest(ValueError):
+    """Malformed request body (400)."""
+
+
+class Busy(RuntimeError):
+    """No request slot within the queue timeout (503)."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"server busy (retry in {retry_after:.0f}s)")
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# Requests
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class AnswerRequest:
+    question: str
+    model_id: str = AUTO
+    kb_id: str = ""
+    temperature: float = bu.DEFAULT_TEMPERATURE
+    top_p: float = bu.DEFAULT_TOP_P
+    history: Optional[List[Dict[str, str]]] = None
+    retrieval_question: str = ""
+
+    @classmethod
+    def from_json(cls, body: bytes) -> "AnswerRequest":
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"invalid JSON: {e}") from None
+        if not isinstance(data, dict):
+            raise BadRequest("body must be a JSON object")
+        question = data.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise BadRequest("question is required")
+        history = data.get("history") or None
+        if history is not None and not (
+            isinstance(history, list)
+            and all(
+                isinstance(m, dict) and {"role", "content"} <= m.keys() for m in history
+            )
+        ):
+            raise BadRequest("history must be a list of {role, content}")
+        try:
+            return cls(
+                question=question,
+                model_id=str(data.get("model_id") or AUTO),
+                kb_id=str(data.get("kb_id") or os.getenv("KB_ID", "")),
+                temperature=float(data.get("temperature", bu.DEFAULT_TEMPERATURE)),
+                top_p=float(data.get("top_p", bu.DEFAULT_TOP_P)),
+                history=history,
+                retrieval_question=str(data.get("retrieval_question") or ""),
+            )
+        except (TypeError, ValueError) as e:
+            raise BadRequest(str(e)) from None
+
+
+def meta_payload(result: bu.RagAnswer) -> Dict[str, Any]:
+    return {
+        "allowed": result.allowed,
+        "model_id": result.model_id,
+        "route_reason": result.route_reason,
+        "timings": result.timings,
+        "context_report": result.context_report,
+        "sources": [
+            {
+                "score": item.get("score"),
+                "location": item.get("location"),
+                "text": chunk_text(item),
+            }
+            for item in result.retrieval_results
+        ],
+    }
+
+
+def answer_payload(result: bu.RagAnswer) -> Dict[str, Any]:
+    return {**meta_payload(result), "answer": result.answer}
+
+
+# ---------------------------------------------------------------------------
+# Backpressure
+# ---------------------------------------------------------------------------
+
+
+class Gate:
+    """At most max_active requests at once; a bounded, timed FIFO behind them."""
+
+    def __init__(self, max_active: int, max_waiting: int, timeout: float):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_active)
+        self.active = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self._avg_s = 1.0  # moving average of request duration
+
+    def retry_after(self) -> float:
+        """Rough time until a new request would get a slot."""
+        return max(1.0, (self.waiting + 1) * self._avg_s / self.max_active)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Busy(self.retry_after())
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Busy(self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.served += 1
+            self._avg_s = 0.8 * self._avg_s + 0.2 * (time.monotonic() - start)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "served": self.served,
+            "rejected": self.rejected,
+            "avg_request_s": round(self._avg_s, 3),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Shared per-worker state
+# ---------------------------------------------------------------------------
+
+# The Bedrock quota is per account: each worker gets its share
+if bu.admission is not None and WORKERS > 1:
+    bu.admission.scale(1 / WORKERS)
+
+gate = Gate(
+    getattr(const, "server_max_active", 32),
+    getattr(const, "server_max_waiting", 64),
+    getattr(const, "server_queue_timeout", 5.0),
+)
+response_cache = bu.make_response_cache()
+# One thread per active stream, apart from _pipeline_pool
+_stream_pool = ThreadPoolExecutor(
+    max_workers=getattr(const, "server_max_active", 32),
+    thread_name_prefix="rag-stream",
+)
+
+_DONE = object()
+
+
+async def iterate_in_thread(
+    make_iter: Callable[[], Iterator[Any]], buffer: int = STREAM_BUFFER
+) -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator on _stream_pool. The producer blocks while
+    `buffer` items are unread; closing this generator stops it and closes
+    the iterator (at its next item, on the producer thread).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    stop = threading.Event()
+
+    def put(item: Any, error: Optional[BaseException] = None) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put((item, error)), loop).result()
+
+    def produce() -> None:
+        iterator = make_iter()
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:  # re-raised on the event loop
+            if not stop.is_set():
+                put(_DONE, e)
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        if not stop.is_set():
+            put(_DONE)
+
+    loop.run_in_executor(_stream_pool, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        while not queue.empty():  # unblock a producer waiting on a full buffer
+            queue.get_nowait()
+
+
+async def run_answer(request: AnswerRequest) -> bu.RagAnswer:
+    if request.retrieval_question in ("", request.question):
+        return await bu.answer_question_async(
+            request.question,
+            request.model_id,
+            request.kb_id,
+            request.temperature,
+            request.top_p,
+            cache=response_cache,
+            history=request.history,
+        )
+    result = await bu.classify_and_retrieve_async(
+        request.question,
+        request.model_id,
+        request.kb_id,
+        request.retrieval_question,
+    )
+    if result.allowed:
+        parts = [text async for text in iterate_in_thread(stream_for(request, result))]
+        result.answer = "".join(parts)
+    return result
+
+
+def stream_for(
+    request: AnswerRequest, result: bu.RagAnswer
+) -> Callable[[], Iterator[str]]:
+    return lambda: bu.stream_answer(
+        result,
+        request.question,
+        request.model_id,
+        request.temperature,
+        request.top_p,
+        cache=response_cache,
+        history=request.history,
+    )
+
+
+# ---------------------------------------------------------------------------
+# HTTP plumbing
+# ---------------------------------------------------------------------------
+
+Send = Callable[[Dict[str, Any]], Any]
+Receive = Callable[[], Any]
+
+
+async def read_body(receive: Receive) -> bytes:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionResetError("client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise BadRequest("request body too large")
+        if not message.get("more_body", False):
+            return bytes(body)
+
+
+async def send_json(
+    send: Send, status: int, payload: Any, headers: Optional[Dict[str, str]] = None
+) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *((k.encode(), v.encode()) for k, v in (headers or {}).items()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_event(send: Send, event: str, data: Any) -> None:
+    payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+    await send({"type": "http.response.body", "body": payload, "more_body": True})
+
+
+def error_response(error: Exception):
+    """(status, payload, headers) for an exception raised by a handler."""
+    if isinstance(error, BadRequest):
+        return 400, {"error": str(error)}, {}
+    if isinstance(error, Busy):
+        retry = str(max(1, round(error.retry_after)))
+        return (
+            503,
+            {"error": str(error), "retry_after": error.retry_after},
+            {"retry-after": retry},
+        )
+    if isinstance(error, Overloaded):
+        retry = str(max(1, round(error.retry_after)))
+        payload = {
+            "error": str(error),
+            "model_id": error.model_id,
+            "reason": error.reason,
+            "retry_after": error.retry_after,
+        }
+        return 429, payload, {"retry-after": retry}
+    traceback.print_exc()
+    return 500, {"error": "internal error"}, {}
+
+
+async def send_deltas(send: Send, deltas: AsyncIterator[str]) -> None:
+    async for text in deltas:
+        await send_event(send, "delta", {"text": text})
+
+
+async def watch_disconnect(receive: Receive) -> None:
+    """Returns once the client has disconnected."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+
+async def healthz(scope, receive: Receive, send: Send) -> None:
+    await send_json(
+        send,
+        200,
+        {
+            "status": "ok",
+            "active": gate.active,
+            "waiting": gate.waiting,
+            "admission_queued": bu.admission.queue_depth() if bu.admission else 0,
+        },
+    )
+
+
+async def stats(scope, receive: Receive, send: Send) -> None:
+    await send_json(
+        send,
+        200,
+        {
+            "server": {**gate.stats(), "pid": os.getpid(), "workers": WORKERS},
+            "stages": bu.metrics.summary(),
+            "models": bu.model_metrics.summary(),
+            "routes": bu.router.stats(),
+            "coalesced": bu.flights.stats(),
+            "admission": bu.admission.stats() if bu.admission else None,
+            "response_cache": response_cache.stats(),
+            "retrieval_cache": (
+                bu.retrieval_cache.stats() if bu.retrieval_cache else None
+            ),
+            "classifier": bu.prompt_classifier.stats(),
+        },
+    )
+
+
+async def answer(scope, receive: Receive, send: Send) -> None:
+    request = AnswerRequest.from_json(await read_body(receive))
+    async with gate.slot():
+        result = await run_answer(request)
+    await send_json(send, 200, answer_payload(result))
+
+
+async def answer_stream(scope, receive: Receive, send: Send) -> None:
+    request = AnswerRequest.from_json(await read_body(receive))
+    async with gate.slot():
+        result = await bu.classify_and_retrieve_async(
+            request.question,
+            request.model_id,
+            request.kb_id,
+            request.retrieval_question,
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),  # no proxy buffering
+                ],
+            }
+        )
+        await send_event(send, "meta", meta_payload(result))
+        if result.allowed:
+            deltas = iterate_in_thread(stream_for(request, result))
+            pump = asyncio.ensure_future(send_deltas(send, deltas))
+            watcher = asyncio.ensure_future(watch_disconnect(receive))
+            try:
+                await asyncio.wait(
+                    {pump, watcher}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not pump.done():  # disconnected mid-answer
+                    return
+                pump.result()  # re-raise a stream error
+            finally:
+                # Cancelling the pump closes deltas, which stops the upstream
+                for task in (pump, watcher):
+                    task.cancel()
+                await asyncio.gather(pump, watcher, return_exceptions=True)
+                await deltas.aclose()
+        await send_event(
+            send,
+            "done",
+            {"timings": result.timings, "context_report": result.context_report},
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+
+ROUTES = {
+    ("GET", "/healthz"): healthz,
+    ("GET", "/stats"): stats,
+    ("POST", "/v1/answer"): answer,
+    ("POST", "/v1/answer/stream"): answer_stream,
+}
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _stream_pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive: Receive, send: Send) -> None:
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        if any(path == scope["path"] for _, path in ROUTES):
+            return await send_json(send, 405, {"error": "method not allowed"})
+        return await send_json(send, 404, {"error": "not found"})
+
+    started = False
+
+    async def tracked_send(message: Dict[str, Any]) -> None:
+        nonlocal started
+        started = started or message["type"] == "http.response.start"
+        await send(message)
+
+    try:
+        await handler(scope, receive, tracked_send)
+    except ConnectionResetError:
+        return
+    except Exception as e:
+        status, payload, headers = error_response(e)
+        if not started:
+            await send_json(send, status, payload, headers)
+        else:  # mid-stream: report it as an event and end the stream
+            await send_event(send, "error", {**payload, "status": status})
+            await send({"type": "http.response.body", "body": b""})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP")
+    parser.add_argument("--host", default=getattr(const, "server_host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=getattr(const, "server_port", 8000))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # Worker processes read this to take their share of the admission budget
+    os.environ["RAG_SERVER_WORKERS"] = str(args.workers)
+    uvicorn.run(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        app_dir=str(Path(__file__).resolve().parent),
+        lifespan="on",
+    )
+
+
+if __name__ == "__main__":
+    main()
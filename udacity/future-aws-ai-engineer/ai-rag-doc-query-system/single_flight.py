@@ -0,0 +1,233 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several sessions ask the same question at the same moment (everyone
+refreshing after an incident), each one used to start its own classify →
+retrieve → generate chain. With SingleFlight the first caller for a key
+(the leader) makes the upstream call; callers arriving while it runs
+(followers) wait for and share its result, or its exception. Nothing is
+kept after the call completes: this is not a cache, only deduplication of
+concurrent work.
+
+- do(): threaded callers; followers block on the leader's future.
+- do_async(): coroutine functions; the leader's coroutine runs as a task,
+  and followers await its result without holding a thread.
+- stream(): iterators (streamed answers). A background thread drains the
+  upstream iterator into a buffer; every caller, leader included, replays
+  the buffer and then follows it live, so a slow or abandoned reader does
+  not stall the others. Readers are counted: once the last one stops
+  reading, the flight is dropped and the upstream iterator is closed at its
+  next item, so an abandoned answer stops using output tokens.
+
+stats() reports per group: calls, upstream calls, shared (coalesced) calls
+and flights in progress.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+_FlightKey = Tuple[str, Hashable]
+
+
+class _SharedStream:
+    """Buffer filled by one producer thread, read by any number of readers."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0  # guarded by SingleFlight._lock
+        self.abandoned = False
+        self.cond = threading.Condition()
+
+    def fill(self, iterator: Iterator[Any]) -> None:
+        try:
+            for item in iterator:
+                with self.cond:
+                    if self.abandoned:
+                        break
+                    self.items.append(item)
+                    self.cond.notify_all()
+        except Exception as e:  # handed to every reader
+            self.error = e
+        finally:
+            # Ends the upstream call (and its token usage) when abandoned
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def read(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.items) and not self.done:
+                    self.cond.wait()
+                pending = self.items[position:]
+                finished = self.done
+            yield from pending
+            position += len(pending)
+            if finished and position >= len(self.items):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same (group, key)."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[_FlightKey, Any] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _join(
+        self,
+        group: str,
+        key: Hashable,
+        make: Callable[[], Any],
+        enter: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        (flight, is_leader): the in-flight entry for key, or a new one.
+        enter(flight) runs under the lock, before any other caller can leave.
+        """
+        flight_key = (group, key)
+        with self._lock:
+            stats = self._stats.setdefault(
+                group, {"calls": 0, "upstream": 0, "shared": 0}
+            )
+            stats["calls"] += 1
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                stats["upstream"] += 1
+                flight = self._flights[flight_key] = make()
+            else:
+                stats["shared"] += 1
+            if enter is not None:
+                enter(flight)
+            return flight, leader
+
+    def _land(self, group: str, key: Hashable, flight: Any = None) -> None:
+        """Drop the in-flight entry for key (only if it is still flight)."""
+        with self._lock:
+            if flight is None or self._flights.get((group, key)) is flight:
+                self._flights.pop((group, key), None)
+
+    def _leave(self, group: str, key: Hashable, shared: _SharedStream) -> None:
+        """A stream reader stopped; the last one out abandons the upstream."""
+        with self._lock:
+            shared.readers -= 1
+            if shared.readers or shared.done:
+                return
+            if self._flights.get((group, key)) is shared:
+                # Later callers start a fresh flight instead of joining
+                del self._flights[(group, key)]
+        with shared.cond:
+            shared.abandoned = True
+
+    def do(self, group: str, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """fn(*args), shared with concurrent callers of the same key."""
+        if not self.enabled:
+            return fn(*args)
+        future, leader = self._join(group, key, Future)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._land(group, key)
+
+    async def do_async(
+        self, group: str, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any
+    ) -> Any:
+        """await fn(*args), shared with concurrent awaiters of the same key."""
+        if not self.enabled:
+            return await fn(*args)
+        future, leader = self._join(group, key, Future)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        def settle(task: "asyncio.Task[Any]") -> None:
+            self._land(group, key)
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        task = asyncio.ensure_future(fn(*args))
+        task.add_done_callback(settle)
+        # Shielded: if this caller is cancelled, the task keeps running for
+        # the followers
+        return await asyncio.shield(task)
+
+    def stream(
+        self, group: str, key: Hashable, make_iter: Callable[[], Iterator[Any]]
+    ) -> Iterator[Any]:
+        """
+        Shared replay of the iterator make_iter() returns. Closing every
+        reader's generator before the end closes the upstream iterator.
+        """
+        if not self.enabled:
+            yield from make_iter()
+            return
+
+        def enter(flight: _SharedStream) -> None:
+            flight.readers += 1
+
+        shared, leader = self._join(group, key, _SharedStream, enter)
+        if leader:
+
+            def drain() -> None:
+                try:
+                    shared.fill(make_iter())
+                finally:
+                    self._land(group, key, shared)
+
+            # The drain thread runs in the leader's context (admission priority)
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(drain,),
+                name="single-flight",
+                daemon=True,
+            ).start()
+        try:
+            yield from shared.read()
+        finally:
+            self._leave(group, key, shared)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """group -> calls, upstream, shared, in_flight."""
+        with self._lock:
+            in_flight: Dict[str, int] = {}
+            for group, _ in self._flights:
+                in_flight[group] = in_flight.get(group, 0) + 1
+            return {
+                group: {**stats, "in_flight": in_flight.get(group, 0)}
+                for group, stats in sorted(self._stats.items())
+            }
@@ -0,0 +1,20 @@
+from admission import AdmissionController
+
+
+def test_zero_or_none_limits_are_unlimited():
+    controller = AdmissionController(
+        {"rpm-only": (2, 0), "tpm-only": (None, 1000), "open": (0, None)}
+    )
+    for model_id in ("rpm-only", "rpm-only", "open", "open", "open"):
+        ticket = controller.acquire(model_id, 10_000)
+        controller.settle(ticket, 12_000)
+    ticket = controller.acquire("tpm-only", 500)
+    controller.settle(ticket, 400)
+    controller.scale(0.5)
+
+    stats = controller.stats()
+    assert "open" not in stats
+    assert stats["rpm-only"]["admitted"] == 2
+    assert stats["rpm-only"]["tokens_available"] is None
+    assert stats["tpm-only"]["requests_available"] is None
+    assert stats["tpm-only"]["tokens_available"] == 500  # capped at the scaled capacity
@@ -0,0 +1,30 @@
+import json
+
+import batch_qa
+import bedrock_utils as bu
+
+
+def test_a_failing_question_is_counted_and_the_rest_are_written(
+    tmp_path, monkeypatch
+):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text(
+        "".join(
+            json.dumps({"id": f"q{i}", "question": f"X950 question {i}"}) + "\n"
+            for i in range(4)
+        )
+    )
+    output = tmp_path / "answers.jsonl"
+
+    def answer(self, question):
+        if question.endswith("2"):
+            raise RuntimeError("retrieval backend down")
+        return {"allowed": True, "answer": "ok", "sources": [], "usage": {}}
+
+    monkeypatch.setattr(batch_qa.BatchRunner, "_answer", answer)
+    runner = batch_qa.BatchRunner("m", "kb", concurrency=2)
+    report = runner.run(str(questions), str(output))
+
+    assert report["failed"] == 1 and report["written"] == 3
+    written = {json.loads(line)["id"] for line in output.read_text().splitlines()}
+    assert written == {"q0", "q1", "q3"}  # q2 is retried on the next run
@@ -0,0 +1,30 @@
+from botocore.exceptions import EndpointConnectionError, ReadTimeoutError
+
+import bedrock_utils as bu
+import constants as const
+
+
+class Unreachable:
+    """Bedrock clients whose every call fails at the network layer."""
+
+    def invoke_model(self, **kwargs):
+        raise ReadTimeoutError(endpoint_url="https://bedrock")
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        raise EndpointConnectionError(endpoint_url="https://bedrock")
+
+    def retrieve(self, **kwargs):
+        raise EndpointConnectionError(endpoint_url="https://bedrock-agent")
+
+
+def test_network_errors_fail_closed_after_retries(monkeypatch):
+    monkeypatch.setattr(const, "throttle_retries", 1)
+    monkeypatch.setattr(const, "throttle_base_delay", 0.0)
+    monkeypatch.setattr(bu, "bedrock", Unreachable())
+    monkeypatch.setattr(bu, "bedrock_kb", Unreachable())
+    monkeypatch.setattr(bu, "admission", None)
+
+    assert bu.classify_prompt_llm("X950 weight?", "net-test") is None
+    assert bu.generate_response("net test prompt", "net-test", 0.1, 0.9) == ""
+    assert list(bu.generate_response_stream("net test", "net-test", 0.1, 0.9)) == []
+    assert bu._retrieve_from_kb("X950 weight?", "kb-net-test", 3) == []
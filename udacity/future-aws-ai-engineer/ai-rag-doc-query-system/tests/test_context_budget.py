@@ -0,0 +1,37 @@
+from context_budget import ContextBudgeter, chunk_text
+
+
+def _item(text, source="s3://docs/a.pdf", score=0.9):
+    return {
+        "content": {"text": text},
+        "metadata": {"x-amz-bedrock-kb-source-uri": source},
+        "score": score,
+    }
+
+
+def test_untouched_chunk_keeps_its_layout_and_object():
+    text = "| model | price |\n|---|---|\n| lite | 1 |\n\nNotes follow here."
+    item = _item(text)
+    kept, _ = ContextBudgeter(max_tokens=1000).select("price", [item])
+    assert kept == [item]
+    assert kept[0] is item
+
+
+def test_overlap_trim_slices_the_original_text():
+    shared = "alpha beta gamma delta epsilon zeta"
+    first = _item("intro line\n" + shared)
+    second = _item(shared + "\n\nnext   section\ttext")
+    kept, _ = ContextBudgeter(max_tokens=1000).select("q", [first, second])
+    assert kept[0] is first
+    assert chunk_text(kept[1]) == "next   section\ttext"
+
+
+def test_truncation_keeps_newlines_and_fits_budget():
+    text = "\n".join(f"line {i} " + "word " * 20 for i in range(50))
+    kept, report = ContextBudgeter(max_tokens=100, min_truncated_tokens=10).select(
+        "q", [_item(text)]
+    )
+    out = chunk_text(kept[0])
+    assert text.startswith(out)
+    assert "\n" in out
+    assert report["tokens_after"] <= 100
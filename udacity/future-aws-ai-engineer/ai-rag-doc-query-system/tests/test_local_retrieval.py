@@ -0,0 +1,44 @@
+import json
+import sys
+
+import bedrock_utils as bu
+import local_retrieval
+import retrieval_cache
+from embedding_service import EmbeddingService
+from local_retrieval import LocalVectorIndex
+
+CHUNKS = [
+    {"id": "x950", "text": "X950 excavator operating weight 95 t"},
+    {"id": "bd850", "text": "BD850 bulldozer blade capacity 12 m3"},
+    {"id": "fl250", "text": "FL250 forklift lift capacity 2.5 t"},
+]
+
+
+def fake_embed_batch(texts, model_id):
+    # One dimension per machine code, so each chunk is its own nearest neighbor
+    codes = ("x950", "bd850", "fl250")
+    return [[float(code in text.lower()) for code in codes] for text in texts]
+
+
+def test_cli_embeds_chunks_and_writes_a_loadable_index(tmp_path, monkeypatch, capsys):
+    chunks = tmp_path / "chunks.jsonl"
+    chunks.write_text("".join(json.dumps(chunk) + "\n" for chunk in CHUNKS))
+    index_dir = tmp_path / "local_index"
+    index_dir.mkdir()
+    (index_dir / "ivf_ids.npy").write_bytes(b"stale")  # from an older IVF build
+
+    service = EmbeddingService(fake_embed_batch, model_id="fake-embed")
+    monkeypatch.setattr(bu, "embedding_service", service)
+    bumps = []
+    monkeypatch.setattr(retrieval_cache, "bump_corpus_version", bumps.append)
+    monkeypatch.setattr(sys, "argv", ["local_retrieval.py", str(chunks), str(index_dir)])
+    local_retrieval.main()
+
+    index = LocalVectorIndex.load(str(index_dir))
+    assert len(index) == 3 and index.embedding_model == "fake-embed"
+    assert index.ivf is None and not (index_dir / "ivf_ids.npy").exists()
+    best = index.search(fake_embed_batch(["bd850 specs"], "fake-embed")[0], k=1)
+    assert best[0]["metadata"]["x-amz-bedrock-kb-chunk-id"] == "bd850"
+    assert service.stats()["embedded"] == 3
+    assert len(bumps) == 1
+    assert "Indexed 3 chunks" in capsys.readouterr().out
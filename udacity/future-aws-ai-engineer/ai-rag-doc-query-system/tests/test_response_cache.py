@@ -0,0 +1,37 @@
+import bedrock_utils as bu
+from response_cache import ResponseCache
+
+QUESTION = "What is the operating weight and bucket capacity of the X950 excavator today?"
+
+
+def test_near_duplicates_do_not_cross_conversations(monkeypatch):
+    cache = ResponseCache(similarity_threshold=0.93)
+    calls = []
+
+    def generate_response(prompt, model_id, temperature, top_p, history=None):
+        calls.append(history)
+        return f"answer {len(calls)}"
+
+    first = [{"role": "user", "content": "Tell me about the X950"}]
+    second = [{"role": "user", "content": "Tell me about the BD850"}]
+    monkeypatch.setattr(bu, "generate_response", generate_response)
+    args = ("prompt", "m", 0.1, 0.9, cache)
+    a = bu.generate_response_cached(*args, question=QUESTION, history=first)
+    b = bu.generate_response_cached(*args, question=QUESTION, history=second)
+    again = bu.generate_response_cached(
+        *args, question=QUESTION + " please", history=first
+    )
+
+    assert a != b and len(calls) == 2
+    assert again == a  # near-duplicate reuse within the same conversation
+
+
+def test_neighbor_list_respects_max_entries():
+    cache = ResponseCache(max_entries=2, similarity_threshold=0.9)
+    for i in range(5):
+        cache.set(f"{QUESTION} {i}", "m", 0.1, 0.9, f"answer {i}")
+    assert len(cache._neighbors) == 2
+
+    disabled = ResponseCache(max_entries=0, similarity_threshold=0.9)
+    disabled.set(QUESTION, "m", 0.1, 0.9, "answer")
+    assert disabled._neighbors == []
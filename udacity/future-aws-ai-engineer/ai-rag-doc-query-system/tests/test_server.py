@@ -0,0 +1,65 @@
+import asyncio
+import json
+import threading
+import time
+
+import bedrock_utils as bu
+import server
+
+
+class EndlessStream:
+    """invoke_model_with_response_stream that never finishes on its own."""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        return {"body": self._events()}
+
+    def _events(self):
+        try:
+            while True:
+                payload = {"type": "content_block_delta", "delta": {"text": "x"}}
+                yield {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+                time.sleep(0.005)
+        finally:
+            self.closed.set()
+
+
+def test_disconnect_closes_the_upstream_stream(monkeypatch):
+    upstream = EndlessStream()
+    monkeypatch.setattr(bu, "bedrock", upstream)
+    monkeypatch.setattr(bu, "admission", None)
+
+    async def classify_and_retrieve_async(*args, **kwargs):
+        return bu.RagAnswer(allowed=True, model_id="test-model", timings={"total": 0})
+
+    monkeypatch.setattr(bu, "classify_and_retrieve_async", classify_and_retrieve_async)
+
+    async def run() -> int:
+        deltas = 0
+        enough = asyncio.Event()
+        request = json.dumps(
+            {"question": f"disconnect test {time.time()}", "model_id": "test-model"}
+        ).encode("utf-8")
+        messages = [{"type": "http.request", "body": request, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await enough.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal deltas
+            if b"event: delta" in message.get("body", b""):
+                deltas += 1
+                if deltas >= 3:
+                    enough.set()
+
+        scope = {"type": "http", "method": "POST", "path": "/v1/answer/stream"}
+        await asyncio.wait_for(server.app(scope, receive, send), 5)
+        return deltas
+
+    assert asyncio.run(run()) >= 3
+    assert upstream.closed.wait(2), "upstream stream still open after disconnect"
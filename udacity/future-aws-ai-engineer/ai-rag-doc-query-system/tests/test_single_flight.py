@@ -0,0 +1,46 @@
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def endless(closed: threading.Event, started: threading.Event):
+    try:
+        i = 0
+        while True:
+            started.set()
+            yield i
+            i += 1
+            time.sleep(0.005)
+    finally:
+        closed.set()
+
+
+def test_last_reader_leaving_closes_upstream():
+    flights = SingleFlight()
+    closed, started = threading.Event(), threading.Event()
+    leader = flights.stream("g", "k", lambda: endless(closed, started))
+    follower = flights.stream("g", "k", lambda: endless(closed, started))
+    assert next(leader) == 0
+    assert next(follower) == 0
+    assert flights.stats()["g"]["shared"] == 1
+
+    leader.close()
+    assert next(follower) == 1  # the follower keeps the upstream alive
+    assert not closed.is_set()
+
+    follower.close()
+    assert closed.wait(2)
+    assert flights.stats()["g"]["in_flight"] == 0
+
+
+def test_new_caller_after_abandon_gets_a_fresh_stream():
+    flights = SingleFlight()
+    closed, started = threading.Event(), threading.Event()
+    first = flights.stream("g", "k", lambda: endless(closed, started))
+    next(first)
+    first.close()
+
+    again = flights.stream("g", "k", lambda: iter(["a", "b"]))
+    assert list(again) == ["a", "b"]
+    assert closed.wait(2)
@@ -0,0 +1,24 @@
+"""
+Token estimates shared by chunking, context budgeting, chat memory and
+admission control, plus the question-term tokenizer shared by context
+budgeting and model routing.
+
+Standard library only, so anything can import it (ingestion.py pulls in
+Unix-only modules for its worker pool).
+"""
+
+import re
+
+CHARS_PER_TOKEN = 4
+
+# Lowercase alphanumeric terms, and the question words not worth matching
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or "
+    "the this to was what when where which who why with you your".split()
+)
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (Claude/Titan average ~4 chars per token)."""
+    return max(1, -(-len(text) // CHARS_PER_TOKEN)) if text else 0
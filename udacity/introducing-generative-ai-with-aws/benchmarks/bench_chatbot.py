@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Keyword matching cost: linear substring scan vs the Aho-Corasick matcher.
+
+For each table size (default 10 .. 100k keywords) builds a synthetic
+response table and a batch of customer messages (--hit-rate of them
+contain a keyword) and reports:
+
+- build: compiling the KeywordMatcher (once per table);
+- scan: the original loop, `keyword in text` for every keyword in order;
+- matcher: get_bot_response per message;
+- batch: get_bot_responses over the whole batch (repeats matched once).
+
+It also counts how often the scan's first-listed keyword differs from the
+longest (most specific) one the matcher picks.
+
+Usage:
+    python benchmarks/bench_chatbot.py --sizes 10 100 1000 10000 100000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatbot import DEFAULT_RESPONSE, KeywordMatcher, get_bot_response  # noqa: E402
+from chatbot import get_bot_responses  # noqa: E402
+
+WORDS = (
+    "order refund shipping battery charger screen watch phone tablet speaker "
+    "headphones warranty account password invoice delivery tracking return "
+    "exchange repair pairing bluetooth update firmware subscription"
+).split()
+
+
+def make_table(n, rng):
+    table = {}
+    while len(table) < n:
+        size = rng.randint(1, 3)
+        keyword = " ".join(rng.choice(WORDS) for _ in range(size))
+        if size == 1 or len(table) > len(WORDS) * 4:  # keep codes unique at scale
+            keyword += f" {rng.randrange(10 ** 6):06d}"
+        table.setdefault(keyword, f"answer {len(table)}")
+    return table
+
+
+def make_messages(table, count, hit_rate, rng):
+    keywords = list(table)
+    messages = []
+    for _ in range(count):
+        filler = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        if rng.random() < hit_rate:
+            filler += " about " + rng.choice(keywords)
+        messages.append(f"Hi, I have a question: {filler}?")
+    return messages
+
+
+def scan(table, text):
+    text = text.lower()
+    for keyword, response in table.items():
+        if keyword in text:
+            return response
+    return DEFAULT_RESPONSE
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--hit-rate", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(
+        f"{'keywords':>9}{'build ms':>10}{'scan us':>10}{'matcher us':>12}"
+        f"{'batch us':>10}{'speedup':>9}{'differ':>8}"
+    )
+    for n in args.sizes:
+        rng = random.Random(args.seed)
+        table = make_table(n, rng)
+        messages = make_messages(table, args.messages, args.hit_rate, rng)
+        _, build_s = timed(lambda: KeywordMatcher(table))
+        get_bot_response("warm up", table)  # compile outside the timings
+
+        scan_count = max(20, min(len(messages), 2 * 10**6 // n))
+        old, scan_s = timed(lambda: [scan(table, m) for m in messages[:scan_count]])
+        new, match_s = timed(lambda: [get_bot_response(m, table) for m in messages])
+        _, batch_s = timed(lambda: get_bot_responses(messages, table))
+        differ = sum(a != b for a, b in zip(old, new)) / len(old)
+
+        scan_us = scan_s / scan_count * 1e6
+        match_us = match_s / len(messages) * 1e6
+        print(
+            f"{len(table):>9}{build_s * 1000:>10.1f}{scan_us:>10.1f}{match_us:>12.1f}"
+            f"{batch_s / len(messages) * 1e6:>10.1f}{scan_us / match_us:>8.1f}x"
+            f"{differ:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import threading
+from collections import OrderedDict, deque
+
 responses = {
     "hi": "Hello! Welcome to TechGadget Support. How can I assist you today?",
     "do you have smartwatches": "Yes, we have a variety of smartwatches. You can check them out on our products page.",
@@ -11,11 +14,133 @@ responses = {
 }
 
 
-def get_bot_response(user_input):
-    user_input = user_input.lower()  # Make input lowercase for easier matching
+DEFAULT_RESPONSE = "I'm not sure how to respond to that. Can you try asking something else?"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over the keywords of a response table.
+
+    One pass over the input finds every keyword it contains, however many
+    keywords there are. The longest match wins (it is the most specific);
+    between equally long keywords, the one listed first. Small tables are
+    matched with plain substring checks, which are faster below SCAN_LIMIT.
+    """
+
+    SCAN_LIMIT = 64
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.lowered = [keyword.lower() for keyword in self.keywords]
+        self.goto = [{}]  # state -> {char: next state}
+        self.fail = [0]
+        self.rank = [0]  # state -> rank of the best keyword ending here; 0 = none
+        if len(self.keywords) > self.SCAN_LIMIT:
+            self._build()
+
+    def _rank(self, index):
+        """Longer first, then earlier; encoded in one int so max() compares."""
+        size = len(self.keywords) + 1
+        return (len(self.lowered[index]) + 1) * size + (size - 1 - index)
+
+    def _build(self):
+        goto, fail, rank = self.goto, self.fail, self.rank
+        for index, keyword in enumerate(self.lowered):
+            state = 0
+            for char in keyword:
+                child = goto[state].get(char)
+                if child is None:
+                    child = goto[state][char] = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    rank.append(0)
+                state = child
+            rank[state] = max(rank[state], self._rank(index))
+        # Breadth-first: fail links, and the best match inherited along them
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                rank[child] = max(rank[child], rank[fail[child]])
+                queue.append(child)
+
+    def match(self, text):
+        """Index of the best keyword found in text, or -1."""
+        text = text.lower()
+        if len(self.keywords) <= self.SCAN_LIMIT:
+            found = max(
+                (self._rank(i) for i, kw in enumerate(self.lowered) if kw in text),
+                default=0,
+            )
+        else:
+            goto, fail, rank = self.goto, self.fail, self.rank
+            found = rank[0]  # an empty keyword matches everything
+            state = 0
+            for char in text:
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if rank[state] > found:
+                    found = rank[state]
+        if not found:
+            return -1
+        size = len(self.keywords) + 1
+        return size - 1 - found % size
+
+
+MAX_COMPILED = 8  # tables with a compiled matcher kept at once
+
+# id(table) -> (table, matcher); the table is held so its id is not reused
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def get_matcher(table=None):
+    """
+    Matcher for a response table, compiled once per table object. After
+    adding, removing or renaming keys in place, call rebuild_matcher(table).
+    """
+    table = responses if table is None else table
+    with _compiled_lock:
+        entry = _compiled.get(id(table))
+        if entry is None or entry[0] is not table:
+            entry = _compiled[id(table)] = (table, KeywordMatcher(table))
+            while len(_compiled) > MAX_COMPILED:
+                _compiled.popitem(last=False)
+        _compiled.move_to_end(id(table))
+        return entry[1]
+
+
+def rebuild_matcher(table=None):
+    """Recompile the matcher of a table whose keys were edited in place."""
+    table = responses if table is None else table
+    with _compiled_lock:
+        _compiled.pop(id(table), None)
+    return get_matcher(table)
+
+
+def get_bot_response(user_input, table=None):
+    table = responses if table is None else table
+    matcher = get_matcher(table)
+    index = matcher.match(user_input)
+    if index == -1:
+        return DEFAULT_RESPONSE
+    return table[matcher.keywords[index]]
 
-    for keyword, response in responses.items():
-        if keyword in user_input:
-            return response
 
-    return "I'm not sure how to respond to that. Can you try asking something else?"
+def get_bot_responses(user_inputs, table=None):
+    """get_bot_response for many inputs: one matcher, repeated inputs matched once."""
+    table = responses if table is None else table
+    matcher = get_matcher(table)
+    answers = {}
+    for text in user_inputs:
+        if text not in answers:
+            index = matcher.match(text)
+            answers[text] = (
+                DEFAULT_RESPONSE if index == -1 else table[matcher.keywords[index]]
+            )
+    return [answers[text] for text in user_inputs]